@@ -0,0 +1,13 @@
+"""Asyncio entry point of the API.
+
+An ASGI application serving the auth, ride and join request routes of
+/api/v1 with async handlers, for servers such as uvicorn that keep
+many connections in flight per worker. It reuses the payload schemas
+of app.api and the data functions of app.data. The data functions
+block, AsyncDatabase runs them in a pool of threads inside an app
+context of the Flask app, so the event loop is never held up by the
+database.
+
+    $ SERVER=asyncio uvicorn run:app --workers 4
+"""
+from .app import AsyncApp, create_app
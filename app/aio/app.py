@@ -0,0 +1,300 @@
+"""ASGI application, requests and routing"""
+import asyncio
+import json
+import logging
+import re
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from itsdangerous import BadSignature
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+
+from app.core import create_app as create_flask_app
+from app.api.representations import get_dumps
+from app.archive import get_scheduler
+from app.events import get_bus
+from .db import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """Ends a request with status and a JSON body"""
+
+    def __init__(self, status, data, headers=None):
+        super().__init__(status, data)
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+
+class Stream:
+    """A response whose body is sent as an async iterator yields it"""
+
+    def __init__(self, chunks, content_type, headers=None):
+        """Create a streamed response
+
+        Args:
+            chunks: async generator of bytes, closed when the
+                    client disconnects
+            content_type (String): Content-Type of the body
+        """
+        self.chunks = chunks
+        self.headers = dict(headers or {}, **{"Content-Type": content_type})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class Request:
+    """An HTTP request of the ASGI app"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.args = {name: values[0] for name, values in
+                     parse_qs(scope['query_string'].decode('latin-1')).items()}
+        self.body = body
+        self.session = {}
+        self.loaded_session = {}
+
+    def get_json(self):
+        """Get the decoded JSON body, None if it is not JSON"""
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+    @property
+    def cookies(self):
+        cookie = SimpleCookie()
+        cookie.load(self.headers.get('cookie', ''))
+        return {name: morsel.value for name, morsel in cookie.items()}
+
+    def if_none_match(self, etag):
+        """Whether the If-None-Match header has etag, weak or strong"""
+        tags = self.headers.get('if-none-match')
+        if not tags:
+            return False
+        return any(tag.strip() in (etag, 'W/' + etag, '*') for tag in tags.split(','))
+
+
+class Router:
+    """Maps a method and path to an async handler"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.routes = []
+
+    def route(self, method, path):
+        """Register the decorated handler for method and path
+
+        Parts of path like <rideId> are passed to the handler
+        as keyword arguments.
+        """
+        pattern = re.compile("^{}{}$".format(
+            re.escape(self.prefix), re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", path)))
+
+        def register(handler):
+            self.routes.append((pattern, method, handler))
+            return handler
+        return register
+
+    def match(self, method, path):
+        """Get the handler and keyword arguments of a request
+
+        Raises HTTPError 404 or 405 when there is no such route.
+        """
+        path = path.rstrip('/') or '/'
+        allowed = False
+        for pattern, route_method, handler in self.routes:
+            found = pattern.match(path)
+            if found:
+                if route_method == method:
+                    return handler, found.groupdict()
+                allowed = True
+        if allowed:
+            raise HTTPError(405, {"message": "The method is not allowed for the requested URL."})
+        raise HTTPError(404, {"message": "The requested URL was not found on the server."})
+
+
+class AsyncApp:
+    """ASGI application of the API"""
+
+    def __init__(self, flask_app, router):
+        """Create the app
+
+        Args:
+            flask_app (Flask): app whose config, extensions and data
+                               layer the handlers use
+            router (Router): routes of the handlers
+        """
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.router = router
+        self.db = AsyncDatabase(flask_app, self.config['AIO_DB_THREADS'])
+        self.dumps = get_dumps(self.config['JSON_SERIALIZER'])
+        self._sessions = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.events = get_bus(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = await self.read_body(scope, receive)
+        if body is None:
+            error = RequestEntityTooLarge()
+            await self.respond(send, Request(scope, b''), error.code,
+                               {"message": error.description}, {})
+            return
+
+        request = Request(scope, body)
+        result = await self.handle(request)
+        if isinstance(result, Stream):
+            await self.stream(send, receive, result)
+        else:
+            await self.respond(send, request, *result)
+
+    async def read_body(self, scope, receive):
+        """Read the body of a request, None if it is over MAX_CONTENT_LENGTH"""
+        limit = self.config['MAX_CONTENT_LENGTH']
+        if limit is not None:
+            length = dict(scope['headers']).get(b'content-length', b'')
+            if length.isdigit() and int(length) > limit:
+                return None
+        body = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit is not None and size > limit:
+                return None
+            body.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(body)
+
+    async def handle(self, request):
+        """Get the status, body and headers of the response to request"""
+        self.load_session(request)
+        try:
+            handler, kwargs = self.router.match(request.method, request.path)
+            result = await handler(self, request, **kwargs)
+        except HTTPError as error:
+            return error.status, error.data, error.headers
+        except HTTPException as error:
+            # raised by the data layer's aborts
+            data = getattr(error, 'data', None) or {"message": error.description}
+            retry_after = dict(error.get_headers()).get('Retry-After')
+            return error.code, data, {"Retry-After": retry_after} if retry_after else {}
+        except Exception:
+            logger.exception("Exception on %s [%s]", request.path, request.method)
+            return 500, {"message": "Internal Server Error"}, {}
+
+        if isinstance(result, Stream):
+            return result
+        # handlers return data, status and optionally headers like
+        # flask_restplus resources
+        data, status, *headers = result
+        return status, data, headers[0] if headers else {}
+
+    async def respond(self, send, request, status, data, headers):
+        headers = dict(headers)
+        body = b''
+        if status != 304:
+            body = self.dumps(data) + b"\n"
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+
+        raw = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in headers.items()]
+        cookie = self.save_session(request)
+        if cookie:
+            raw.append((b'set-cookie', cookie.encode('latin-1')))
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, send, receive, stream):
+        """Send the chunks of stream until it ends or the client leaves"""
+        raw = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in stream.headers.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': raw})
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        chunk = None
+        try:
+            while True:
+                chunk = asyncio.ensure_future(stream.chunks.__anext__())
+                await asyncio.wait({chunk, disconnected},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not chunk.done():
+                    # the client left while the stream was idle
+                    return
+                try:
+                    body = chunk.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'body': body,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if chunk and not chunk.done():
+                chunk.cancel()
+                await asyncio.wait({chunk})
+            await stream.chunks.aclose()
+
+    def load_session(self, request):
+        """Read the Flask session cookie of request"""
+        value = request.cookies.get(self.config['SESSION_COOKIE_NAME'])
+        if value:
+            max_age = self.flask_app.permanent_session_lifetime.total_seconds()
+            try:
+                request.session = self._sessions.loads(value, max_age=max_age)
+            except BadSignature:
+                request.session = {}
+        request.loaded_session = dict(request.session)
+
+    def save_session(self, request):
+        """Get the Set-Cookie header of a changed session, None if unchanged"""
+        if request.session == request.loaded_session:
+            return None
+        name = self.config['SESSION_COOKIE_NAME']
+        if not request.session:
+            return f"{name}=; Expires=Thu, 01-Jan-1970 00:00:00 GMT; Max-Age=0; Path=/"
+        value = self._sessions.dumps(dict(request.session))
+        return f"{name}={value}; HttpOnly; Path=/"
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.events.listen(asyncio.get_running_loop())
+                scheduler = get_scheduler(self.flask_app)
+                if scheduler:
+                    scheduler.ensure_started()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.events.close(asyncio.get_running_loop())
+                self.db.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_app(config="dev"):
+    """Create the ASGI app of the API
+
+    Args:
+        config (String): name of the configuration, see config.app_configs
+    """
+    from .handlers import router
+
+    return AsyncApp(create_flask_app(config), router)
@@ -0,0 +1,38 @@
+"""Async access to the data layer"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabase:
+    """Runs blocking data functions in a pool of threads.
+
+    Each call runs inside its own app context of the Flask app, so it
+    takes a connection from the app's pool with get_db and gives it
+    back when it returns, as a Flask request does.
+    """
+
+    def __init__(self, flask_app, threads=16):
+        """Create the thread pool
+
+        Args:
+            flask_app (Flask): app whose config and connection pool are used
+            threads (Integer): data functions running at once
+        """
+        self.flask_app = flask_app
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="aio-db")
+
+    def _call(self, func, args, kwargs):
+        with self.flask_app.app_context():
+            return func(*args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Await func(*args, **kwargs) run in the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call, func, args, kwargs))
+
+    def close(self):
+        """Wait for running calls and stop the threads"""
+        self._executor.shutdown(wait=True)
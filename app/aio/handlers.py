@@ -0,0 +1,329 @@
+"""Async handlers of the /api/v1 routes served by the ASGI app.
+
+Responses match those of the Flask resources in app.api. Data
+functions that belong together are run as one call of the thread pool.
+"""
+import asyncio
+
+from flask_jwt_extended import create_access_token, decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from app.api.auth_ns import signup_schema, login_schema
+from app.api.ride_ns import ride_schema, join_schema, ride_etag, rides_etag, \
+    encode_cursor, decode_cursor
+from app.cache import sync_caches
+from app.events import ride_topic
+from app.validators import string_validator, datetime_validator
+from app.data.user_data import create_user, abort_if_user_found, \
+    get_user_by_email, verify_password, upgrade_password_hash
+from app.data.ride_data import create_ride, abort_active_ride, get_rides, \
+    get_rides_version, get_ride, get_ride_version, join_ride, get_ride_requests, \
+    RIDE_NOT_FOUND, OWN_RIDE, ALREADY_REQUESTED
+from .app import Router, HTTPError, Stream
+
+router = Router(prefix='/api/v1')
+
+
+def validate(schema, request):
+    """Get the valid values of the JSON body, HTTPError 400 if invalid"""
+    values, errors = schema.validate(request.get_json())
+    if errors:
+        raise HTTPError(400, {"message": "Input payload validation failed",
+                              "errors": errors})
+    return values
+
+
+def get_identity(app, request):
+    """Get the identity of the request's access token
+
+    Raises HTTPError like flask_jwt_extended's jwt_required.
+    """
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if not token:
+        raise HTTPError(401, {"msg": "Missing Authorization Header"})
+    if scheme != 'Bearer':
+        raise HTTPError(422, {"msg": "Bad Authorization header. "
+                                     "Expected 'Authorization: Bearer <JWT>'"})
+
+    # verified tokens are cached, see app.tokens, so this
+    # rarely does more than a dict lookup
+    with app.flask_app.app_context():
+        try:
+            claims = decode_token(token)
+        except ExpiredSignatureError:
+            raise HTTPError(401, {"msg": "Token has expired"})
+        except InvalidTokenError as error:
+            raise HTTPError(422, {"msg": str(error)})
+    return claims[app.config['JWT_IDENTITY_CLAIM']]
+
+
+def view_ride_url(ride_id):
+    """Path of GET /rides/<rideId>, as url_for("api_Bp.view_ride") gives it"""
+    return f"{router.prefix}/rides/{ride_id}"
+
+
+def _signup(name, email, password):
+    abort_if_user_found(email)
+    create_user(name, email, password)
+
+
+@router.route('POST', '/auth/signup')
+async def signup(app, request):
+    user_args = validate(signup_schema, request)
+    await app.db.run(_signup, user_args['name'], user_args['email'],
+                     user_args['password'])
+    return {
+        "message": "User Account Was Created Successfully.",
+        "login_link": "/api/v1/auth/login"
+    }, 201
+
+
+def _check_login(email, password):
+    user = get_user_by_email(email)
+    if user and verify_password(user[3], password):
+        upgrade_password_hash(user[0], user[3], password)
+        return tuple(user)
+    return None
+
+
+@router.route('POST', '/auth/login')
+async def login(app, request):
+    login_args = validate(login_schema, request)
+    user = await app.db.run(_check_login, login_args['email'], login_args['password'])
+
+    if user:
+        if 'userID' not in request.session:
+            request.session['userID'] = user[0]
+            with app.flask_app.app_context():
+                token = create_access_token(identity=user[0])
+            return {
+                "message": "Welcome back '{}'.".format(user[1]),
+                "access_token": token
+            }, 200
+
+        return {
+            "message": "Make sure to logout first",
+            "logout_link": "/api/v1/auth/logout"
+        }, 409
+
+    return {
+        "message": "Your email or password is invalid.Please register first",
+        "login_link": "/api/v1/auth/register"
+    }, 401
+
+
+@router.route('POST', '/auth/logout')
+async def logout(app, request):
+    if 'userID' in request.session:
+        request.session.pop('userID', None)
+        return {"message": "User Session was successfully ended"}, 200
+    return {
+        "message": "You must be logged In to logout",
+        "login_link": "/api/v1/auth/login"
+    }, 403
+
+
+def positive(value, name):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return number
+
+
+RIDES_ARGS = {
+    "limit": positive,
+    "starting_point": string_validator,
+    "destination": string_validator,
+    "departs_after": datetime_validator,
+    "departs_before": datetime_validator,
+    "seats": positive
+}
+
+
+def rides_args(request):
+    """Get the query arguments of GET /rides, HTTPError 400 if invalid"""
+    args, errors = {}, {}
+    for name, check in RIDES_ARGS.items():
+        value = request.args.get(name)
+        try:
+            args[name] = None if value is None else check(value, name)
+        except ValueError as error:
+            errors[name] = str(error)
+    if errors:
+        raise HTTPError(400, {"message": "Input payload validation failed",
+                              "errors": errors})
+    return args
+
+
+def _rides_page(after, limit, filters, not_modified):
+    # a current ETag is answered from the counter alone, otherwise
+    # the caches are synced to it so the page is no older than its ETag
+    version = get_rides_version()
+    etag = rides_etag(version)
+    if not_modified(etag):
+        return etag, None
+    sync_caches(version)
+    return etag, get_rides(after=after, limit=limit + 1, **filters)
+
+
+@router.route('GET', '/rides')
+async def view_rides(app, request):
+    get_identity(app, request)
+    args = rides_args(request)
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    filters = {
+        "starting_point": args['starting_point'],
+        "destination": args['destination'],
+        "departs_after": args['departs_after'],
+        "departs_before": args['departs_before'],
+        "min_seats": args['seats']
+    }
+    limit = min(args['limit'] or app.config['RIDES_PAGE_SIZE'],
+                app.config['RIDES_PAGE_MAX'])
+
+    etag, rides = await app.db.run(_rides_page, after, limit, filters,
+                                   request.if_none_match)
+    if rides is None:
+        return None, 304, {"ETag": etag}
+
+    # one extra ride tells whether there is a next page
+    next_cursor = None
+    if len(rides) > limit:
+        rides = rides[:limit]
+        next_cursor = encode_cursor(rides[-1]['id'])
+
+    return {"rides": rides, "next": next_cursor}, 200, {"ETag": etag}
+
+
+def _ride(ride_id, not_modified):
+    if not_modified is not None:
+        version = get_ride_version(ride_id)
+        if version and not_modified(ride_etag(int(ride_id), version)):
+            return ride_etag(int(ride_id), version), None
+    ride = get_ride(ride_id)
+    return ride and ride_etag(ride['id'], ride['version']), ride
+
+
+@router.route('GET', '/rides/<rideId>')
+async def view_ride(app, request, rideId):
+    get_identity(app, request)
+
+    has_etag = 'if-none-match' in request.headers
+    etag, ride = await app.db.run(_ride, rideId,
+                                  request.if_none_match if has_etag else None)
+    if etag and ride is None:
+        return None, 304, {"ETag": etag}
+    if ride:
+        return ride, 200, {"ETag": etag}
+    return {"message": f"Ride:{rideId} Does not exists"}, 404
+
+
+def _create_ride(driver, ride_args):
+    abort_active_ride(ride_args['depart_time'], ride_args['eta'], driver)
+    return create_ride(driver=driver, **ride_args)
+
+
+@router.route('POST', '/users/rides')
+async def create_ride_offer(app, request):
+    driver = get_identity(app, request)
+    ride_args = validate(ride_schema, request)
+
+    ride_id = await app.db.run(_create_ride, driver, ride_args)
+    return {
+        "message": "New ride offer was created",
+        "view_ride": view_ride_url(ride_id)
+    }, 201
+
+
+@router.route('POST', '/rides/<rideId>/requests')
+async def request_ride(app, request, rideId):
+    passenger = get_identity(app, request)
+    req_args = validate(join_schema, request)
+
+    outcome, reqID = await app.db.run(join_ride, rideId, passenger,
+                                      req_args['destination'])
+
+    if outcome == RIDE_NOT_FOUND:
+        return {"message": f"Ride:{rideId} Does not exists"}, 404
+
+    if outcome == OWN_RIDE:
+        return {"message": "You cannot make a request to your own ride"}, 400
+
+    if outcome == ALREADY_REQUESTED:
+        return {"message": "You have already made a request to join this ride"}, 409
+
+    return {
+        "message": "You have requested to join the ride",
+        "view_request": '/api/v1/users/rides/{}/requests/{}'.format(rideId, reqID)
+    }, 201
+
+
+def sse(dumps, event, data):
+    """Format an event of a text/event-stream"""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@router.route('GET', '/users/rides/<rideId>/requests/stream')
+async def stream_ride_requests(app, request, rideId):
+    """Stream the requests of a ride to its driver as server-sent events
+
+    The current requests are sent first as a "requests" event, then
+    every request made, retracted or accepted/rejected as it happens.
+    A client more than EVENTS_QUEUE_SIZE events behind is sent an
+    "overflow" event and the stream ends.
+    """
+    driver = get_identity(app, request)
+    ride = await app.db.run(get_ride, rideId)
+    if not ride:
+        return {"message": f"Ride:{rideId} Does not exists"}, 404
+    if ride['driver'] != driver:
+        return {"message": "Your not authorized to view these requests"}, 401
+
+    # events are published on the thread pool and the sockets of other
+    # workers, subscribing before the snapshot means none is missed
+    loop = asyncio.get_running_loop()
+    app.events.listen(loop)
+    queue = asyncio.Queue(app.config['EVENTS_QUEUE_SIZE'])
+    overflowed = asyncio.Event()
+
+    def push(event):
+        # a client that falls EVENTS_QUEUE_SIZE events behind is sent
+        # away to reconnect for a fresh snapshot, rather than buffered
+        if queue.full():
+            overflowed.set()
+        else:
+            queue.put_nowait(event)
+
+    unsubscribe = app.events.subscribe(
+        ride_topic(ride['id']),
+        lambda event: loop.call_soon_threadsafe(push, event))
+    try:
+        requests = await app.db.run(get_ride_requests, ride['id'])
+    except BaseException:
+        unsubscribe()
+        raise
+
+    heartbeat = app.config['EVENTS_HEARTBEAT']
+
+    async def events():
+        try:
+            yield sse(app.dumps, "requests", requests)
+            while not overflowed.is_set():
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle stream
+                    yield b": keep-alive\n\n"
+                    continue
+                yield sse(app.dumps, event['event'], event)
+            yield sse(app.dumps, "overflow", {
+                "message": "Too many events were waiting, reconnect for the requests"})
+        finally:
+            unsubscribe()
+
+    return Stream(events(), "text/event-stream",
+                  {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,8 +1,10 @@
 from flask import Blueprint
 from flask_restplus import Api
 
+from .representations import output_json, compress_response
 from .auth_ns import auth_ns as Authentication_Namespace
 from .ride_ns import ride_ns as Rides_Namespace
+from .stats_ns import stats_ns as Stats_Namespace
 
 api_bp = Blueprint("api_Bp", __name__, url_prefix="/api/v1")
 
@@ -16,3 +18,7 @@ api = Api(api_bp, title="RMI-API",version="1.0",
 
 api.add_namespace(Authentication_Namespace)
 api.add_namespace(Rides_Namespace)
+api.add_namespace(Stats_Namespace)
+
+api.representations['application/json'] = output_json
+api_bp.after_request(compress_response)
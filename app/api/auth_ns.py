@@ -1,22 +1,28 @@
 """Defines the Authentication Resources"""
 from flask import session
-from flask_restplus import Namespace, Resource, reqparse, fields
+from flask_restplus import Namespace, Resource
 from flask_jwt_extended import create_access_token
 
-from app.validators import string_validator, email_validator, length_validator
+from app.schema import Schema, String, Email, Password
 
 from app.data.user_data import create_user, abort_if_user_found, \
-                                get_user_by_email, verify_password
+                                get_user_by_email, verify_password, \
+                                upgrade_password_hash
 
 auth_ns = Namespace('Authentication', 
                     description="User authentication operations", 
                     path='/auth')
 
-# new_user= api.model("New_user",{
-#     "name": fields.String(required=True, description='name of the new user'),
-#     "email": fields.String(required=True, description='email of the new user'),
-#     "password": fields.String(required=True, description='password for the new user')
-# })
+signup_schema = Schema("New_user", {
+    "name": String(description='name of the new user'),
+    "email": Email(description='email of the new user'),
+    "password": Password(description='password for the new user')
+})
+
+login_schema = Schema("Login", {
+    "email": Email(description='email of the user'),
+    "password": Password(description='password of the user')
+})
 
 @auth_ns.route('/signup', endpoint="signup")
 class SignupResource(Resource):
@@ -24,23 +30,15 @@ class SignupResource(Resource):
     
     endpoint: /signup
     """
-    user_parser = reqparse.RequestParser()
-    user_parser.add_argument('name', type=string_validator,
-                                    required=True,location='json')
-
-    user_parser.add_argument('email', type=email_validator,
-                                    required=True, location='json')
-
-    user_parser.add_argument('password', type=length_validator,
-                                    required=True, location='json')   
-
-    @auth_ns.doc('user_signup',parser=user_parser, 
-                 responses={201: 'user account created successfully'})
+    @auth_ns.expect(signup_schema.model(auth_ns))
+    @auth_ns.doc('user_signup',
+                 responses={201: 'user account created successfully',
+                            503: 'Too many sign ups, retry after Retry-After seconds'})
     def post(self):
         """Creates a new user: Sign Up
         """
 
-        user_args = self.user_parser.parse_args()
+        user_args = signup_schema.parse()
 
         email = user_args['email']
         abort_if_user_found(email)
@@ -63,30 +61,26 @@ class LoginResource(Resource):
     endpoint: /login
     """
 
-    login_parser = reqparse.RequestParser()
-    login_parser.add_argument('email', type=email_validator, 
-                                required=True, location='json')
-
-    login_parser.add_argument('password', type=length_validator, 
-                                required=True, location='json')
-
-    @auth_ns.doc('user_login',parser=login_parser, 
+    @auth_ns.doc('user_login',
         responses={
             200: 'Welcome User back',
             409: 'Inform User to logout first',
-            401: 'Invalid login credentials'
+            401: 'Invalid login credentials',
+            503: 'Too many logins, retry after Retry-After seconds'
         })
-    @auth_ns.expect(login_parser)
+    @auth_ns.expect(login_schema.model(auth_ns))
     def post(self):
         """Starts a User session: Login
         """
-        login_args = self.login_parser.parse_args()
+        login_args = login_schema.parse()
 
         email = login_args['email']
 
         user = get_user_by_email(email)
 
         if user and verify_password(user[3], login_args['password']):
+            upgrade_password_hash(user[0], user[3], login_args['password'])
+
             # login user
             if 'userID' not in session:
                 session['userID'] = user[0]
@@ -0,0 +1,103 @@
+"""JSON representation and response compression of the API.
+
+Responses are serialised with orjson when it is installed, falling back
+to the standard library's json. Set JSON_SERIALIZER to pick one.
+Responses of COMPRESS_MIN_SIZE bytes or more are gzip or deflate
+compressed at COMPRESS_LEVEL when the client accepts it.
+"""
+import gzip
+import json
+import zlib
+
+from flask import current_app, make_response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SERIALIZERS = ('auto', 'orjson', 'json')
+ENCODINGS = ('gzip', 'deflate')
+
+
+def _dumps_json(data, indent=None):
+    return json.dumps(data, indent=indent, separators=(',', ': ') if indent
+                      else (',', ':')).encode()
+
+
+def _dumps_orjson(data, indent=None):
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, option=option)
+
+
+def get_dumps(name='auto'):
+    """Get the serialiser called name
+
+    Args:
+        name (String): one of SERIALIZERS, 'auto' picks orjson
+                       when it is installed
+
+    Returns:
+        callable: serialises data to bytes
+    """
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown JSON_SERIALIZER '{name}', use one of {SERIALIZERS}")
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_SERIALIZER 'orjson' needs orjson, install orjson")
+
+    if name == 'json' or orjson is None:
+        return _dumps_json
+    return _dumps_orjson
+
+
+def output_json(data, code, headers=None):
+    """Makes a Flask response with a JSON encoded body"""
+    dumps = get_dumps(current_app.config['JSON_SERIALIZER'])
+    dumped = dumps(data, indent=current_app.debug) + b"\n"
+
+    resp = make_response(dumped, code)
+    resp.mimetype = 'application/json'
+    resp.headers.extend(headers or {})
+    return resp
+
+
+def compress(data, encoding, level):
+    """Compress data with a content encoding: gzip or deflate"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    return zlib.compress(data, level)
+
+
+def compress_response(response):
+    """Compress the body of a response if the client accepts it
+
+    Streamed responses, bodies smaller than COMPRESS_MIN_SIZE and
+    mimetypes not in COMPRESS_MIMETYPES are left alone. A strong
+    ETag is made weak, the compressed body is not byte for byte the
+    representation it names.
+    """
+    config = current_app.config
+    if response.mimetype not in config['COMPRESS_MIMETYPES'] \
+            or response.is_streamed or response.direct_passthrough:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.status_code < 200 or response.status_code in (204, 304) \
+            or 'Content-Encoding' in response.headers \
+            or response.calculate_content_length() < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if not encoding:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding,
+                               config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
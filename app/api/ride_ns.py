@@ -1,14 +1,28 @@
 """Defines ride Resources"""
+import json
+from datetime import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as DecodeError
+
+from flask import current_app, request, Response, stream_with_context
+from werkzeug.http import quote_etag
 from flask.helpers import url_for
 from flask_restplus import Namespace, Resource, \
-                            reqparse, abort, fields
+                            reqparse, abort, inputs
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from app.validators import string_validator, \
-                            date_validator, action_validator
-
-from app.data.ride_data import create_ride, get_rides,\
-    get_ride, make_request, abort_ride_request_already_made, \
+from app.cache import sync_caches
+from app.validators import string_validator, datetime_validator, \
+                            latitude_validator, longitude_validator, \
+                            DATE_FORMAT
+from app.schema import Schema, String, Integer, Number, FutureDateTime, \
+                            Choice, both_or_neither
+
+from app.data.ride_data import create_ride, create_rides, \
+    get_rides, iter_rides, \
+    search_rides, search_terms, nearby_rides, \
+    get_ride_version, get_rides_version, \
+    get_ride, join_ride, RIDE_NOT_FOUND, OWN_RIDE, ALREADY_REQUESTED, \
     retract_request, get_ride_requests, \
     abort_request_not_found, get_request, \
     update_request_status, update_ride, \
@@ -18,16 +32,92 @@ ride_ns = Namespace("Ride", description="Ride operations",
                     path="/")
 
 
-ride = ride_ns.model('Ride',{
-    "starting_point": fields.String(description='Where the ride starts'),
-    "destination": fields.String(description='Where the ride is going'),
-    "depart_time":fields.String(description='Time when the ride starts'),
-    "eta":fields.String(description='Time when the ride is expected to arrive'),
-    "seats": fields.Integer(description='The Number of available spaces/passengers'),
-    "vehicle": fields.String(description='Plates for the vehicle'),
-    "driver": fields.String(description='The driver of the ride')
+# payload of POST /users/rides, PUT /users/rides/<rideId> and
+# of each ride of POST /users/rides/batch
+ride_schema = Schema("RideOffer", {
+    "starting_point": String(description='Where the ride starts'),
+    "destination": String(description='Where the ride is going'),
+    "depart_time": FutureDateTime(description='Time when the ride starts'),
+    "eta": FutureDateTime(description='Time when the ride is expected to arrive'),
+    "seats": Integer(description='The Number of available spaces/passengers'),
+    "vehicle": String(description='Plates for the vehicle'),
+    "start_lat": Number(-90, 90, required=False,
+                        description='Latitude where the ride starts'),
+    "start_lon": Number(-180, 180, required=False,
+                        description='Longitude where the ride starts')
+}, checks=[both_or_neither("start_lat", "start_lon")])
+ride_offer = ride_schema.model(ride_ns)
+
+join_schema = Schema("JoinRequest", {
+    "destination": String(description='Town the passenger is headed to')
+})
+
+action_schema = Schema("RequestAction", {
+    "action": Choice(("rejected", "accepted"),
+                     description='What the driver does with the request')
 })
 
+
+
+def encode_cursor(ride_id):
+    """Make the opaque pagination cursor that points after ride_id"""
+    return urlsafe_b64encode(str(ride_id).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Get the ride id a pagination cursor points after
+
+    Aborts with 400 if the cursor was not made by encode_cursor
+    """
+    try:
+        return int(urlsafe_b64decode(cursor.encode()).decode())
+    except (DecodeError, UnicodeError, ValueError):
+        abort(400, "Invalid pagination cursor")
+
+
+NDJSON = 'application/x-ndjson'
+
+
+def ride_etag(ride_id, version):
+    """ETag of a ride at a version"""
+    return quote_etag(f"ride-{ride_id}-{version}")
+
+
+def rides_etag(version):
+    """ETag of the ride listings at a version of the rides counter"""
+    return quote_etag(f"rides-{version}")
+
+
+def not_modified(etag):
+    """Get a 304 response if the client already has etag, else None"""
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers={"ETag": etag})
+
+
+def wants_stream(stream_arg):
+    """Whether the client asked for a newline delimited JSON stream"""
+    if stream_arg:
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON])
+    return best == NDJSON
+
+
+def stream_rides(rides, chunk_size=64 * 1024):
+    """Serialise rides as newline delimited JSON
+
+    Lines are sent in chunks of about chunk_size bytes.
+    """
+    chunk, size = [], 0
+    for ride in rides:
+        line = json.dumps(ride) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
 # ride_list = ride_ns.model("ride_list", {
 #     'id': fields.String(required=True, description='The ID of a ride'),
 #     'ride': fields.Nested(ride, description='The Ride')
@@ -40,27 +130,8 @@ class RideCreation(Resource):
     
     Handles /users/rides
     """
-    ride_parser = reqparse.RequestParser()
-    ride_parser.add_argument('starting_point', type=string_validator,
-                                required=True, location='json')
-    
-    ride_parser.add_argument('destination', type=string_validator,
-                                required=True, location='json')
-
-    ride_parser.add_argument('depart_time', type=date_validator,
-                                required=True, location='json')
-
-    ride_parser.add_argument('eta', type=date_validator,
-                                required=True, location='json')
-    
-    ride_parser.add_argument('seats', type=int,
-                                required=True, location='json')
-    
-    ride_parser.add_argument('vehicle', type=string_validator,
-                                required=True, location='json')
-
-    @ride_ns.doc("user_create_ride",   
-        parser=ride_parser, security="bearer",
+    @ride_ns.expect(ride_offer)
+    @ride_ns.doc("user_create_ride", security="bearer",
         response={
             201: "New ride offer was Created"
         }
@@ -70,9 +141,10 @@ class RideCreation(Resource):
         """Creates a new ride
         """
         
-        ride_args = self.ride_parser.parse_args()
+        ride_args = ride_schema.parse()
 
-        abort_active_ride(ride_args['eta'], get_jwt_identity())
+        abort_active_ride(ride_args['depart_time'], ride_args['eta'],
+                          get_jwt_identity())
         
         ride_id = create_ride(driver=get_jwt_identity(), **ride_args)
         return {
@@ -81,21 +153,247 @@ class RideCreation(Resource):
         }, 201
 
 
+@ride_ns.route("/users/rides/batch", endpoint="create_rides")
+class RideBatchCreation(Resource):
+    """Create many rides at once
+
+    Handles /users/rides/batch
+    """
+
+    @ride_ns.doc("user_create_rides", security="bearer",
+        params={"rides": "List of rides, each like POST /users/rides"},
+        response={
+            201: "All the ride offers were created",
+            207: "Some of the ride offers were created",
+            400: "None of the ride offers were created"
+        }
+    )
+    @jwt_required()
+    def post(self):
+        """Creates many rides in one transaction
+
+        Each ride is validated and checked for overlaps on its own,
+        the result of each is reported in the order they were sent.
+        """
+        payload = request.get_json(silent=True)
+        items = payload.get('rides') if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items:
+            abort(400, "rides must be a list of ride offers")
+
+        batch_max = current_app.config['RIDES_BATCH_MAX']
+        if len(items) > batch_max:
+            abort(400, f"At most {batch_max} rides can be created at once")
+
+        results, valid = [], []
+        now = datetime.now()
+        for item in items:
+            ride_args, errors = ride_schema.validate(item, now)
+            if errors:
+                results.append({"status": 400, "errors": errors})
+            else:
+                results.append(None)
+                valid.append(ride_args)
+
+        created = iter(create_rides(get_jwt_identity(), valid))
+        for index, result in enumerate(results):
+            if result is not None:
+                continue
+            ride_id, clash = next(created)
+            if clash is None:
+                results[index] = {
+                    "status": 201,
+                    "view_ride": url_for("api_Bp.view_ride", rideId=ride_id)
+                }
+            else:
+                eta = clash.strftime(DATE_FORMAT)
+                results[index] = {
+                    "status": 409,
+                    "message": f"You have an uncompleted ride that is before-{eta}"
+                }
+
+        count = sum(result['status'] == 201 for result in results)
+        status = 201 if count == len(results) else 207 if count else 400
+        return {
+            "message": f"{count} of {len(results)} ride offers were created",
+            "rides": results
+        }, status
+
+
 @ride_ns.route("/rides", endpoint="view_rides")
 class RidesResource(Resource):
     """Handles Rides Resource
     
     endpoint: /rides
     """
+    rides_parser = reqparse.RequestParser()
+    rides_parser.add_argument('cursor', type=str, location='args',
+                              help='Cursor from the "next" of the previous page')
+
+    rides_parser.add_argument('limit', type=inputs.positive, location='args',
+                              help='Maximum number of rides in the page')
+
+    rides_parser.add_argument('starting_point', type=string_validator,
+                              location='args')
+
+    rides_parser.add_argument('destination', type=string_validator,
+                              location='args')
+
+    rides_parser.add_argument('departs_after', type=datetime_validator,
+                              location='args', help='dd-mm-YYYY HH:MM')
 
-    @ride_ns.doc('view_all_rides', security="bearer",
-                    responses={200: 'Success, retrieved rides'})
+    rides_parser.add_argument('departs_before', type=datetime_validator,
+                              location='args', help='dd-mm-YYYY HH:MM')
+
+    rides_parser.add_argument('seats', type=inputs.positive, location='args',
+                              help='Minimum number of free seats')
+
+    rides_parser.add_argument('stream', type=inputs.boolean, location='args',
+                              help='Stream every matching ride as '
+                                   'newline delimited JSON')
+
+    @ride_ns.doc('view_all_rides', parser=rides_parser, security="bearer",
+                    responses={200: 'Success, retrieved rides',
+                               304: 'No ride has changed'})
     @jwt_required()
     def get(self):
-        """Get all available rides
+        """Get a page of available rides
+
+        Pass the "next" cursor of a page to get the page after it.
+        With stream=1 or "Accept: application/x-ndjson" every matching
+        ride is streamed instead, one JSON object per line.
+
+        Pages carry an ETag that changes with any ride, 304 is returned
+        when If-None-Match has the current one.
         """
-        rides = get_rides()
-        return rides, 200
+        args = self.rides_parser.parse_args()
+
+        after = decode_cursor(args['cursor']) if args['cursor'] else None
+        filters = {
+            "starting_point": args['starting_point'],
+            "destination": args['destination'],
+            "departs_after": args['departs_after'],
+            "departs_before": args['departs_before'],
+            "min_seats": args['seats']
+        }
+
+        if wants_stream(args['stream']):
+            rides = iter_rides(after=after, limit=args['limit'], **filters)
+            return Response(stream_with_context(stream_rides(rides)),
+                            mimetype=NDJSON)
+
+        # a current ETag is answered from the counter alone, otherwise
+        # the caches are synced to it so the page is no older than its ETag
+        version = get_rides_version()
+        etag = rides_etag(version)
+        if request.if_none_match:
+            response = not_modified(etag)
+            if response:
+                return response
+        sync_caches(version)
+
+        limit = min(args['limit'] or current_app.config['RIDES_PAGE_SIZE'],
+                    current_app.config['RIDES_PAGE_MAX'])
+
+        # one extra ride tells whether there is a next page
+        rides = get_rides(after=after, limit=limit + 1, **filters)
+
+        next_cursor = None
+        if len(rides) > limit:
+            rides = rides[:limit]
+            next_cursor = encode_cursor(rides[-1]['id'])
+
+        return {
+            "rides": rides,
+            "next": next_cursor
+        }, 200, {"ETag": etag}
+
+
+@ride_ns.route("/rides/search", endpoint="search_rides")
+class RideSearch(Resource):
+    """Handles searching for rides
+
+    endpoint: /rides/search
+    """
+    search_parser = reqparse.RequestParser()
+    search_parser.add_argument('q', type=string_validator, required=True,
+                               location='args',
+                               help='Towns to look for, e.g. "nai voi"')
+
+    search_parser.add_argument('limit', type=inputs.positive, location='args',
+                               help='Maximum number of rides')
+
+    @ride_ns.doc('search_rides', parser=search_parser, security="bearer",
+                 responses={
+                    200: 'Success, rides matching the search',
+                    400: 'Nothing to search for'
+                 })
+    @jwt_required()
+    def get(self):
+        """Search rides by where they start or go
+
+        Each word matches the start of a word in the starting
+        point or the destination, best matches come first.
+        """
+        args = self.search_parser.parse_args()
+
+        if not search_terms(args['q']):
+            abort(400, "Search for at least one word")
+
+        limit = min(args['limit'] or current_app.config['RIDES_PAGE_SIZE'],
+                    current_app.config['RIDES_PAGE_MAX'])
+
+        return {
+            "rides": search_rides(args['q'], limit)
+        }, 200
+
+
+@ride_ns.route("/rides/nearby", endpoint="nearby_rides")
+class NearbyRides(Resource):
+    """Handles finding rides that start near a point
+
+    endpoint: /rides/nearby
+    """
+    nearby_parser = reqparse.RequestParser()
+    nearby_parser.add_argument('lat', type=latitude_validator, required=True,
+                               location='args', help='Latitude in degrees')
+
+    nearby_parser.add_argument('lon', type=longitude_validator, required=True,
+                               location='args', help='Longitude in degrees')
+
+    nearby_parser.add_argument('radius', type=float, location='args',
+                               help='Search radius in km')
+
+    nearby_parser.add_argument('limit', type=inputs.positive, location='args',
+                               help='Maximum number of rides')
+
+    @ride_ns.doc('nearby_rides', parser=nearby_parser, security="bearer",
+                 responses={
+                    200: 'Success, rides starting near the point',
+                    400: 'Invalid point or radius'
+                 })
+    @jwt_required()
+    def get(self):
+        """Get rides that have not left and start near a point
+
+        The nearest rides come first, each with its distance_km.
+        """
+        args = self.nearby_parser.parse_args()
+        config = current_app.config
+
+        radius = args['radius']
+        if radius is None:
+            radius = config['NEARBY_RADIUS_KM']
+        if not 0 < radius <= config['NEARBY_RADIUS_MAX_KM']:
+            abort(400, "radius must be more than 0 and at most "
+                       f"{config['NEARBY_RADIUS_MAX_KM']} km")
+
+        limit = min(args['limit'] or config['RIDES_PAGE_SIZE'],
+                    config['RIDES_PAGE_MAX'])
+
+        return {
+            "rides": nearby_rides(args['lat'], args['lon'], radius, limit,
+                                  departs_after=datetime.now())
+        }, 200
 
 
 @ride_ns.route("/rides/<rideId>", endpoint="view_ride")
@@ -109,19 +407,29 @@ class RideResource(Resource):
         security="bearer",
         response={
             404: "Ride does not exist",
-            200: "Ride was Found"
+            200: "Ride was Found",
+            304: "Ride has not changed"
         }
     )
     @jwt_required()
     def get(self,rideId):
         """Gets a rides whose id is specified
+
+        Responds 304 when If-None-Match has the ride's current ETag,
+        only the ride's version is read then.
         
         Arguments:
             rideId {String} -- Unique Ride identifier.
         """
+        if request.if_none_match:
+            version = get_ride_version(rideId)
+            response = version and not_modified(ride_etag(int(rideId), version))
+            if response:
+                return response
+
         ride  = get_ride(rideId)
         if ride:
-            return ride, 200
+            return ride, 200, {"ETag": ride_etag(ride['id'], ride['version'])}
         return {
             "message":f"Ride:{rideId} Does not exists"
         }, 404
@@ -133,31 +441,13 @@ class RideUpdate(Resource):
 
     PUT /users/rides/<rideId>"""
 
-    update_ride_parser = reqparse.RequestParser()
-    update_ride_parser.add_argument('starting_point', type=string_validator,
-                                required=True, location='json')
-    
-    update_ride_parser.add_argument('destination', type=string_validator,
-                                required=True, location='json')
-
-    update_ride_parser.add_argument('depart_time', type=date_validator,
-                                required=True, location='json')
-
-    update_ride_parser.add_argument('eta', type=date_validator,
-                                required=True, location='json')
-    
-    update_ride_parser.add_argument('seats', type=int,
-                                required=True, location='json')
-    
-    update_ride_parser.add_argument('vehicle', type=string_validator,
-                                required=True, location='json')
-    
+    @ride_ns.expect(ride_offer)
     @ride_ns.doc("update_a_ride", 
-        parser=update_ride_parser, 
         params={"rideId": "Unique Ride identifier"},
         security="bearer",
         response={
             404: "Ride to update Not found",
+            409: "Ride has arrived and can no longer be changed",
             200: "Ride Update was a sucess",
             401: "User Not allowed to update the ride"
         },
@@ -172,7 +462,7 @@ class RideUpdate(Resource):
         ride = get_ride(rideId)
         if ride:
             if ride['driver'] in get_jwt_identity():
-                update_ride_args = self.update_ride_parser.parse_args()
+                update_ride_args = ride_schema.parse()
                 update_ride(rideId, **update_ride_args)
                 return {
                     "message":"Ride details were update",
@@ -193,16 +483,14 @@ class RideRequest(Resource):
 
     endpoint: /api/v1/rides/<rideId>/requests
     """
-    req_parser = reqparse.RequestParser()
-    req_parser.add_argument('destination', type=string_validator,
-                            required=True, location='json')
-    
-    @ride_ns.doc("request_ride", parser=req_parser,
+    @ride_ns.expect(join_schema.model(ride_ns))
+    @ride_ns.doc("request_ride",
         params={"rideId": "Unique Identifier of a ride"},
         security="bearer",
         response={
             404: "Ride was not found",
             400: "Not allowed to request on ride",
+            409: "Already requested to join the ride",
             201: "Request on ride was successful"
         },
     )
@@ -214,25 +502,25 @@ class RideRequest(Resource):
             rideID{Integer} -- Unique Identifier of a ride
         """
 
-        req_args = self.req_parser.parse_args()
-        ride_to_request = get_ride(rideId)
-        passenger = get_jwt_identity()
+        req_args = join_schema.parse()
+        outcome, reqID = join_ride(rideId, get_jwt_identity(),
+                                   req_args['destination'])
 
-        if not ride_to_request:
+        if outcome == RIDE_NOT_FOUND:
             return {
                 "message":f"Ride:{rideId} Does not exists"
             }, 404
 
-        if ride_to_request["driver"] == passenger:
+        if outcome == OWN_RIDE:
         
             return{
                 "message":"You cannot make a request to your own ride"
             }, 400
         
-        abort_ride_request_already_made(rideId, passenger)
-
-
-        reqID = make_request(rideId, passenger, req_args['destination'])
+        if outcome == ALREADY_REQUESTED:
+            return {
+                "message": "You have already made a request to join this ride"
+            }, 409
 
         return{
             "message": "You have requested to join the ride",
@@ -280,6 +568,7 @@ class RideRequests(Resource):
     @ride_ns.doc('retract_request',
         response={
             404: 'Ride does not exist',
+            409: 'Ride has arrived and can no longer be changed',
             200: 'Success, Request to ride was retracted'
         },
         params={'rideId': 'Unique Indentifier of a ride'},
@@ -306,66 +595,54 @@ class RideRequests(Resource):
         }, 200
 
 
-# TODO: enable this endpoint to accept and reject endpoints
-
-# @api.route('users/rides/<rideId>requests/<requestId>', 
-#             endpoint="request_action")
-# class RequestAction(Resource):
-#     """Handles Request Action:accept or reject
+@ride_ns.route('/users/rides/<rideId>/requests/<requestId>',
+              endpoint="request_action")
+class RequestAction(Resource):
+    """Handles Request Action:accept or reject
     
-#     endpoint /api/v1/rides/<rideId>/requests/<requestId>
-#     """
-#     action_parser = reqparse.RequestParser()
-#     action_parser.add_argument('action', type=action_validator, 
-#                                 location='json', required=True)
-    
-#     @api.doc("request_action", parser=action_parser,
-#         params={
-#             "rideId": "Unique Ride Identifier",
-#             "requestId": "Unique Request Identifier"
-#         },
-#         response={
-#             404: "Ride or Request Not found",
-#             401: "Forbidden to view requests on a ride",
-#             200: "Success Action on request",
-#             409: "Duplicate Action on request"
-#         },
-#         security="bearer"
-#     )
-#     @jwt_required
-#     def put(self, rideId, requestId):
-#         """Toggles request status: rejected / accepted
-#         """
-
-#         if not get_ride(rideId):
-            
-#             return {
-#                 "message":"Ride:{} Does not exists".format(rideId)
-#             }, 404
-
-#         ride = get_ride(rideId)
-#         if ride['driver'] not in get_jwt_identity():
-#             return {
-#                 "message": "Your not authorized to view these requests"
-#             }, 401
-        
-
-#         if abort_request_not_found(requestId):
-            
-        
-#         action_arg = self.action_parser.parse_args()
-        
-#         req = get_request(requestId)
+    endpoint /api/v1/users/rides/<rideId>/requests/<requestId>
+    """
+    @ride_ns.expect(action_schema.model(ride_ns))
+    @ride_ns.doc("request_action",
+        params={
+            "rideId": "Unique Ride Identifier",
+            "requestId": "Unique Request Identifier"
+        },
+        response={
+            404: "Ride or Request Not found",
+            401: "Forbidden to view requests on a ride",
+            200: "Success Action on request",
+            409: "Duplicate Action on request or the ride is full"
+        },
+        security="bearer"
+    )
+    @jwt_required()
+    def put(self, rideId, requestId):
+        """Toggles request status: rejected / accepted
 
-#         if req['status'] == action_arg['action']:
-#             return {
-#                 "message": "Ride request has already been '{}'".format(action_arg['action'])
-#             }, 409
+        Accepting a request takes one of the ride's seats,
+        rejecting an accepted request gives it back.
+        """
+        ride = get_ride(rideId)
+        if not ride:
+            return {
+                "message":"Ride:{} Does not exists".format(rideId)
+            }, 404
 
-#         update_request_status(action_arg['action'], requestId) 
-#         msg = "Ride Request has been '{}'".format(get_request(requestId)['status'])
-#         return {
-#             "message":msg
-#         }, 200
+        if ride['driver'] != get_jwt_identity():
+            return {
+                "message": "Your not authorized to view these requests"
+            }, 401
 
+        req = get_request(requestId)
+        if not req or req['ride_id'] != ride['id']:
+            return {
+                "message": "Request to join this ride does not exist"
+            }, 404
+        
+        action_arg = action_schema.parse()
 
+        status = update_request_status(action_arg['action'], requestId)
+        return {
+            "message": "Ride Request has been '{}'".format(status)
+        }, 200
@@ -0,0 +1,35 @@
+"""Defines the worker Stats Resource"""
+from flask_restplus import Namespace, Resource
+from flask_jwt_extended import jwt_required
+
+from app.db import get_pool
+from app.cache import cache_stats
+from app.hashing import get_hasher
+from app.events import get_bus
+from app.archive import get_scheduler
+
+stats_ns = Namespace("Stats", description="Worker process statistics",
+                     path="/stats")
+
+
+@stats_ns.route("", endpoint="worker_stats")
+class StatsResource(Resource):
+    """Handles the worker stats resource
+
+    endpoint: /stats
+    """
+
+    @stats_ns.doc("worker_stats", security="bearer",
+                  responses={200: "Stats of the worker that served the request"})
+    @jwt_required()
+    def get(self):
+        """Get the counters of the worker serving the request
+        """
+        scheduler = get_scheduler()
+        return {
+            "db_pool": get_pool().stats(),
+            "caches": cache_stats(),
+            "password_hasher": get_hasher().stats(),
+            "events": get_bus().stats(),
+            "archive": scheduler.stats() if scheduler else None
+        }, 200
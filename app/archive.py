@@ -0,0 +1,177 @@
+"""Archival of rides that have arrived.
+
+Rides are never removed, so the rides and requests tables would hold
+every ride ever offered. Rides whose eta passed ARCHIVE_AFTER_HOURS ago
+are moved, with their join requests, to rides_archive and
+requests_archive. get_ride still finds them there.
+
+Rides are moved ARCHIVE_BATCH_SIZE at a time, each batch in its own
+short write transaction, so live writers wait for one batch at most.
+On PostgreSQL rides locked by a live transaction are skipped and moved
+by a later run.
+
+`flask db archive` moves them once. With ARCHIVE_INTERVAL set, each
+worker also runs the archival every ARCHIVE_INTERVAL seconds in a
+background thread; runs of different workers skip each other's rides.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .db import write_transaction
+from .cache import invalidate_rides
+
+logger = logging.getLogger(__name__)
+
+RIDE_COLUMNS = "id, starting_point, destination, depart_time, eta, seats, " \
+               "vehicle, driver, start_lat, start_lon, start_geohash, version"
+REQUEST_COLUMNS = "id, ride_id, user_id, destination, req_status"
+
+
+def archive_batch(before, batch_size):
+    """Move the rides that arrived first before `before`
+
+    Args:
+        before (Datetime): rides with an earlier eta are moved
+        batch_size (Integer): most rides moved
+
+    Returns:
+        Integer: number of rides moved
+    """
+    with write_transaction() as db:
+        query = "SELECT id FROM rides WHERE eta<? ORDER BY eta LIMIT ?"
+        if db.dialect == 'postgresql':
+            query += " FOR UPDATE SKIP LOCKED"
+        ride_ids = [row[0] for row in db.execute(query, (before, batch_size)).fetchall()]
+        if not ride_ids:
+            return 0
+
+        marks = ", ".join("?" * len(ride_ids))
+        db.execute(f"""INSERT INTO rides_archive ({RIDE_COLUMNS})
+            SELECT {RIDE_COLUMNS} FROM rides WHERE id IN ({marks})""", ride_ids)
+        db.execute(f"""INSERT INTO requests_archive ({REQUEST_COLUMNS})
+            SELECT {REQUEST_COLUMNS} FROM requests WHERE ride_id IN ({marks})""", ride_ids)
+        # requests first, they reference the rides
+        db.execute(f"DELETE FROM requests WHERE ride_id IN ({marks})", ride_ids)
+        db.execute(f"DELETE FROM rides WHERE id IN ({marks})", ride_ids)
+
+    invalidate_rides(*ride_ids)
+    return len(ride_ids)
+
+
+def archive_rides(after_hours=None, batch_size=None, pause=None, now=None):
+    """Move every ride that arrived more than after_hours ago
+
+    Arguments default to the ARCHIVE_* settings of the app.
+
+    Args:
+        after_hours (Float): hours after its eta a ride is moved
+        batch_size (Integer): rides moved per transaction
+        pause (Float): seconds slept between batches
+        now (Datetime): the current time
+
+    Returns:
+        Integer: number of rides moved
+    """
+    config = current_app.config
+    after_hours = config['ARCHIVE_AFTER_HOURS'] if after_hours is None else after_hours
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    pause = config['ARCHIVE_PAUSE'] if pause is None else pause
+    before = (now or datetime.now()) - timedelta(hours=after_hours)
+
+    moved = 0
+    while True:
+        count = archive_batch(before, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+        if pause:
+            # lets waiting writers in between batches
+            time.sleep(pause)
+
+
+class ArchiveScheduler:
+    """Runs archive_rides every interval seconds in a background thread"""
+
+    def __init__(self, app, interval):
+        """Create a scheduler
+
+        Args:
+            app (Flask): app whose database is archived
+            interval (Float): seconds between runs
+        """
+        self.app = app
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        self.runs = 0
+        self.moved = 0
+        self.failures = 0
+
+    def ensure_started(self):
+        """Start the thread in this process if it has not been"""
+        # threads do not survive a fork, a forked worker starts its own
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self._pid = pid
+                thread = threading.Thread(target=self._run, name="ride-archiver",
+                                          daemon=True)
+                thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        """Archive the rides that are due, logging failures"""
+        with self.app.app_context():
+            try:
+                moved = archive_rides()
+            except Exception:
+                self.failures += 1
+                logger.exception("Archiving rides failed")
+                return
+        self.runs += 1
+        self.moved += moved
+        if moved:
+            logger.info("Archived %d rides", moved)
+
+    def stats(self):
+        """Scheduler counters"""
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "moved": self.moved,
+            "failures": self.failures
+        }
+
+
+def get_scheduler(app=None):
+    """Get the archive scheduler of the app, None if it has none"""
+    app = app or current_app
+    return app.extensions.get('archive')
+
+
+def init_app(app):
+    """Create the archive scheduler of the app when ARCHIVE_INTERVAL
+    is set. This is called by the application factory.
+
+    The thread is started by the first request of each worker.
+    """
+    interval = app.config['ARCHIVE_INTERVAL']
+    if not interval:
+        return
+    scheduler = ArchiveScheduler(app, interval)
+    app.extensions['archive'] = scheduler
+    app.before_request(scheduler.ensure_started)
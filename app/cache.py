@@ -0,0 +1,231 @@
+"""In-process caches of ride data.
+
+Each worker process keeps its own caches. The data layer removes the
+entries a write makes stale, and writes by other workers are noticed
+through the rides counter of the change_counters table: when it has
+moved on since it was last read, every ride cache is cleared. The
+counter is read at most once every CACHE_SYNC_INTERVAL seconds, which
+bounds how long a worker can serve a ride another worker changed.
+
+The tokens cache holds the claims of verified access tokens, see
+app.tokens. Its entries expire with their token.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from .db import get_db
+
+
+class TTLCache:
+    """Least recently used cache whose entries expire after ttl seconds.
+
+    At most maxsize entries are kept, the least recently used one
+    is evicted to make room for a new one.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30, timer=time.monotonic):
+        """Create a cache
+
+        Args:
+            maxsize (Integer): Maximum number of entries, 0 disables the cache
+            ttl (Float): Seconds an entry is served for
+            timer (callable): Clock returning seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Get the value cached for key, default when there is none"""
+        now = self._timer()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if now < expires:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Cache value for key
+
+        Args:
+            ttl (Float): Seconds this entry is served for, when
+                         sooner than the cache's ttl
+        """
+        if self.maxsize <= 0:
+            return
+        expires = self._timer() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove the entry of key if there is one"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Cache counters"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class ChangeWatch:
+    """Clears caches when a change counter in the database moves on."""
+
+    def __init__(self, name, caches, interval=1.0, timer=time.monotonic):
+        """Watch a counter
+
+        Args:
+            name (String): Name of the counter in change_counters
+            caches (list): Caches cleared when the counter changes
+            interval (Float): Seconds between reads of the counter,
+                              None to never read it
+        """
+        self.name = name
+        self.caches = caches
+        self.interval = interval
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = None
+        self._pid = os.getpid()
+        self.checks = 0
+        self.clears = 0
+
+    def check(self, db):
+        """Read the counter if interval has passed, clear the caches
+        if it changed since the last read.
+        """
+        if self.interval is None:
+            return
+
+        now, pid = self._timer(), os.getpid()
+        with self._lock:
+            # caches copied into a forked worker are checked at once
+            forked = pid != self._pid
+            if not forked and self._checked is not None \
+                    and now - self._checked < self.interval:
+                return
+            self._checked = now
+
+        row = db.execute("SELECT version FROM change_counters WHERE name=?",
+                         (self.name,)).fetchone()
+        self.update(row[0] if row else None)
+
+    def update(self, version):
+        """Clear the caches if version, just read from the counter,
+        differs from the last one seen.
+        """
+        pid = os.getpid()
+        with self._lock:
+            self.checks += 1
+            self._checked = self._timer()
+            if pid != self._pid or version != self._version:
+                if self._version is not None:
+                    self.clears += 1
+                self._pid = pid
+                self._version = version
+                for cache in self.caches:
+                    cache.clear()
+
+    def stats(self):
+        """Watch counters"""
+        return {
+            "counter": self.name,
+            "interval": self.interval,
+            "version": self._version,
+            "checks": self.checks,
+            "clears": self.clears
+        }
+
+
+def get_cache(name, app=None):
+    """Get one of the app's caches: 'ride', 'rides' or 'tokens'"""
+    app = app or current_app
+    return app.extensions['caches'][name]
+
+
+def sync_caches(version=None):
+    """Clear the ride caches if another worker changed the rides
+
+    Args:
+        version (Integer): the rides counter when it was just read,
+                           the caches are then synced to it at once
+    """
+    watch = current_app.extensions['cache_watch']
+    if version is None:
+        watch.check(get_db())
+    else:
+        watch.update(version)
+
+
+def invalidate_rides(*ride_ids):
+    """Remove cached rides made stale by a write
+
+    Every cached list of rides is removed along with the
+    cached ride of each of ride_ids.
+    """
+    ride_cache = get_cache('ride')
+    for ride_id in ride_ids:
+        ride_cache.delete(int(ride_id))
+    get_cache('rides').clear()
+
+
+def cache_stats(app=None):
+    """Counters of the caches of this worker process"""
+    app = app or current_app
+    stats = {name: cache.stats() for name, cache in app.extensions['caches'].items()}
+    stats['sync'] = app.extensions['cache_watch'].stats()
+    return stats
+
+
+def init_app(app):
+    """Create the caches of the app. This is called
+    by the application factory.
+    """
+    ride_caches = {
+        'ride': TTLCache(app.config['RIDE_CACHE_SIZE'], app.config['RIDE_CACHE_TTL']),
+        'rides': TTLCache(app.config['RIDES_CACHE_SIZE'], app.config['RIDE_CACHE_TTL'])
+    }
+    app.extensions['caches'] = dict(
+        ride_caches,
+        tokens=TTLCache(app.config['JWT_CACHE_SIZE'], app.config['JWT_CACHE_TTL']))
+
+    interval = app.config['CACHE_SYNC_INTERVAL']
+    app.extensions['cache_watch'] = ChangeWatch(
+        'rides', list(ride_caches.values()), interval if interval >= 0 else None)
@@ -1,5 +1,4 @@
 from flask import Flask, render_template
-from flask_jwt_extended import JWTManager
 from config import app_configs
 
 def create_app(config="dev"):
@@ -7,11 +6,30 @@ def create_app(config="dev"):
     app.config.from_object(app_configs[config])
     app.url_map.strict_slashes = False
 
-    JWTManager(app)
+    from .tokens import CachingJWTManager
+    CachingJWTManager(app)
 
     from .db import init_app
     init_app(app)
 
+    from . import cache
+    cache.init_app(app)
+
+    from . import hashing
+    hashing.init_app(app)
+
+    from . import events
+    events.init_app(app)
+
+    from . import archive
+    archive.init_app(app)
+
+    from . import metrics
+    metrics.init_app(app)
+
+    from . import tracing
+    tracing.init_app(app)
+
     from .api import api_bp as API_Blueprint
     app.register_blueprint(API_Blueprint)
 
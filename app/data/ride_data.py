@@ -1,10 +1,17 @@
 """Define Ride Data container and Data fetching methods
 """
+import re
 from datetime import datetime, timedelta
 from flask_restplus import abort
 
-from app.models import Ride, RideRequest
-from app.db import get_db, close_db
+from app.models import Ride, RideRequest, as_datetime
+from app.db import get_db, write_transaction
+from app.cache import get_cache, sync_caches, invalidate_rides
+from app.archive import RIDE_COLUMNS as ARCHIVED_RIDE_COLUMNS
+from app.events import publish_request_event, REQUEST_CREATED, \
+    REQUEST_RETRACTED, REQUEST_UPDATED
+from app.geo import encode, covering_cells, distances_km
+from app.validators import DATE_FORMAT
 
 
 
@@ -22,104 +29,469 @@ def create_ride(driver, **ride_details):
     ride = Ride(driver, **ride_details)
 
     rideID = ride.save()
+    invalidate_rides()
     
     return rideID
 
 
-def get_rides():
-    """Get all avalaible ride offers
+def create_rides(driver, rides):
+    """Create many rides of one driver in one transaction
+
+    The rides are checked against the driver's schedule with one
+    query and against each other, rides that overlap another ride
+    are not created.
+
+    Args:
+        driver (UUID): A Unique identifier of owner of the rides
+        rides (list): dicts of the details of each ride
+
+    Returns:
+        list: for each ride, a tuple of the id of the created ride and
+              None, or None and the eta of the ride it overlaps
     """
-    
+    new_rides = [Ride(driver, **details) for details in rides]
+    if not new_rides:
+        return []
+
+    # the driver's rides that overlap any time from the first
+    # departure to the last arrival of the batch
+    query = """SELECT depart_time, eta FROM rides
+        WHERE driver=? AND depart_time<? AND eta>?"""
+    with write_transaction() as db:
+        # lock the driver so concurrent batches are checked one by one
+        db.execute("SELECT id FROM users WHERE id=?" + _for_update(db), (driver,))
+        booked = [tuple(row) for row in db.execute(query, (
+            driver,
+            max(ride.eta for ride in new_rides),
+            min(ride.depart_time for ride in new_rides)
+        )).fetchall()]
+
+        clashes = []
+        for ride in new_rides:
+            clash = next((eta for depart_time, eta in booked
+                          if depart_time < ride.eta and eta > ride.depart_time), None)
+            clashes.append(clash)
+            if clash is None:
+                booked.append((ride.depart_time, ride.eta))
+
+        accepted = [ride for ride, clash in zip(new_rides, clashes) if clash is None]
+        if not accepted:
+            return [(None, clash) for clash in clashes]
+
+        ride_ids = iter(Ride.save_many(accepted))
+    invalidate_rides()
+
+    return [(None, clash) if clash is not None else (next(ride_ids), None)
+            for clash in clashes]
+
+
+def ride_to_dict(ride):
+    """Get the API representation of a ride row
+
+    Ride times are formatted back to DATE_FORMAT.
+    """
+    ride = dict(ride)
+    ride['depart_time'] = ride['depart_time'].strftime(DATE_FORMAT)
+    ride['eta'] = ride['eta'].strftime(DATE_FORMAT)
+    ride.pop('start_geohash', None)
+    return ride
+
+
+def rides_query(after=None, limit=None, starting_point=None, destination=None,
+                departs_after=None, departs_before=None, min_seats=None):
+    """Build the query for avalaible ride offers ordered by id
+
+    Args:
+        after (Integer): only rides with an id greater than after
+        limit (Integer): maximum number of rides, all when None
+        starting_point (String): only rides starting from this point
+        destination (String): only rides going to this destination
+        departs_after (Datetime): only rides departing at or after this time
+        departs_before (Datetime): only rides departing at or before this time
+        min_seats (Integer): only rides with at least this many seats
+
+    Returns:
+        tuple: the query and its parameters
+    """
+    clauses, params = [], []
+
+    if after is not None:
+        clauses.append("id > ?")
+        params.append(after)
+    if starting_point is not None:
+        clauses.append("starting_point = ?")
+        params.append(starting_point)
+    if destination is not None:
+        clauses.append("destination = ?")
+        params.append(destination)
+    if departs_after is not None:
+        clauses.append("depart_time >= ?")
+        params.append(departs_after)
+    if departs_before is not None:
+        clauses.append("depart_time <= ?")
+        params.append(departs_before)
+    if min_seats is not None:
+        clauses.append("seats >= ?")
+        params.append(min_seats)
+
+    query = "SELECT * FROM rides"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return query, params
+
+
+def get_rides(**filters):
+    """Get avalaible ride offers ordered by id
+
+    Results are cached until a ride changes.
+
+    Args:
+        filters (Keyword args): see rides_query
+
+    Returns:
+        list: dicts of the fetched rides
+    """
+    sync_caches()
+    cache = get_cache('rides')
+    key = tuple(sorted(filters.items()))
+    rides = cache.get(key)
+
+    if rides is None:
+        query, params = rides_query(**filters)
+
+        db = get_db()
+        ride_rows = db.execute(query, params).fetchall()
+
+        rides = [ride_to_dict(ride) for ride in ride_rows]
+        cache.set(key, rides)
+
+    return [dict(ride) for ride in rides]
+
+
+def iter_rides(batch_size=500, **filters):
+    """Iterate over avalaible ride offers ordered by id
+
+    Rows are read from the database batch_size at a time
+    so memory use does not grow with the number of rides.
+
+    Args:
+        batch_size (Integer): rows fetched per database round trip
+        filters (Keyword args): see rides_query
+
+    Yields:
+        dict: a ride
+    """
+    query, params = rides_query(**filters)
+
+    for ride in get_db().stream(query, params, batch_size):
+        yield ride_to_dict(ride)
+
+
+def search_terms(text):
+    """Split search text into lower case words"""
+    return re.findall(r"\w+", text.lower())
+
+
+# the expression indexed by ix_rides_search on PostgreSQL
+_SEARCH_VECTOR = "to_tsvector('simple', starting_point || ' ' || destination)"
+
+
+def search_rides(text, limit=50):
+    """Find rides whose starting point or destination match text
+
+    Every word of text must match the start of a word in the
+    starting point or destination, best matches come first.
+
+    Args:
+        text (String): words to search for
+        limit (Integer): maximum number of rides
+
+    Returns:
+        list: dicts of the matching rides
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+
     db = get_db()
-    ride_rows = db.execute("SELECT * FROM rides").fetchall()
-    close_db()
+    if db.dialect == 'postgresql':
+        query = f"""SELECT * FROM rides
+            WHERE {_SEARCH_VECTOR} @@ to_tsquery('simple', ?)
+            ORDER BY ts_rank({_SEARCH_VECTOR}, to_tsquery('simple', ?)) DESC, id
+            LIMIT ?"""
+        match = " & ".join(f"{term}:*" for term in terms)
+        params = (match, match, limit)
+    else:
+        query = """SELECT rides.* FROM rides_search
+            JOIN rides ON rides.id = rides_search.rowid
+            WHERE rides_search MATCH ?
+            ORDER BY rides_search.rank, rides.id
+            LIMIT ?"""
+        match = " ".join(f'"{term}"*' for term in terms)
+        params = (match, limit)
+
+    return [ride_to_dict(ride) for ride in db.execute(query, params).fetchall()]
+
+
+def nearby_rides(lat, lon, radius_km, limit=50, departs_after=None):
+    """Find rides starting within radius_km of a point, nearest first
+
+    Candidate rides come from the geohash cells covering the circle,
+    found with range scans of ix_rides_start_geohash. Their exact
+    distances are then computed all at once and filtered.
 
-    rides = {}   
-    for ride in ride_rows:
-        rides[ride[0]] = dict(ride)
-            
+    Args:
+        lat (Float): latitude of the point in degrees
+        lon (Float): longitude of the point in degrees
+        radius_km (Float): search radius in kilometres
+        limit (Integer): maximum number of rides
+        departs_after (Datetime): only rides departing at or after this time
 
+    Returns:
+        list: dicts of the rides with their distance_km
+    """
+    cells = covering_cells(lat, lon, radius_km)
+
+    # a geohash starts with the cell it is in, "~" sorts after
+    # every geohash character
+    clauses = ["start_geohash >= ? AND start_geohash < ?"] * len(cells)
+    params = [bound for cell in cells for bound in (cell, cell + "~")]
+
+    query = f"SELECT * FROM rides WHERE (({') OR ('.join(clauses)}))"
+    if departs_after is not None:
+        query += " AND depart_time >= ?"
+        params.append(departs_after)
+
+    candidates = get_db().execute(query, params).fetchall()
+    distances = distances_km(lat, lon,
+                             [ride['start_lat'] for ride in candidates],
+                             [ride['start_lon'] for ride in candidates])
+
+    nearby = sorted((distance, ride['id'], ride)
+                    for distance, ride in zip(distances, candidates)
+                    if distance <= radius_km)
+
+    rides = []
+    for distance, _, ride in nearby[:limit]:
+        ride = ride_to_dict(ride)
+        ride['distance_km'] = round(distance, 3)
+        rides.append(ride)
     return rides
 
 
 def get_ride(rideID):
     """Get a ride with the id:rideID
 
+    Rides are cached until they change. Rides that have arrived are
+    looked up in the archive, see app.archive.
+
     Args:
         rideID (Integer): Unique Identifier of a ride
 
     Returns:
         dict: contians a fetched ride details
     """
+    try:
+        rideID = int(rideID)
+    except (TypeError, ValueError):
+        return
+
+    sync_caches()
+    cache = get_cache('ride')
+    ride = cache.get(rideID)
+
+    if ride is None:
+        db = get_db()
+        query = "SELECT * FROM rides WHERE id=?"
+        ride = db.execute(query, (rideID,)).fetchone()
+
+        if not ride:
+            query = f"SELECT {ARCHIVED_RIDE_COLUMNS} FROM rides_archive WHERE id=?"
+            ride = db.execute(query, (rideID,)).fetchone()
+        if not ride:
+            return
+        ride = ride_to_dict(ride)
+        cache.set(rideID, ride)
+
+    return dict(ride)
+
+
+def get_ride_version(rideID):
+    """Get the version of a ride without fetching it
+
+    Args:
+        rideID (Integer): Unique Identifier of a ride
+
+    Returns:
+        Integer: the version, None if the ride does not exist
+    """
+    try:
+        rideID = int(rideID)
+    except (TypeError, ValueError):
+        return
+
     db = get_db()
-    query = "SELECT * FROM rides WHERE id=?"
-    ride = db.execute(query, (rideID,)).fetchone()
-    close_db()
+    query = "SELECT version FROM rides WHERE id=?"
+    row = db.execute(query, (rideID,)).fetchone()
+    if not row:
+        query = "SELECT version FROM rides_archive WHERE id=?"
+        row = db.execute(query, (rideID,)).fetchone()
+    return row[0] if row else None
 
-    if ride:   
-        return dict(ride)
-    return
+
+def get_rides_version():
+    """Get the counter bumped by every change to the rides
+
+    Returns:
+        Integer: the rides counter of change_counters
+    """
+    query = "SELECT version FROM change_counters WHERE name='rides'"
+    row = get_db().execute(query).fetchone()
+    return row[0] if row else None
 
 
 def update_ride(rideID, **ride_details):
     """update a ride
+
+    seats is the number of seats the ride offers, the seats held by
+    accepted requests stay taken so the ride is left with seats minus
+    its accepted requests. Aborts with 409 when fewer seats are offered
+    than there are accepted requests or the ride has been archived.
+    The start coordinates are only changed when both are given.
     
     Args:
         rideID (Integer): Unique Identifier of a ride
         **ride_details (Keyword args): keyword values of a rides details
     """
-    
-    query = """UPDATE rides
-        SET starting_point=?, destination=?,
-        depart_time=?, eta=?, vehicle=?,
-        seats=?
-        WHERE id=?
-        """
-    data = (
-        ride_details['starting_point'], 
-        ride_details['destination'],
-        ride_details['depart_time'], 
-        ride_details['eta'], 
-        ride_details['vehicle'],
-        ride_details['seats'], 
-        rideID
-    ) 
-    db = get_db()
-    db.execute(query, data)
-    close_db()
+    with write_transaction() as db:
+        # lock the ride so no request is accepted while seats are counted
+        query = "SELECT id FROM rides WHERE id=?"
+        if not db.execute(query + _for_update(db), (rideID,)).fetchone():
+            abort_ride_archived(rideID)
+        query = """SELECT COUNT(*) FROM requests
+            WHERE ride_id=? AND req_status='accepted'"""
+        accepted = db.execute(query, (rideID,)).fetchone()[0]
+        if ride_details['seats'] < accepted:
+            abort(409, f"The ride has {accepted} accepted requests, "
+                       "it can not offer fewer seats")
+
+        query = """UPDATE rides
+            SET starting_point=?, destination=?,
+            depart_time=?, eta=?, vehicle=?,
+            seats=?
+            WHERE id=?
+            """
+        data = (
+            ride_details['starting_point'], 
+            ride_details['destination'],
+            as_datetime(ride_details['depart_time']), 
+            as_datetime(ride_details['eta']), 
+            ride_details['vehicle'],
+            ride_details['seats'] - accepted, 
+            rideID
+        ) 
+        db.execute(query, data)
+
+        lat, lon = ride_details.get('start_lat'), ride_details.get('start_lon')
+        if lat is not None and lon is not None:
+            query = """UPDATE rides
+                SET start_lat=?, start_lon=?, start_geohash=?
+                WHERE id=?"""
+            db.execute(query, (lat, lon, encode(lat, lon), rideID))
+
+    invalidate_rides(rideID)
     return 
 
 
-def make_request(rideID, passenger, dest):
-    """Make a: request to Join a ride
-    
+# outcomes of join_ride
+JOINED = 'joined'
+RIDE_NOT_FOUND = 'ride_not_found'
+OWN_RIDE = 'own_ride'
+ALREADY_REQUESTED = 'already_requested'
+
+
+def join_ride(rideID, passenger, dest):
+    """Make a request to join a ride in one statement
+
+    The request is only inserted if the ride exists, is not the
+    passenger's own ride and the passenger has not asked to join it
+    yet. The unique index on (ride_id, user_id) settles concurrent
+    requests. Only when nothing was inserted is the ride read again
+    to tell why.
+
     Arguments
         rideID{Integer} -- Unique Ride Identifier
         passenger {Uuid} -- Unique User  Identifier
         dest {String} -- Town the User is headed to
-    
+
     Returns:
-        Integer : contains id of the request
+        tuple: the outcome, one of JOINED, RIDE_NOT_FOUND, OWN_RIDE or
+               ALREADY_REQUESTED, and the id of the request when JOINED
     """
-    ride_req = RideRequest(rideID, passenger, dest)
-    req_id = ride_req.save()
-    
-    return req_id
+    try:
+        rideID = int(rideID)
+    except (TypeError, ValueError):
+        return RIDE_NOT_FOUND, None
+
+    query = """INSERT INTO requests (ride_id, user_id, destination, req_status)
+        SELECT id, ?, ?, ? FROM rides WHERE id=? AND driver<>?
+        ON CONFLICT (ride_id, user_id) DO NOTHING"""
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute(query, (passenger, dest, RideRequest.STATUS, rideID, passenger))
+
+    if cursor.rowcount == 1:
+        reqID = cursor.lastrowid
+        db.commit()
+        cursor.close()
+        invalidate_rides(rideID)
+        publish_request_event(REQUEST_CREATED, rideID, _request_dict(
+            reqID, passenger, dest, RideRequest.STATUS))
+        return JOINED, reqID
+    db.commit()
+
+    query = """SELECT driver FROM rides WHERE id=?"""
+    ride = cursor.execute(query, (rideID,)).fetchone()
+    cursor.close()
+
+    if not ride:
+        return RIDE_NOT_FOUND, None
+    if ride['driver'] == passenger:
+        return OWN_RIDE, None
+    return ALREADY_REQUESTED, None
 
 
 def retract_request(ride, user):
     """Retracts user request to join a ride
+
+    The seat of an accepted request is given back to the ride.
+    Aborts with 409 when the ride has been archived.
     
     Arguments:
         ride {Integer} -- Unique Ride Identifier
         user {Uuid} -- Unique User Identifier
     """
     
-    db = get_db()
-    query = "DELETE FROM requests WHERE ride_id=? AND user_id=?"
-    db.execute(query, (ride, user))
-    db.commit()
-    close_db()
+    with write_transaction() as db:
+        query = """SELECT id, destination, req_status FROM requests
+            WHERE ride_id=? AND user_id=?"""
+        req = db.execute(query + _for_update(db), (ride, user)).fetchone()
+        if not db.execute("SELECT id FROM rides WHERE id=?", (ride,)).fetchone():
+            abort_ride_archived(ride)
+
+        if req:
+            db.execute("DELETE FROM requests WHERE id=?", (req['id'],))
+            if req['req_status'] == "accepted":
+                db.execute("UPDATE rides SET seats=seats+1 WHERE id=?", (ride,))
+    invalidate_rides(ride)
+    if req:
+        publish_request_event(REQUEST_RETRACTED, ride, _request_dict(
+            req['id'], user, req['destination'], req['req_status']))
     return "You have retracted request to join ride" 
 
 
@@ -132,8 +504,7 @@ def get_ride_requests(rideID):
     
     db = get_db()
     query = "SELECT * FROM requests WHERE ride_id=?"
-    ride_reqs = db.execute(query, rideID).fetchall()
-    close_db()
+    ride_reqs = db.execute(query, (rideID,)).fetchall()
 
     ride_requests = {} 
     for ride_req in ride_reqs:
@@ -142,7 +513,7 @@ def get_ride_requests(rideID):
             "destination": ride_req[3],
             "status": ride_req[4]
         }
-        ride_requests[ride_req[1]] = req
+        ride_requests[ride_req[0]] = req
     
     return ride_requests      
 
@@ -152,6 +523,9 @@ def get_request(reqId):
     
     Arguments:
         reqId {String} -- Unique request identifier
+
+    Returns:
+        dict: the request, None if it does not exist
     """
     query = "SELECT * FROM requests WHERE id = ?"
 
@@ -159,26 +533,73 @@ def get_request(reqId):
     cursor.execute(query, (reqId,))
     req = cursor.fetchone()
     cursor.close()
-    close_db()
-    print(req)
 
-    return 
+    if req:
+        return {
+            "id": req['id'],
+            "ride_id": req['ride_id'],
+            "passenger": req['user_id'],
+            "destination": req['destination'],
+            "status": req['req_status']
+        }
+    return
+
+
+def _request_dict(reqID, passenger, dest, status):
+    """The details of a request carried by its events"""
+    return {
+        "id": reqID,
+        "passenger": passenger,
+        "destination": dest,
+        "status": status
+    }
+
+
+def _for_update(db):
+    """Row locking suffix of a SELECT in a write_transaction"""
+    return " FOR UPDATE" if db.dialect == 'postgresql' else ""
 
 
 def update_request_status(status, reqID):
     """Update ride request status
+
+    Accepting a request takes one of the ride's seats and rejecting
+    an accepted request gives it back. The seat count only changes
+    with a conditional UPDATE in the same transaction as the status,
+    so concurrent accepts can not book more seats than the ride has.
+    Aborts with 409 when the status is unchanged or the ride is full.
     
     Arguments:
         status {String} -- should be 'accepted' or 'rejected'
         reqID {String} -- Unique request identifier
-    """
-    query = "UPDATE requests SET req_status=? WHERE id=?"
 
-    db = get_db()
-    db.execute(query,(status,reqID))
-    db.commit()
-    close_db()
-    return
+    Returns:
+        String: the new status
+    """
+    with write_transaction() as db:
+        query = """SELECT id, ride_id, user_id, destination, req_status
+            FROM requests WHERE id=?"""
+        req = db.execute(query + _for_update(db), (reqID,)).fetchone()
+
+        if not req:
+            abort(404, "Request to join this ride does not exist")
+        if req['req_status'] == status:
+            abort(409, f"Ride request has already been '{status}'")
+
+        if status == "accepted":
+            query = "UPDATE rides SET seats=seats-1 WHERE id=? AND seats>0"
+            if db.execute(query, (req['ride_id'],)).rowcount == 0:
+                abort(409, "The ride has no seats left")
+        elif req['req_status'] == "accepted":
+            query = "UPDATE rides SET seats=seats+1 WHERE id=?"
+            db.execute(query, (req['ride_id'],))
+
+        query = "UPDATE requests SET req_status=? WHERE id=?"
+        db.execute(query, (status, reqID))
+    invalidate_rides(req['ride_id'])
+    publish_request_event(REQUEST_UPDATED, req['ride_id'], _request_dict(
+        req['id'], req['user_id'], req['destination'], status))
+    return status
 
 
 # #####################################Helpers##################################################
@@ -197,22 +618,16 @@ def abort_ride_not_found(rideID):
         abort(404, msg)
 
 
-def abort_ride_request_already_made(rideID, passenger):
-    """Abort with 409
-    
-    Arguments:
-        rideID {Integer} -- Unique Identifier of ride ID
-        passenger {String} -- Unique Identifier of passenger joining ride
-    """
+def abort_ride_archived(rideID):
+    """Abort with 409 for a write to an archived ride
 
-    db = get_db()
-    query = "SELECT * FROM requests WHERE ride_id=? AND user_id=?"
-    ride_request = db.execute(query, (rideID, passenger)).fetchone()
-    close_db()
-    
-    if ride_request:
-        msg="You have already made a request to join this ride"
-        abort(409, msg)   
+    get_ride also finds archived rides, writes look the ride up in
+    the rides table and call this when it is not there.
+
+    Args:
+        rideID (Integer): Unique identifier of a ride
+    """
+    abort(409, f"Ride:{rideID} has arrived and can no longer be changed")
 
 
 def abort_request_not_found(reqId):
@@ -222,29 +637,31 @@ def abort_request_not_found(reqId):
         reqId {String} -- Unique ride identifier
     """
     req = get_request(reqId)
-    print(req)
 
     if not req:
         msg = "Request to join this ride does not exist"
         abort(404, msg)
 
 
-def abort_active_ride(depart_time, ride_creator):
-    """Abort if User has an uncompleted ride 
+def abort_active_ride(depart_time, eta, ride_creator):
+    """Abort if User has a ride at the same time
     
     Arguments:
-        depart_time {Datetime} -- depart time of a ride.
+        depart_time {Datetime} -- depart time of the new ride.
+        eta {Datetime} -- arrival time of the new ride.
         ride_creator {Uuid} -- Unique identifier of person creating ride.
     """
 
-    query = "SELECT * FROM rides WHERE eta<=? AND driver=?"
+    # rides overlap when each departs before the other arrives
+    query = """SELECT * FROM rides
+        WHERE driver=? AND depart_time<? AND eta>?
+        ORDER BY depart_time LIMIT 1"""
     db =get_db()
-    ride = db.execute(query,(depart_time, ride_creator)).fetchone()
-    close_db()
+    ride = db.execute(query, (ride_creator, as_datetime(eta),
+                              as_datetime(depart_time))).fetchone()
     
     if ride:
-        eta = dict(ride)["eta"]
+        eta = ride_to_dict(ride)["eta"]
         err = f"You have an uncompleted ride that is before-{eta}"
         msg = f"Create a ride after- {eta}"
         abort(409, msg, error=err)
-
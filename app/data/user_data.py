@@ -1,9 +1,9 @@
 """Defines user Data Container & fetching methods 
 """
-from werkzeug.security import check_password_hash
 from flask_restplus import abort
 from app.models import User
-from app.db import close_db, get_db
+from app.db import get_db
+from app.hashing import get_hasher
 
 
 def create_user(name, email, password):
@@ -27,7 +27,6 @@ def get_user_by_email(email):
     db = get_db()
     query = "SELECT * FROM users WHERE email=?"
     user = db.execute(query, (email,)).fetchone()
-    close_db()
     
     if user:
         return user
@@ -42,7 +41,27 @@ def verify_password(password_hash, password):
                                 werkzeug.security generate_password_hash
         password {String} -- Unhashed User password
     """
-    return check_password_hash(password_hash, password)
+    return get_hasher().verify(password_hash, password)
+
+
+def upgrade_password_hash(userID, password_hash, password):
+    """Rehash a verified password if its hash was made with
+    another method or cost than the configured one
+
+    Arguments:
+        userID {UUID} -- id of the user
+        password_hash {hash} -- the user's stored hash
+        password {String} -- Unhashed User password, already verified
+    """
+    hasher = get_hasher()
+    if not hasher.needs_rehash(password_hash):
+        return
+
+    db = get_db()
+    # another login may have upgraded it already
+    db.execute("UPDATE users SET password=? WHERE id=? AND password=?",
+               (hasher.hash(password), userID, password_hash))
+    db.commit()
 
     
 def abort_if_user_found(email):
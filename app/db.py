@@ -1,5 +1,5 @@
-import sqlite3
 from uuid import uuid4
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 
@@ -7,39 +7,134 @@ import click
 from flask import current_app, g
 from flask.cli import with_appcontext
 
+from .storage import create_engine, ConnectionPool
+
+
+def get_engine(app=None):
+    """Get the storage engine of the app."""
+    app = app or current_app
+    return app.extensions['db_engine']
+
+
+def get_pool(app=None):
+    """Get the connection pool of the app."""
+    app = app or current_app
+    return app.extensions['db_pool']
+
+
 def  get_db():
     """Gets the db for request.
 
+    The connection is taken from the pool the first time it is
+    needed and held until the app context is torn down.
+
     returns a Database connection
     """
     if 'db' not in g:
-        g.db = sqlite3.connect(
-                current_app.config['DATABASE'],
-                detect_types=sqlite3.PARSE_DECLTYPES
-            )
-        g.db.row_factory = sqlite3.Row
-        return g.db
+        g.db = get_pool().acquire()
+        g.db.observer = current_app.extensions.get('db_observer')
+    return g.db
 
 
 def close_db(e=None):
-    """If this request connected to the 
-        database, close the connection.
+    """If this request connected to the
+        database, return the connection to the pool.
     """
     db = g.pop('db', None)
 
     if db is not None:
-        db.close()
+        db.observer = None
+        get_pool().release(db)
+
+
+def add_query_observer(app, observer):
+    """Have observer(query, params, seconds) called after every
+    statement run on a connection of get_db.
+
+    params is None for executemany.
+    """
+    observers = app.extensions.setdefault('db_observers', [])
+    observers.append(observer)
+
+    def notify_all(query, params, seconds):
+        for notify in observers:
+            notify(query, params, seconds)
+
+    app.extensions['db_observer'] = observer if len(observers) == 1 else notify_all
+
+
+class TransactionError(Exception):
+    """Raised when a write transaction can not start"""
+
+
+@contextmanager
+def write_transaction():
+    """Run a block of reads and writes as one transaction.
+
+    On SQLite the database write lock is taken up front with
+    BEGIN IMMEDIATE, so what the block reads can not change before
+    it writes. PostgreSQL locks rows as they are written, read rows
+    with SELECT ... FOR UPDATE to lock them earlier.
+
+    The transaction is committed when the block ends and rolled
+    back if it raises. A write_transaction inside another runs in a
+    SAVEPOINT and is committed with the outer one.
+
+    Raises TransactionError if the connection has writes that are not
+    committed yet, they would be committed with the block.
+
+    yields the Database connection
+    """
+    db = get_db()
+    depth = getattr(db, 'write_depth', 0)
+    if depth:
+        savepoint = f"write_transaction_{depth}"
+        db.execute(f"SAVEPOINT {savepoint}")
+        db.write_depth = depth + 1
+        try:
+            yield db
+        except BaseException:
+            db.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            raise
+        finally:
+            db.write_depth = depth
+        db.execute(f"RELEASE SAVEPOINT {savepoint}")
+        return
+
+    if db.has_pending_writes():
+        raise TransactionError("The connection has uncommitted writes, commit "
+                               "or roll them back before a write_transaction")
+    if db.in_transaction:
+        # PostgreSQL opens a transaction for reads too
+        db.rollback()
+    if db.dialect == 'sqlite':
+        db.execute("BEGIN IMMEDIATE")
+
+    db.write_depth = 1
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.write_depth = 0
+    db.commit()
 
 
 def initialize():
     """Clear existing data and create new tables.
 
-    Should be run the first time only
+    Should be run the first time only, use
+    migrations to update an existing database.
     """
+    from .migrate import upgrade
+
     db = get_db()
 
     with current_app.open_resource('schema.sql') as f:
-        db.executescript(f.read().decode('utf8'))   
+        db.executescript(f.read().decode('utf8'))
+
+    upgrade(db)
 
 
 @click.group()
@@ -51,7 +146,7 @@ def db():
 @db.command()
 @with_appcontext
 def init():
-    """Clear existing data & create 
+    """Clear existing data & create
         initial db tables.
     """
 
@@ -59,9 +154,95 @@ def init():
     click.echo('Initialized the database.')
 
 
+@db.command('upgrade')
+@click.option('--to', 'target', type=int, default=None,
+              help='Last version to apply, defaults to all.')
+@with_appcontext
+def upgrade_command(target):
+    """Apply pending schema migrations."""
+    from .migrate import upgrade, MigrationError
+
+    try:
+        applied = upgrade(get_db(), target)
+    except MigrationError as error:
+        raise click.ClickException(f"Migration failed: {error}")
+
+    for migration in applied:
+        click.echo(f"Applied {migration.version:04d}_{migration.name}")
+    if not applied:
+        click.echo('Database is up to date.')
+
+
+@db.command('downgrade')
+@click.option('--to', 'target', type=int, default=None,
+              help='Version to keep, defaults to the previous one.')
+@with_appcontext
+def downgrade_command(target):
+    """Revert applied schema migrations."""
+    from .migrate import downgrade, MigrationError
+
+    try:
+        reverted = downgrade(get_db(), target)
+    except MigrationError as error:
+        raise click.ClickException(f"Migration failed: {error}")
+
+    for migration in reverted:
+        click.echo(f"Reverted {migration.version:04d}_{migration.name}")
+    if not reverted:
+        click.echo('Nothing to revert.')
+
+
+@db.command('status')
+@with_appcontext
+def status_command():
+    """Show applied and pending schema migrations."""
+    from .migrate import status
+
+    for migration, applied in status(get_db()):
+        state = 'applied' if applied else 'pending'
+        click.echo(f"{migration.version:04d}_{migration.name:<30} {state}")
+
+
+@db.command('archive')
+@click.option('--after-hours', type=float, default=None,
+              help='Hours after their eta rides are moved, '
+                   'defaults to ARCHIVE_AFTER_HOURS.')
+@click.option('--batch-size', type=int, default=None,
+              help='Rides moved per transaction, defaults to ARCHIVE_BATCH_SIZE.')
+@with_appcontext
+def archive_command(after_hours, batch_size):
+    """Move rides that have arrived to the archive tables."""
+    from .archive import archive_rides
+
+    moved = archive_rides(after_hours, batch_size)
+    click.echo(f"Archived {moved} rides.")
+
+
+@db.command()
+@with_appcontext
+def tune():
+    """Report the active storage tuning settings."""
+
+    engine = get_engine()
+    click.echo(f"engine: {engine.name}")
+
+    for name, active, configured in engine.settings(get_db()):
+        click.echo(f"{name:<18} {active!s:<12} (configured: {configured})")
+
+
 def init_app(app):
-    """Register database functions with the Flask 
+    """Register database functions with the Flask
     app. This is called by the application factory.
     """
+    engine = create_engine(app.config)
+    app.extensions['db_engine'] = engine
+    app.extensions['db_pool'] = ConnectionPool(
+        engine,
+        size=app.config['DB_POOL_SIZE'],
+        health_check=app.config['DB_POOL_HEALTH_CHECK'],
+        max_connections=app.config['DB_POOL_MAX_CONNECTIONS'],
+        timeout=app.config['DB_POOL_TIMEOUT']
+    )
+
     app.teardown_appcontext(close_db)
     app.cli.add_command(db)
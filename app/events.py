@@ -0,0 +1,216 @@
+"""Events of ride requests, published to subscribers in every worker.
+
+The data layer publishes an event when a request to join a ride is
+made, retracted or accepted/rejected. Each worker process has an
+EventBus that hands events to the subscribers of the event's ride in
+that process and sends them, as one datagram, to the UNIX socket of
+every other worker in EVENTS_DIR. Workers that have subscribers bind
+their own socket there and read it from their asyncio event loop, so
+an idle subscriber costs a callback and no thread.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+REQUEST_CREATED = "request_created"
+REQUEST_RETRACTED = "request_retracted"
+REQUEST_UPDATED = "request_updated"
+
+# datagrams larger than this are dropped by the receiving worker
+MAX_DATAGRAM = 64 * 1024
+
+
+class EventBus:
+    """Delivers events to subscribers by topic, here and in other workers"""
+
+    def __init__(self, directory=None):
+        """Create a bus
+
+        Args:
+            directory (String): where the workers' sockets are, None
+                                to deliver to this process only
+        """
+        self.directory = directory
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._sock = None
+        self._path = None
+        self._sender = None
+        self._peers = None
+        self._peers_mtime = None
+        self._pid = None
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, topic, callback):
+        """Call callback(event) with every event of topic
+
+        callback runs on the thread that published the event, or on
+        the event loop for events of other workers, it must not block.
+
+        Returns:
+            callable: unsubscribes callback
+        """
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(topic)
+                if callbacks:
+                    callbacks.discard(callback)
+                    if not callbacks:
+                        del self._subscribers[topic]
+        return unsubscribe
+
+    def deliver(self, topic, event):
+        """Hand event to the subscribers of topic in this process"""
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, ()))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Event subscriber of %s failed", topic)
+
+    def publish(self, topic, event):
+        """Deliver event here and send it to the other workers"""
+        self.published += 1
+        self.deliver(topic, event)
+        if self.directory:
+            self._send(json.dumps({"topic": topic, "event": event}).encode())
+
+    def _get_peers(self):
+        """Paths of the sockets in directory, listed again only when a
+        socket was bound or removed there since the last listing.
+        """
+        try:
+            # read before listing, a change in between is listed next time
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return ()
+        peers = self._peers
+        if peers is None or mtime != self._peers_mtime:
+            peers = tuple(os.path.join(self.directory, name)
+                          for name in os.listdir(self.directory)
+                          if name.endswith(".sock"))
+            self._peers, self._peers_mtime = peers, mtime
+        return peers
+
+    def _send(self, datagram):
+        if self._sender is None:
+            self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sender.setblocking(False)
+        for path in self._get_peers():
+            if path == self._path:
+                continue
+            try:
+                self._sender.sendto(datagram, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # the worker is gone
+                self._remove(path)
+                self._peers = None
+            except (BlockingIOError, OSError):
+                logger.warning("Dropped an event for %s, its queue is full",
+                               os.path.basename(path))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def listen(self, loop):
+        """Receive the events of other workers on loop
+
+        Binds this process's socket in directory, a forked worker binds
+        its own. Does nothing without a directory.
+        """
+        if not self.directory or (self._sock and self._pid == os.getpid()):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid = os.getpid()
+        self._path = os.path.join(self.directory, f"{self._pid}-{id(self):x}.sock")
+        self._remove(self._path)
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self._path)
+        self._sock.setblocking(False)
+        loop.add_reader(self._sock.fileno(), self._receive)
+
+    def _receive(self):
+        while True:
+            try:
+                datagram = self._sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                message = json.loads(datagram)
+            except ValueError:
+                continue
+            self.received += 1
+            self.deliver(message["topic"], message["event"])
+
+    def close(self, loop=None):
+        """Stop receiving and remove this process's socket"""
+        if self._sock:
+            if loop:
+                loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._remove(self._path)
+            self._sock = None
+
+    def stats(self):
+        """Bus counters"""
+        with self._lock:
+            topics = len(self._subscribers)
+            subscribers = sum(len(callbacks) for callbacks in self._subscribers.values())
+        return {
+            "topics": topics,
+            "subscribers": subscribers,
+            "published": self.published,
+            "received": self.received
+        }
+
+
+def ride_topic(ride_id):
+    """Topic of the events of a ride's requests"""
+    return f"ride-{int(ride_id)}"
+
+
+def get_bus(app=None):
+    """Get the event bus of the app"""
+    app = app or current_app
+    return app.extensions['events']
+
+
+def publish_request_event(kind, ride_id, request):
+    """Publish an event of a request to join a ride
+
+    Args:
+        kind (String): REQUEST_CREATED, REQUEST_RETRACTED or REQUEST_UPDATED
+        ride_id (Integer): the ride
+        request (dict): id, passenger, destination and status of the request
+    """
+    get_bus().publish(ride_topic(ride_id), {
+        "event": kind,
+        "ride_id": int(ride_id),
+        "request": request
+    })
+
+
+def init_app(app):
+    """Create the event bus of the app. This is called
+    by the application factory.
+    """
+    directory = app.config['EVENTS_DIR']
+    if not hasattr(socket, 'AF_UNIX'):
+        directory = None
+    app.extensions['events'] = EventBus(directory)
@@ -0,0 +1,122 @@
+"""Geohash cells and distances for matching rides by location.
+
+A geohash names a cell of the latitude/longitude grid. Every extra
+character splits the cell 32 ways, so all points inside a cell share
+its geohash as a prefix and can be found with an index range scan.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(lat, lon, precision=9):
+    """Get the geohash of a point
+
+    Arguments:
+        lat {Float} -- latitude in degrees
+        lon {Float} -- longitude in degrees
+        precision {Integer} -- number of characters
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+
+    while len(chars) < precision:
+        interval, point = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if point >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Get the (height, width) in degrees of a geohash cell"""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(lat, lon, radius_km, max_cells=16):
+    """Get the geohash cells that cover a circle
+
+    The cells are of the finest precision that needs at most
+    max_cells of them to cover the bounding box of the circle.
+
+    Arguments:
+        lat, lon {Float} -- center of the circle in degrees
+        radius_km {Float} -- radius of the circle in kilometres
+
+    Returns:
+        list: geohashes of the cells
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = min(dlat / max(math.cos(math.radians(lat)), 0.01), 180.0)
+
+    for precision in range(9, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((lat - dlat + 90) / height),
+                     math.floor((lat + dlat + 90) / height) + 1)
+        cols = range(math.floor((lon - dlon + 180) / width),
+                     math.floor((lon + dlon + 180) / width) + 1)
+        if len(rows) * len(cols) <= max_cells:
+            break
+
+    last_row, col_count = round(180 / height) - 1, round(360 / width)
+    cells = set()
+    for row in rows:
+        row = min(max(row, 0), last_row)
+        for col in cols:
+            col %= col_count
+            cells.add(encode(-90 + (row + 0.5) * height,
+                             -180 + (col + 0.5) * width, precision))
+    return sorted(cells)
+
+
+def distances_km(lat, lon, lats, lons):
+    """Get the great circle distance from a point to many points
+
+    Uses numpy to compute all distances at once when it is installed.
+
+    Arguments:
+        lat, lon {Float} -- the point in degrees
+        lats, lons {list} -- the other points in degrees
+
+    Returns:
+        list: distances in kilometres
+    """
+    if not lats:
+        return []
+
+    if numpy is not None:
+        lat1, lon1 = numpy.radians(lat), numpy.radians(lon)
+        lat2 = numpy.radians(numpy.asarray(lats, dtype=float))
+        lon2 = numpy.radians(numpy.asarray(lons, dtype=float))
+        a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * \
+            numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(a))).tolist()
+
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    cos_lat1 = math.cos(lat1)
+    result = []
+    for lat2, lon2 in zip(lats, lons):
+        lat2, lon2 = math.radians(lat2), math.radians(lon2)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * \
+            math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        result.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)))
+    return result
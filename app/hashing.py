@@ -0,0 +1,133 @@
+"""Password hashing off the request thread.
+
+Hashing and checking passwords is slow on purpose. Each worker process
+hands the work to a pool of HASH_WORKERS threads, hashlib releases the
+GIL while it hashes so they run in parallel. At most HASH_QUEUE_SIZE
+more passwords wait for a thread, callers beyond that wait up to
+HASH_QUEUE_TIMEOUT seconds for room and then get a 503 response.
+
+The bound is per process, it only has callers to turn away when a
+worker serves requests on several threads, as the gthread workers of
+the Procfile do.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(ServiceUnavailable):
+    """Raised when too many passwords are waiting to be hashed"""
+
+    description = "Too many sign ups and logins at the moment, try again shortly"
+
+    def __init__(self, retry_after=1):
+        super().__init__()
+        self.retry_after = retry_after
+
+    def get_headers(self, *args, **kwargs):
+        headers = super().get_headers(*args, **kwargs)
+        headers.append(("Retry-After", str(self.retry_after)))
+        return headers
+
+
+class PasswordHasher:
+    """Hashes and checks passwords in a bounded thread pool."""
+
+    def __init__(self, method="pbkdf2:sha256", rounds=None, workers=2,
+                 queue_size=16, timeout=5):
+        """Create a hasher
+
+        Args:
+            method (String): werkzeug hash method, e.g. pbkdf2:sha256
+            rounds (Integer): iterations of pbkdf2 methods
+            workers (Integer): threads hashing at once
+            queue_size (Integer): passwords waiting for a thread
+            timeout (Float): seconds a caller waits for room in the queue
+        """
+        if rounds and method.startswith("pbkdf2"):
+            method = f"{method}:{rounds}"
+        self.method = method
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.hashes = 0
+        self.checks = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # threads do not survive a fork, a forked worker starts its own
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="password-hasher")
+                self._pid = pid
+            return self._executor
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("rejected")
+            raise HashingBusy(retry_after=max(1, round(self.timeout)))
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Get the hash of password with the configured method"""
+        self._count("hashes")
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Whether password matches password_hash"""
+        self._count("checks")
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether password_hash was made with another method or cost"""
+        return password_hash.split("$", 1)[0] != self.method
+
+    def stats(self):
+        """Hasher counters"""
+        return {
+            "method": self.method,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "hashes": self.hashes,
+            "checks": self.checks,
+            "rejected": self.rejected
+        }
+
+
+def get_hasher(app=None):
+    """Get the password hasher of the app"""
+    app = app or current_app
+    return app.extensions['password_hasher']
+
+
+def hash_password(password):
+    """Hash password with the app's hasher"""
+    return get_hasher().hash(password)
+
+
+def init_app(app):
+    """Create the password hasher of the app. This is called
+    by the application factory.
+    """
+    config = app.config
+    app.extensions['password_hasher'] = PasswordHasher(
+        config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_ROUNDS'],
+        config['HASH_WORKERS'], config['HASH_QUEUE_SIZE'],
+        config['HASH_QUEUE_TIMEOUT'])
@@ -0,0 +1,320 @@
+"""Request metrics in the Prometheus text format.
+
+Every request is counted by endpoint, method and status, its latency is
+added to a histogram of its endpoint, and the SQL statements it ran and
+the time they took are added to counters of its endpoint.
+
+Each worker process keeps its metrics in memory and a background
+thread writes them, every METRICS_FLUSH_INTERVAL seconds they changed,
+to the worker's own file in METRICS_DIR. GET /metrics adds up the files of every worker, so any
+worker can serve it. The files of workers that exited are folded into
+one file of retired workers, so the counters never go down and the
+directory does not grow with every worker restart. Where fcntl is
+missing, e.g. on Windows, the files of exited workers are kept instead.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from time import perf_counter
+
+from flask import current_app, request, Response
+
+from .db import add_query_observer
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks to fold the files of exited workers under
+    fcntl = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# file of the metrics of workers that exited
+RETIRED = "retired.json"
+
+
+def merge(buckets, snapshots):
+    """Add up snapshots of Metrics with the same buckets into one"""
+    requests, latency, sql = {}, {}, {}
+    for snapshot in snapshots:
+        for endpoint, method, status, count in snapshot["requests"]:
+            key = (endpoint, method, status)
+            requests[key] = requests.get(key, 0) + count
+        for endpoint, counts in snapshot["latency"].items():
+            total = latency.setdefault(endpoint, [0] * len(counts))
+            latency[endpoint] = [a + b for a, b in zip(total, counts)]
+        for endpoint, (statements, seconds) in snapshot["sql"].items():
+            total = sql.setdefault(endpoint, [0, 0.0])
+            total[0] += statements
+            total[1] += seconds
+    return {
+        "buckets": list(buckets),
+        "requests": [list(key) + [count] for key, count in requests.items()],
+        "latency": latency,
+        "sql": sql
+    }
+
+
+def is_running(pid):
+    """Whether a process with pid exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(path, snapshot):
+    """Replace the file at path with snapshot in one step"""
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)
+
+
+class Metrics:
+    """Counters and latency histograms of one worker process"""
+
+    def __init__(self, buckets, directory=None, flush_interval=1.0):
+        """Create the metrics
+
+        Args:
+            buckets (tuple): upper bounds in seconds of the latency
+                             histogram buckets, in increasing order
+            directory (String): where the workers' files are, None to
+                                report this process only
+            flush_interval (Float): seconds between writes of this
+                                    process's file
+        """
+        self.buckets = tuple(buckets)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset(os.getpid())
+        if directory:
+            # keeps what was counted since the last write
+            atexit.register(self.flush)
+
+    def _reset(self, pid):
+        self._pid = pid
+        self._requests = {}
+        self._latency = {}
+        self._sql = {}
+        self._path = None
+        self._dirty = False
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f"{pid}-{id(self):x}.json")
+            threading.Thread(target=self._flush_every_interval, args=(pid,),
+                             name="metrics-flush", daemon=True).start()
+
+    def _flush_every_interval(self, pid):
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty and self._pid == pid:
+                self.flush()
+
+    def _check_fork(self):
+        # a forked worker counts from zero in its own file
+        pid = os.getpid()
+        if pid != self._pid:
+            self._reset(pid)
+
+    def record(self, endpoint, method, status, seconds, statements=0, sql_seconds=0.0):
+        """Record a served request
+
+        Args:
+            endpoint (String): name of the endpoint that served it
+            method (String): HTTP method
+            status (Integer): status code of the response
+            seconds (Float): time taken to respond
+            statements (Integer): SQL statements run
+            sql_seconds (Float): time the statements took
+        """
+        key = (endpoint, method, status)
+        with self._lock:
+            self._check_fork()
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            latency = self._latency.get(endpoint)
+            if latency is None:
+                # a count per bucket and +Inf, then the sum
+                latency = self._latency[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            latency[bisect_left(self.buckets, seconds)] += 1
+            latency[-1] += seconds
+
+            sql = self._sql.get(endpoint)
+            if sql is None:
+                sql = self._sql[endpoint] = [0, 0.0]
+            sql[0] += statements
+            sql[1] += sql_seconds
+            self._dirty = True
+
+    # The request being served is kept in a thread local rather than in
+    # flask.g, whose lookups would cost more than the rest of the
+    # recording.
+
+    def start_request(self):
+        """Start timing the request of this thread"""
+        self._local.request = [perf_counter(), 0, 0.0]
+
+    def count_statement(self, query, params, seconds):
+        """Count a SQL statement of the request of this thread"""
+        served = getattr(self._local, 'request', None)
+        if served is not None:
+            served[1] += 1
+            served[2] += seconds
+
+    def record_response(self, response):
+        """Record the request of this thread with its response"""
+        served = getattr(self._local, 'request', None)
+        if served is not None:
+            self._local.request = None
+            start, statements, sql_seconds = served
+            req = request._get_current_object()
+            self.record(req.endpoint or "unmatched", req.method, response.status_code,
+                        perf_counter() - start, statements, sql_seconds)
+        return response
+
+    def snapshot(self):
+        """Get the metrics of this process as a JSON serialisable dict"""
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "requests": [list(key) + [count] for key, count in self._requests.items()],
+                "latency": {endpoint: list(counts) for endpoint, counts in self._latency.items()},
+                "sql": {endpoint: list(sql) for endpoint, sql in self._sql.items()}
+            }
+
+    def flush(self):
+        """Write this process's metrics to its file"""
+        with self._lock:
+            self._check_fork()
+            self._dirty = False
+        if not self._path:
+            return
+        try:
+            write_snapshot(self._path, self.snapshot())
+        except FileNotFoundError:
+            # the directory was cleared
+            return
+
+    def _read(self, name):
+        """Get the snapshot in a file of the directory, None when it
+        can not be read or has other buckets.
+        """
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get("buckets") == list(self.buckets):
+            return snapshot
+        return None
+
+    def retire_exited_workers(self):
+        """Fold the files of workers that exited into the RETIRED file"""
+        if fcntl is None:
+            return
+        with open(os.path.join(self.directory, "retired.lock"), "a") as lock:
+            # one worker folds at a time so no file is added twice
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited = []
+            for name in os.listdir(self.directory):
+                pid = name.split("-", 1)[0]
+                if pid.isdigit() and not is_running(int(pid)):
+                    exited.append(name)
+            if not exited:
+                return
+            snapshots = [self._read(name) for name in [RETIRED] + exited
+                         if name.endswith(".json")]
+            write_snapshot(os.path.join(self.directory, RETIRED),
+                           merge(self.buckets, filter(None, snapshots)))
+            for name in exited:
+                os.remove(os.path.join(self.directory, name))
+
+    def collect(self):
+        """Get the snapshots of every worker, this one's up to date"""
+        if not self._path:
+            return [self.snapshot()]
+        self.flush()
+        self.retire_exited_workers()
+        snapshots = [self._read(name) for name in os.listdir(self.directory)
+                     if name.endswith(".json")]
+        return [snapshot for snapshot in snapshots if snapshot]
+
+    def render(self):
+        """Get the metrics of every worker in the Prometheus text format"""
+        totals = merge(self.buckets, self.collect())
+        requests = {tuple(key): count for *key, count in totals["requests"]}
+        latency, sql = totals["latency"], totals["sql"]
+
+        lines = [
+            "# HELP ridemyway_http_requests_total Requests served.",
+            "# TYPE ridemyway_http_requests_total counter"
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'ridemyway_http_requests_total{{endpoint="{endpoint}",'
+                         f'method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP ridemyway_http_request_duration_seconds Time taken to respond.",
+            "# TYPE ridemyway_http_request_duration_seconds histogram"
+        ]
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for endpoint, counts in sorted(latency.items()):
+            label = f'endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'ridemyway_http_request_duration_seconds_bucket'
+                             f'{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"ridemyway_http_request_duration_seconds_sum{{{label}}} {counts[-1]!r}")
+            lines.append(f"ridemyway_http_request_duration_seconds_count{{{label}}} {cumulative}")
+
+        lines += [
+            "# HELP ridemyway_sql_statements_total SQL statements run by requests.",
+            "# TYPE ridemyway_sql_statements_total counter"
+        ]
+        lines += [f'ridemyway_sql_statements_total{{endpoint="{endpoint}"}} {statements}'
+                  for endpoint, (statements, _) in sorted(sql.items())]
+        lines += [
+            "# HELP ridemyway_sql_seconds_total Time the SQL statements of requests took.",
+            "# TYPE ridemyway_sql_seconds_total counter"
+        ]
+        lines += [f'ridemyway_sql_seconds_total{{endpoint="{endpoint}"}} {seconds!r}'
+                  for endpoint, (_, seconds) in sorted(sql.items())]
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics(app=None):
+    """Get the metrics of the app, None when they are disabled"""
+    app = app or current_app
+    return app.extensions.get('metrics')
+
+
+def metrics_view():
+    return Response(get_metrics().render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """Record the metrics of every request and serve them at /metrics
+    when METRICS_ENABLED. This is called by the application factory.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    directory = app.config['METRICS_DIR'] or None
+    app.extensions['metrics'] = Metrics(app.config['METRICS_BUCKETS'], directory,
+                                        app.config['METRICS_FLUSH_INTERVAL'])
+
+    metrics = app.extensions['metrics']
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.record_response)
+    add_query_observer(app, metrics.count_statement)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,168 @@
+"""Versioned schema migrations.
+
+Each migration is a file in app/migrations named `<version>_<name>.sql`
+with an `-- upgrade` and a `-- downgrade` section. A storage engine
+that needs different SQL gets its own `<version>_<name>.<dialect>.sql`
+which is used instead. Applied versions are recorded in the
+schema_migrations table of the database itself.
+"""
+import re
+from collections import namedtuple
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.joinpath('migrations')
+
+Migration = namedtuple('Migration', ['version', 'name', 'upgrade', 'downgrade'])
+
+_FILENAME = re.compile(r'^(\d+)_(\w+?)(?:\.(\w+))?\.sql$')
+_SECTION = re.compile(r'^[ \t]*--\s*(upgrade|downgrade)\s*$', re.MULTILINE | re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    """A migration could not be applied or reverted"""
+
+
+def parse_migration(version, name, text):
+    """Split a migration file into its upgrade & downgrade sql.
+
+    Arguments:
+        version {Integer} -- migration version
+        name {String} -- migration name
+        text {String} -- content of the migration file
+    """
+    parts = _SECTION.split(text)
+    sections = dict(zip(parts[1::2], parts[2::2]))
+    sections = {key.lower(): sql.strip() for key, sql in sections.items()}
+
+    if 'upgrade' not in sections:
+        raise MigrationError(f"Migration {version}_{name} has no upgrade section")
+
+    return Migration(version, name, sections['upgrade'],
+                     sections.get('downgrade', ''))
+
+
+def load_migrations(dialect='sqlite', directory=MIGRATIONS_DIR):
+    """Load the migrations for a SQL dialect ordered by version
+
+    Arguments:
+        dialect {String} -- 'sqlite' or 'postgresql'
+
+    Returns:
+        list: Migration tuples
+    """
+    files = {}
+    for path in sorted(Path(directory).iterdir()):
+        match = _FILENAME.match(path.name)
+        if not match or match.group(3) not in (None, dialect):
+            continue
+        version = int(match.group(1))
+        # a dialect specific file wins over the generic one
+        if version not in files or match.group(3):
+            files[version] = (match.group(2), path)
+
+    return [parse_migration(version, name, path.read_text())
+            for version, (name, path) in sorted(files.items())]
+
+
+def _migrations_for(db, migrations):
+    if migrations is None:
+        return load_migrations(getattr(db, 'dialect', 'sqlite'))
+    return migrations
+
+
+def ensure_version_table(db):
+    """Create the table that tracks applied migrations"""
+    db.execute("""CREATE TABLE IF NOT EXISTS schema_migrations(
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""")
+    db.commit()
+
+
+def applied_versions(db):
+    """Get the versions applied to the database
+
+    Returns:
+        list: applied versions in ascending order
+    """
+    ensure_version_table(db)
+    rows = db.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in rows.fetchall()]
+
+
+def _run(db, sql, record):
+    """Run a migration script and its bookkeeping in one transaction.
+
+    Nothing is left behind if any statement fails.
+    """
+    try:
+        db.executescript(f"BEGIN;\n{sql}\n;\n{record};\nCOMMIT;")
+    except Exception as error:
+        if db.in_transaction:
+            db.rollback()
+        raise MigrationError(str(error)) from error
+
+
+def upgrade(db, target=None, migrations=None):
+    """Apply pending migrations up to target
+
+    Arguments:
+        db -- Database connection
+        target {Integer} -- last version to apply, all when None
+
+    Returns:
+        list: migrations that were applied
+    """
+    migrations = _migrations_for(db, migrations)
+    applied = set(applied_versions(db))
+
+    done = []
+    for migration in migrations:
+        if migration.version in applied:
+            continue
+        if target is not None and migration.version > target:
+            break
+        record = "INSERT INTO schema_migrations (version, name) " \
+                 f"VALUES ({migration.version}, '{migration.name}')"
+        _run(db, migration.upgrade, record)
+        done.append(migration)
+    return done
+
+
+def downgrade(db, target=None, migrations=None):
+    """Revert applied migrations down to target
+
+    Arguments:
+        db -- Database connection
+        target {Integer} -- version to keep, only the latest
+                            migration is reverted when None
+
+    Returns:
+        list: migrations that were reverted
+    """
+    migrations = _migrations_for(db, migrations)
+    applied = applied_versions(db)
+    if target is None:
+        target = applied[-2] if len(applied) > 1 else 0
+
+    done = []
+    for migration in reversed(migrations):
+        if migration.version not in applied or migration.version <= target:
+            continue
+        record = "DELETE FROM schema_migrations " \
+                 f"WHERE version = {migration.version}"
+        _run(db, migration.downgrade, record)
+        done.append(migration)
+    return done
+
+
+def status(db, migrations=None):
+    """Get each migration with whether it is applied
+
+    Returns:
+        list: (Migration, applied) tuples
+    """
+    migrations = _migrations_for(db, migrations)
+    applied = set(applied_versions(db))
+    return [(migration, migration.version in applied) for migration in migrations]
@@ -0,0 +1,33 @@
+-- PostgreSQL version of 0001_initial.sql
+
+-- upgrade
+CREATE TABLE IF NOT EXISTS users(
+    id TEXT PRIMARY KEY,
+    name VARCHAR(120) NOT NULL,
+    email VARCHAR(120) NOT NULL UNIQUE,
+    password VARCHAR(256) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rides(
+    id SERIAL PRIMARY KEY,
+    starting_point VARCHAR(256) NOT NULL,
+    destination VARCHAR(256) NOT NULL,
+    depart_time VARCHAR(256) NOT NULL,
+    eta VARCHAR(256) NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle VARCHAR(120) NOT NULL,
+    driver TEXT REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS requests(
+    id SERIAL PRIMARY KEY,
+    ride_id INTEGER NOT NULL REFERENCES rides(id),
+    user_id TEXT NOT NULL REFERENCES users(id),
+    destination VARCHAR(256) NOT NULL,
+    req_status VARCHAR(20)
+);
+
+-- downgrade
+DROP TABLE IF EXISTS requests;
+DROP TABLE IF EXISTS rides;
+DROP TABLE IF EXISTS users;
@@ -0,0 +1,37 @@
+-- Tables of the original schema.sql. IF NOT EXISTS lets databases
+-- created by `flask db init` before migrations existed adopt them.
+
+-- upgrade
+CREATE TABLE IF NOT EXISTS users(
+    id TEXT PRIMARY KEY,
+    name TEXT(120) NOT NULL,
+    email TEXT(120) NOT NULL UNIQUE,
+    password TEXT(256) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rides(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    starting_point TEXT(256) NOT NULL,
+    destination TEXT(256) NOT NULL,
+    depart_time TEXT(256) NOT NULL,
+    eta TEXT(256) NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle TEXT(120) NOT NULL,
+    driver TEXT,
+    FOREIGN KEY (driver) REFERENCES users(id)
+);
+
+CREATE TABLE IF NOT EXISTS requests(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ride_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    destination TEXT(256) NOT NULL,
+    req_status TEXT(20),
+    FOREIGN KEY(ride_id) REFERENCES rides(id),
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+-- downgrade
+DROP TABLE IF EXISTS requests;
+DROP TABLE IF EXISTS rides;
+DROP TABLE IF EXISTS users;
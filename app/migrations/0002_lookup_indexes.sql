@@ -0,0 +1,13 @@
+-- Indexes for the lookups made on every join request, request listing
+-- and ride creation. The (ride_id, user_id) index also serves lookups
+-- on ride_id alone, so requests needs no separate ride_id index.
+-- Fails, leaving the database untouched, if duplicate join requests
+-- already exist: remove them before upgrading.
+
+-- upgrade
+CREATE UNIQUE INDEX ux_requests_ride_user ON requests(ride_id, user_id);
+CREATE INDEX ix_rides_driver_eta ON rides(driver, eta);
+
+-- downgrade
+DROP INDEX IF EXISTS ix_rides_driver_eta;
+DROP INDEX IF EXISTS ux_requests_ride_user;
@@ -0,0 +1,15 @@
+-- Indexes for the GET /rides filters. Each filter index ends with id
+-- so a filtered page is read in keyset order straight from the index.
+-- ix_rides_depart covers the "YYYYmmdd HH:MM" form of the dd-mm-YYYY
+-- depart_time text, which is what the departs_after/before filters
+-- compare until 0005 stores real timestamps.
+
+-- upgrade
+CREATE INDEX ix_rides_starting_point ON rides(starting_point, id);
+CREATE INDEX ix_rides_destination ON rides(destination, id);
+CREATE INDEX ix_rides_depart ON rides((substr(depart_time, 7, 4) || substr(depart_time, 4, 2) || substr(depart_time, 1, 2) || substr(depart_time, 11)));
+
+-- downgrade
+DROP INDEX IF EXISTS ix_rides_depart;
+DROP INDEX IF EXISTS ix_rides_destination;
+DROP INDEX IF EXISTS ix_rides_starting_point;
@@ -0,0 +1,11 @@
+-- PostgreSQL version of 0004_ride_search.sql. A GIN index over the
+-- text search vector plays the part of the FTS5 table and is kept up
+-- to date by PostgreSQL itself. The expression must stay identical to
+-- the one searched by ride_data.search_rides.
+
+-- upgrade
+CREATE INDEX ix_rides_search ON rides
+    USING GIN (to_tsvector('simple', starting_point || ' ' || destination));
+
+-- downgrade
+DROP INDEX IF EXISTS ix_rides_search;
@@ -0,0 +1,38 @@
+-- Full-text index over where rides start and where they go, used by
+-- GET /rides/search. It is an external content FTS5 table: rides holds
+-- the text and the triggers keep the index in step with every write.
+
+-- upgrade
+CREATE VIRTUAL TABLE rides_search USING fts5(
+    starting_point,
+    destination,
+    content='rides',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER rides_search_insert AFTER INSERT ON rides BEGIN
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
+
+CREATE TRIGGER rides_search_delete AFTER DELETE ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+END;
+
+CREATE TRIGGER rides_search_update AFTER UPDATE OF starting_point, destination ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
+
+INSERT INTO rides_search(rides_search) VALUES ('rebuild');
+
+-- downgrade
+DROP TRIGGER IF EXISTS rides_search_update;
+DROP TRIGGER IF EXISTS rides_search_delete;
+DROP TRIGGER IF EXISTS rides_search_insert;
+DROP TABLE IF EXISTS rides_search;
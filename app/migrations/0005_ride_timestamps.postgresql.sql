@@ -0,0 +1,28 @@
+-- PostgreSQL version of 0005_ride_timestamps.sql, the columns are
+-- converted in place.
+
+-- upgrade
+DROP INDEX IF EXISTS ix_rides_depart;
+DROP INDEX IF EXISTS ix_rides_driver_eta;
+
+ALTER TABLE rides
+    ALTER COLUMN depart_time TYPE TIMESTAMP
+        USING to_timestamp(depart_time, 'DD-MM-YYYY HH24:MI')::TIMESTAMP,
+    ALTER COLUMN eta TYPE TIMESTAMP
+        USING to_timestamp(eta, 'DD-MM-YYYY HH24:MI')::TIMESTAMP;
+
+CREATE INDEX ix_rides_depart_time ON rides(depart_time);
+CREATE INDEX ix_rides_driver_depart_eta ON rides(driver, depart_time, eta);
+
+-- downgrade
+DROP INDEX IF EXISTS ix_rides_driver_depart_eta;
+DROP INDEX IF EXISTS ix_rides_depart_time;
+
+ALTER TABLE rides
+    ALTER COLUMN depart_time TYPE VARCHAR(256)
+        USING to_char(depart_time, 'DD-MM-YYYY HH24:MI'),
+    ALTER COLUMN eta TYPE VARCHAR(256)
+        USING to_char(eta, 'DD-MM-YYYY HH24:MI');
+
+CREATE INDEX ix_rides_driver_eta ON rides(driver, eta);
+CREATE INDEX ix_rides_depart ON rides((substr(depart_time, 7, 4) || substr(depart_time, 4, 2) || substr(depart_time, 1, 2) || substr(depart_time, 11)));
@@ -0,0 +1,98 @@
+-- Store depart_time and eta as sortable TIMESTAMP values
+-- ("YYYY-MM-DD HH:MM:SS") instead of "dd-mm-YYYY HH:MM" text so that
+-- time comparisons are correct and can use range indexes. SQLite can
+-- not change a column type, so rides is rebuilt with its rows
+-- backfilled, then its indexes and search triggers are recreated.
+
+-- upgrade
+CREATE TABLE rides_new(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    starting_point TEXT(256) NOT NULL,
+    destination TEXT(256) NOT NULL,
+    depart_time TIMESTAMP NOT NULL,
+    eta TIMESTAMP NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle TEXT(120) NOT NULL,
+    driver TEXT,
+    FOREIGN KEY (driver) REFERENCES users(id)
+);
+
+INSERT INTO rides_new (id, starting_point, destination, depart_time, eta,
+                       seats, vehicle, driver)
+SELECT id, starting_point, destination,
+    substr(depart_time, 7, 4) || '-' || substr(depart_time, 4, 2) || '-' ||
+    substr(depart_time, 1, 2) || ' ' || substr(depart_time, 12, 5) || ':00',
+    substr(eta, 7, 4) || '-' || substr(eta, 4, 2) || '-' ||
+    substr(eta, 1, 2) || ' ' || substr(eta, 12, 5) || ':00',
+    seats, vehicle, driver
+FROM rides;
+
+DROP TABLE rides;
+ALTER TABLE rides_new RENAME TO rides;
+
+CREATE INDEX ix_rides_starting_point ON rides(starting_point, id);
+CREATE INDEX ix_rides_destination ON rides(destination, id);
+CREATE INDEX ix_rides_depart_time ON rides(depart_time);
+CREATE INDEX ix_rides_driver_depart_eta ON rides(driver, depart_time, eta);
+
+CREATE TRIGGER rides_search_insert AFTER INSERT ON rides BEGIN
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
+
+CREATE TRIGGER rides_search_delete AFTER DELETE ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+END;
+
+CREATE TRIGGER rides_search_update AFTER UPDATE OF starting_point, destination ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
+
+-- downgrade
+CREATE TABLE rides_old(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    starting_point TEXT(256) NOT NULL,
+    destination TEXT(256) NOT NULL,
+    depart_time TEXT(256) NOT NULL,
+    eta TEXT(256) NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle TEXT(120) NOT NULL,
+    driver TEXT,
+    FOREIGN KEY (driver) REFERENCES users(id)
+);
+
+INSERT INTO rides_old (id, starting_point, destination, depart_time, eta,
+                       seats, vehicle, driver)
+SELECT id, starting_point, destination,
+    strftime('%d-%m-%Y %H:%M', depart_time), strftime('%d-%m-%Y %H:%M', eta),
+    seats, vehicle, driver
+FROM rides;
+
+DROP TABLE rides;
+ALTER TABLE rides_old RENAME TO rides;
+
+CREATE INDEX ix_rides_driver_eta ON rides(driver, eta);
+CREATE INDEX ix_rides_starting_point ON rides(starting_point, id);
+CREATE INDEX ix_rides_destination ON rides(destination, id);
+CREATE INDEX ix_rides_depart ON rides((substr(depart_time, 7, 4) || substr(depart_time, 4, 2) || substr(depart_time, 1, 2) || substr(depart_time, 11)));
+
+CREATE TRIGGER rides_search_insert AFTER INSERT ON rides BEGIN
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
+
+CREATE TRIGGER rides_search_delete AFTER DELETE ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+END;
+
+CREATE TRIGGER rides_search_update AFTER UPDATE OF starting_point, destination ON rides BEGIN
+    INSERT INTO rides_search(rides_search, rowid, starting_point, destination)
+    VALUES ('delete', old.id, old.starting_point, old.destination);
+    INSERT INTO rides_search(rowid, starting_point, destination)
+    VALUES (new.id, new.starting_point, new.destination);
+END;
@@ -0,0 +1,17 @@
+-- Optional coordinates of where a ride starts, see 0006_ride_location.sql.
+-- start_geohash uses the "C" collation so that range scans on the index
+-- compare geohashes byte by byte, the same as SQLite.
+
+-- upgrade
+ALTER TABLE rides ADD COLUMN start_lat DOUBLE PRECISION;
+ALTER TABLE rides ADD COLUMN start_lon DOUBLE PRECISION;
+ALTER TABLE rides ADD COLUMN start_geohash VARCHAR(12) COLLATE "C";
+
+CREATE INDEX ix_rides_start_geohash ON rides(start_geohash);
+
+-- downgrade
+DROP INDEX ix_rides_start_geohash;
+
+ALTER TABLE rides DROP COLUMN start_geohash;
+ALTER TABLE rides DROP COLUMN start_lon;
+ALTER TABLE rides DROP COLUMN start_lat;
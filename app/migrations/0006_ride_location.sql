@@ -0,0 +1,19 @@
+-- Optional coordinates of where a ride starts. start_geohash is the
+-- geohash of the point (see app.geo), every point in a geohash cell
+-- shares the cell as a prefix so GET /rides/nearby finds candidate
+-- rides with a few range scans of ix_rides_start_geohash.
+-- The downgrade needs SQLite 3.35 or newer for DROP COLUMN.
+
+-- upgrade
+ALTER TABLE rides ADD COLUMN start_lat DOUBLE PRECISION;
+ALTER TABLE rides ADD COLUMN start_lon DOUBLE PRECISION;
+ALTER TABLE rides ADD COLUMN start_geohash VARCHAR(12);
+
+CREATE INDEX ix_rides_start_geohash ON rides(start_geohash);
+
+-- downgrade
+DROP INDEX ix_rides_start_geohash;
+
+ALTER TABLE rides DROP COLUMN start_geohash;
+ALTER TABLE rides DROP COLUMN start_lon;
+ALTER TABLE rides DROP COLUMN start_lat;
@@ -0,0 +1,25 @@
+-- PostgreSQL version of 0007_change_counters.sql. The counter is
+-- bumped once per statement instead of once per row.
+
+-- upgrade
+CREATE TABLE change_counters(
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO change_counters (name) VALUES ('rides');
+
+CREATE OR REPLACE FUNCTION bump_change_counter() RETURNS trigger AS $$
+BEGIN
+    UPDATE change_counters SET version = version + 1 WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER rides_version AFTER INSERT OR UPDATE OR DELETE ON rides
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_change_counter();
+
+-- downgrade
+DROP TRIGGER rides_version ON rides;
+DROP FUNCTION bump_change_counter();
+DROP TABLE change_counters;
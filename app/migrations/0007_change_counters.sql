@@ -0,0 +1,29 @@
+-- A counter per table that is bumped by triggers on every change, so
+-- a worker process can tell that another one wrote to the table since
+-- it filled its caches (see app.cache).
+
+-- upgrade
+CREATE TABLE change_counters(
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO change_counters (name) VALUES ('rides');
+
+CREATE TRIGGER rides_version_insert AFTER INSERT ON rides BEGIN
+    UPDATE change_counters SET version = version + 1 WHERE name = 'rides';
+END;
+
+CREATE TRIGGER rides_version_update AFTER UPDATE ON rides BEGIN
+    UPDATE change_counters SET version = version + 1 WHERE name = 'rides';
+END;
+
+CREATE TRIGGER rides_version_delete AFTER DELETE ON rides BEGIN
+    UPDATE change_counters SET version = version + 1 WHERE name = 'rides';
+END;
+
+-- downgrade
+DROP TRIGGER rides_version_insert;
+DROP TRIGGER rides_version_update;
+DROP TRIGGER rides_version_delete;
+DROP TABLE change_counters;
@@ -0,0 +1,38 @@
+-- PostgreSQL version of 0008_ride_versions.sql
+
+-- upgrade
+ALTER TABLE rides ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION bump_ride_version() RETURNS trigger AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER rides_bump_version BEFORE UPDATE ON rides
+    FOR EACH ROW EXECUTE PROCEDURE bump_ride_version();
+
+CREATE OR REPLACE FUNCTION bump_requested_ride_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE rides SET version = version + 1 WHERE id = OLD.ride_id;
+    ELSE
+        UPDATE rides SET version = version + 1 WHERE id = NEW.ride_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER requests_bump_version AFTER INSERT OR UPDATE OR DELETE ON requests
+    FOR EACH ROW EXECUTE PROCEDURE bump_requested_ride_version();
+
+-- downgrade
+DROP TRIGGER requests_bump_version ON requests;
+DROP TRIGGER rides_bump_version ON rides;
+DROP FUNCTION bump_requested_ride_version();
+DROP FUNCTION bump_ride_version();
+
+ALTER TABLE rides DROP COLUMN version;
@@ -0,0 +1,31 @@
+-- A version per ride, bumped by triggers whenever the ride or one of
+-- its join requests changes. GET /rides/<id> derives its ETag from it,
+-- GET /rides uses the rides counter of change_counters.
+
+-- upgrade
+ALTER TABLE rides ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TRIGGER rides_bump_version AFTER UPDATE ON rides
+WHEN new.version = old.version BEGIN
+    UPDATE rides SET version = old.version + 1 WHERE id = new.id;
+END;
+
+CREATE TRIGGER requests_bump_version_insert AFTER INSERT ON requests BEGIN
+    UPDATE rides SET version = version + 1 WHERE id = new.ride_id;
+END;
+
+CREATE TRIGGER requests_bump_version_update AFTER UPDATE ON requests BEGIN
+    UPDATE rides SET version = version + 1 WHERE id = new.ride_id;
+END;
+
+CREATE TRIGGER requests_bump_version_delete AFTER DELETE ON requests BEGIN
+    UPDATE rides SET version = version + 1 WHERE id = old.ride_id;
+END;
+
+-- downgrade
+DROP TRIGGER requests_bump_version_delete;
+DROP TRIGGER requests_bump_version_update;
+DROP TRIGGER requests_bump_version_insert;
+DROP TRIGGER rides_bump_version;
+
+ALTER TABLE rides DROP COLUMN version;
@@ -0,0 +1,36 @@
+-- PostgreSQL version of 0009_ride_archive.sql
+
+-- upgrade
+CREATE INDEX ix_rides_eta ON rides(eta);
+
+CREATE TABLE rides_archive(
+    id INTEGER PRIMARY KEY,
+    starting_point VARCHAR(256) NOT NULL,
+    destination VARCHAR(256) NOT NULL,
+    depart_time TIMESTAMP NOT NULL,
+    eta TIMESTAMP NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle VARCHAR(120) NOT NULL,
+    driver TEXT,
+    start_lat DOUBLE PRECISION,
+    start_lon DOUBLE PRECISION,
+    start_geohash VARCHAR(12) COLLATE "C",
+    version INTEGER NOT NULL DEFAULT 1,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE requests_archive(
+    id INTEGER PRIMARY KEY,
+    ride_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    destination VARCHAR(256) NOT NULL,
+    req_status VARCHAR(20)
+);
+
+CREATE INDEX ix_requests_archive_ride ON requests_archive(ride_id);
+
+-- downgrade
+DROP INDEX IF EXISTS ix_requests_archive_ride;
+DROP TABLE IF EXISTS requests_archive;
+DROP TABLE IF EXISTS rides_archive;
+DROP INDEX IF EXISTS ix_rides_eta;
@@ -0,0 +1,40 @@
+-- Rides whose eta has passed are moved, with their join requests, to
+-- archive tables by app.archive so that the live tables only hold
+-- rides that can still be joined. The archive tables have the same
+-- columns and no foreign keys: users are never removed and rows are
+-- only ever copied in. ix_rides_eta finds the rides to move.
+
+-- upgrade
+CREATE INDEX ix_rides_eta ON rides(eta);
+
+CREATE TABLE rides_archive(
+    id INTEGER PRIMARY KEY,
+    starting_point TEXT(256) NOT NULL,
+    destination TEXT(256) NOT NULL,
+    depart_time TIMESTAMP NOT NULL,
+    eta TIMESTAMP NOT NULL,
+    seats INTEGER NOT NULL,
+    vehicle TEXT(120) NOT NULL,
+    driver TEXT,
+    start_lat DOUBLE PRECISION,
+    start_lon DOUBLE PRECISION,
+    start_geohash VARCHAR(12),
+    version INTEGER NOT NULL DEFAULT 1,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE requests_archive(
+    id INTEGER PRIMARY KEY,
+    ride_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    destination TEXT(256) NOT NULL,
+    req_status TEXT(20)
+);
+
+CREATE INDEX ix_requests_archive_ride ON requests_archive(ride_id);
+
+-- downgrade
+DROP INDEX IF EXISTS ix_requests_archive_ride;
+DROP TABLE IF EXISTS requests_archive;
+DROP TABLE IF EXISTS rides_archive;
+DROP INDEX IF EXISTS ix_rides_eta;
@@ -1,8 +1,22 @@
 """Defines Data Models for the aplication"""
 from uuid import uuid4
-from werkzeug.security import generate_password_hash
+from datetime import datetime
 
-from .db import get_db, close_db
+from .db import get_db, write_transaction
+from .hashing import hash_password
+from .geo import encode
+from .validators import DATE_FORMAT
+
+
+def as_datetime(value):
+    """Get the datetime of a ride time
+
+    Arguments:
+        value -- datetime or a string in DATE_FORMAT
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, DATE_FORMAT)
 
 class User:
     """Defines the User Data Model"""
@@ -11,7 +25,7 @@ class User:
         self.id = uuid4().hex
         self.name = name
         self.email = email
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def save(self):
         """Saves a New user to the database"""
@@ -21,48 +35,77 @@ class User:
         data = (self.id, self.name, self.email, self.password)
         db.execute(query, data)
         db.commit()
-        close_db()
 
 
 class Ride:
     """Define the Ride Model
     """
+    FIELDS = ("starting_point", "destination", "depart_time", "eta", "seats",
+              "vehicle", "driver", "start_lat", "start_lon", "start_geohash")
+    INSERT = f"INSERT INTO rides ({', '.join(FIELDS)}) " \
+             f"VALUES ({', '.join('?' * len(FIELDS))})"
+
     def __init__(self,driver, **ride_details):
         """Create a Ride Instance
         """
 
         self.starting_point = ride_details['starting_point']
         self.destination = ride_details['destination']
-        self.depart_time = ride_details['depart_time']
-        self.eta = ride_details['eta']
+        self.depart_time = as_datetime(ride_details['depart_time'])
+        self.eta = as_datetime(ride_details['eta'])
         self.seats = ride_details['seats']
         self.vehicle = ride_details['vehicle']
         self.driver = driver
+
+        # where the ride starts, optional
+        self.start_lat = ride_details.get('start_lat')
+        self.start_lon = ride_details.get('start_lon')
+        self.start_geohash = None
+        if self.start_lat is not None and self.start_lon is not None:
+            self.start_geohash = encode(self.start_lat, self.start_lon)
     
+    def values(self):
+        """Get the column values of the ride in FIELDS order"""
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
     def save(self):
         """Saves a new ride to the database"""
         
         db = get_db()
-        fields = "(starting_point, destination, depart_time, \
-        eta, seats, vehicle, driver)"
-        query = "INSERT INTO rides " + fields + "\
-            VALUES (?, ?, ?, ?, ?, ?, ?)"
-        data = (self.starting_point, self.destination, self.depart_time, 
-                    self.eta, self.seats, self.vehicle, self.driver)
-        
         cursor = db.cursor()
-        cursor.execute(query, data)
+        cursor.execute(self.INSERT, self.values())
         db.commit()
         ride_id = cursor.lastrowid
         cursor.close()
-        close_db()
 
         return ride_id
 
+    @classmethod
+    def save_many(cls, rides):
+        """Saves new rides to the database in one transaction
+
+        Arguments:
+            rides {list} -- Ride instances
+
+        Returns:
+            list: the id of each ride, in the order of rides
+        """
+        with write_transaction() as db:
+            cursor = db.cursor()
+            ride_ids = []
+            for ride in rides:
+                cursor.execute(cls.INSERT, ride.values())
+                ride_ids.append(cursor.lastrowid)
+            cursor.close()
+
+        return ride_ids
+
 
 class RideRequest:
     """Defines a Ride_request
     """
+    # status of a new request, until the driver accepts or rejects it
+    STATUS = "pending"
 
     def __init__(self, rideID, passenger, dest):
         """Create a new Ride_Request Instance
@@ -76,7 +119,7 @@ class RideRequest:
         self.ride = rideID
         self.passenger = passenger
         self.destination = dest
-        self.status = "accepted" # TODO make toggle: accepted/rejected
+        self.status = self.STATUS
     
     def save(self):
         """saves a newly created ride request
@@ -91,7 +134,6 @@ class RideRequest:
         db.commit()
         reqID = cursor.lastrowid
         cursor.close()
-        close_db()
 
         return reqID
         
@@ -0,0 +1,274 @@
+"""Compiled validation of JSON request payloads.
+
+A Schema declares the fields of a payload once. It is compiled into a
+single function that checks every field in one pass and reports all
+the errors, instead of a RequestParser running a validator per
+argument and stopping at the first error. Date fields are returned as
+datetimes, so the data layer does not parse them again, and they are
+compared with a single reading of the clock per payload.
+
+Error messages are those of app.validators.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from flask import request
+from flask_restplus import abort, fields
+
+from .validators import DATE_FORMAT
+
+MISSING = "Missing required parameter in the JSON body"
+
+
+class Field(ABC):
+    """A field of a payload"""
+
+    doc_field = fields.String
+
+    def __init__(self, required=True, description=None):
+        self.required = required
+        self.description = description
+
+    @abstractmethod
+    def compile(self, name):
+        """Get the function that checks a value of the field name
+
+        The function takes the value and the time the payload is checked
+        at, it returns the cleaned value or raises ValueError.
+        """
+
+    def doc(self):
+        """Get the flask_restplus field documenting this field"""
+        return self.doc_field(required=self.required, description=self.description)
+
+
+class String(Field):
+    """A string that is not empty or only spaces"""
+
+    def compile(self, name):
+        empty = f"{name} value cannot be empty"
+        spaces = f"{name} value cannot contain spaces or tabs only"
+        not_string = f"{name} must be a string"
+
+        def check(value, now):
+            if value.__class__ is not str:
+                raise ValueError(not_string)
+            if not value:
+                raise ValueError(empty)
+            if value.isspace():
+                raise ValueError(spaces)
+            return value
+        return check
+
+
+class Email(String):
+    """An email address"""
+
+    def compile(self, name):
+        check_string = String.compile(self, name)
+
+        def check(value, now):
+            check_string(value, now)
+            if '@' not in value:
+                raise ValueError("Invalid email address: Must have '@' ")
+            if value[0].isdigit():
+                raise ValueError("Invalid email address: Cannot start with digit")
+            return value
+        return check
+
+
+class Password(String):
+    """A string of at least min_length characters"""
+
+    def __init__(self, min_length=8, **kwargs):
+        super().__init__(**kwargs)
+        self.min_length = min_length
+
+    def compile(self, name):
+        check_string = String.compile(self, name)
+        min_length = self.min_length
+        too_short = f"{name} must contain not less that {min_length} characters"
+
+        def check(value, now):
+            check_string(value, now)
+            if len(value) < min_length:
+                raise ValueError(too_short)
+            return value
+        return check
+
+
+class Choice(String):
+    """One of a few strings, in any case"""
+
+    def __init__(self, choices, **kwargs):
+        super().__init__(**kwargs)
+        self.choices = tuple(choices)
+
+    def compile(self, name):
+        check_string = String.compile(self, name)
+        choices = frozenset(self.choices)
+        invalid = "{} must be either {}".format(
+            name, " or ".join(f"'{choice}'" for choice in self.choices))
+
+        def check(value, now):
+            value = check_string(value, now).lower()
+            if value not in choices:
+                raise ValueError(invalid)
+            return value
+        return check
+
+    def doc(self):
+        return fields.String(required=self.required, description=self.description,
+                             enum=list(self.choices))
+
+
+class Integer(Field):
+    """An integer, or a string of one"""
+
+    doc_field = fields.Integer
+
+    def compile(self, name):
+        invalid = f"{name} must be an integer"
+
+        def check(value, now):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise ValueError(invalid)
+        return check
+
+
+class Number(Field):
+    """A number from minimum to maximum"""
+
+    doc_field = fields.Float
+
+    def __init__(self, minimum, maximum, **kwargs):
+        super().__init__(**kwargs)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self, name):
+        minimum, maximum = self.minimum, self.maximum
+        not_number = f"{name} must be a number"
+        out_of_range = f"{name} must be between {minimum} and {maximum}"
+
+        def check(value, now):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(not_number)
+            if not minimum <= number <= maximum:
+                raise ValueError(out_of_range)
+            return number
+        return check
+
+
+class FutureDateTime(String):
+    """A time formatted as DATE_FORMAT that has not passed"""
+
+    def compile(self, name):
+        check_string = String.compile(self, name)
+        invalid = f"{name} must be a date formatted as dd-mm-YYYY HH:MM"
+        strptime = datetime.strptime
+
+        def check(value, now):
+            check_string(value, now)
+            try:
+                moment = strptime(value, DATE_FORMAT)
+            except ValueError:
+                raise ValueError(invalid)
+            if moment < now:
+                raise ValueError("{} must be greater than the current time now: {}"
+                                 .format(name, now.strftime(DATE_FORMAT)))
+            return moment
+        return check
+
+    def doc(self):
+        return fields.String(required=self.required, description=self.description,
+                             example="26-06-2030 21:00")
+
+
+def both_or_neither(first, second):
+    """Payload check that two optional fields are given together"""
+    message = f"Give both {first} and {second} or neither"
+
+    def check(values):
+        if (values[first] is None) != (values[second] is None):
+            return {first: message}
+    return check
+
+
+class Schema:
+    """The fields of a JSON payload, compiled into validate"""
+
+    def __init__(self, name, schema_fields, checks=()):
+        """Compile a schema
+
+        Args:
+            name (String): name of the payload's model in the API docs
+            schema_fields (dict): Field of each payload key
+            checks (tuple): functions of the valid values returning
+                            a dict of errors, or None
+        """
+        self.name = name
+        self.fields = schema_fields
+        self.checks = tuple(checks)
+        self.validate = self.compile()
+
+    def compile(self):
+        """Build the function validating a payload
+
+        It takes the payload and optionally the time to check dates
+        against and returns a dict of values, with None for missing
+        optional fields, and a dict of errors by field.
+        """
+        steps = tuple((name, field.required, field.compile(name))
+                      for name, field in self.fields.items())
+        checks = self.checks
+
+        def validate(payload, now=None):
+            if not isinstance(payload, dict):
+                return {}, {"payload": "Must be a JSON object"}
+            if now is None:
+                now = datetime.now()
+
+            values, errors = {}, {}
+            get = payload.get
+            for name, required, check in steps:
+                value = get(name)
+                if value is None:
+                    if required:
+                        errors[name] = MISSING
+                    values[name] = None
+                    continue
+                try:
+                    values[name] = check(value, now)
+                except ValueError as error:
+                    errors[name] = str(error)
+
+            if not errors:
+                for check in checks:
+                    errors.update(check(values) or {})
+            return values, errors
+
+        return validate
+
+    def parse(self, now=None):
+        """Validate the JSON body of the current request
+
+        Aborts with 400 listing every invalid field.
+
+        Returns:
+            dict: the valid values
+        """
+        values, errors = self.validate(request.get_json(silent=True), now)
+        if errors:
+            abort(400, 'Input payload validation failed', errors=errors)
+        return values
+
+    def model(self, namespace):
+        """Get the flask_restplus model documenting the payload"""
+        return namespace.model(self.name, {
+            name: field.doc() for name, field in self.fields.items()
+        })
@@ -0,0 +1,32 @@
+"""Storage engines the database layer runs on.
+
+The engine is picked with the DB_ENGINE setting. Every engine hands out
+connections with the sqlite3 API the data layer is written against:
+`execute`, `executemany`, `executescript`, `cursor`, `commit`,
+`rollback` and rows that can be read by index or by column name.
+"""
+from .pool import ConnectionPool, PoolTimeout
+
+ENGINES = ('sqlite', 'postgresql')
+
+
+def create_engine(config):
+    """Create the storage engine selected in the app config.
+
+    Args:
+        config (dict): Flask app config
+
+    Returns:
+        the configured SQLiteEngine or PostgresEngine
+    """
+    name = config.get('DB_ENGINE', 'sqlite')
+
+    if name == 'sqlite':
+        from .sqlite import SQLiteEngine
+        return SQLiteEngine(config['DATABASE'], config.get('SQLITE_PRAGMAS'))
+
+    if name in ('postgresql', 'postgres'):
+        from .postgres import PostgresEngine
+        return PostgresEngine.from_config(config)
+
+    raise ValueError(f"Unknown DB_ENGINE '{name}', use one of {ENGINES}")
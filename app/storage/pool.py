@@ -0,0 +1,138 @@
+"""Per-process pool of database connections"""
+import os
+import threading
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available in time"""
+
+
+class ConnectionPool:
+    """A pool of warm database connections for one worker process.
+
+    Connections are handed out for the length of an app context and
+    returned when it is torn down. Up to `size` idle connections are
+    kept around, a request that finds the pool empty opens a new one
+    unless `max_connections` are already checked out.
+    """
+
+    def __init__(self, engine, size=5, health_check=True,
+                 max_connections=None, timeout=30):
+        """Create a connection pool
+
+        Args:
+            engine: Storage engine that opens and checks connections
+            size (Integer): Maximum number of idle connections kept
+            health_check (Boolean): Ping connections before handing them out
+            max_connections (Integer): Cap on connections in use, None for no cap
+            timeout (Integer): Seconds to wait for a connection when capped
+        """
+        self.engine = engine
+        self.size = size
+        self.health_check = health_check
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Forget all idle connections and counters."""
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(self.max_connections) \
+            if self.max_connections else None
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.timeouts = 0
+
+    def _check_fork(self):
+        """Connections must not cross a fork: gunicorn forks its
+        workers from the master so each worker starts its own pool.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def acquire(self):
+        """Get a connection from the pool, opening one if none is idle.
+
+        Returns:
+            a Database connection
+        """
+        self._check_fork()
+        if self._slots and not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                    if conn is None:
+                        self.misses += 1
+                        break
+                if not self.health_check or self.engine.ping(conn):
+                    with self._lock:
+                        self.hits += 1
+                    return conn
+                self._close(conn)
+
+            return self.engine.connect()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool.
+
+        Any transaction left open is rolled back so that the next
+        user starts from a clean connection.
+        """
+        self._check_fork()
+        self._free_slot()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except self.engine.Error:
+            self._close(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        self._close(conn)
+
+    def _free_slot(self):
+        if self._slots:
+            try:
+                self._slots.release()
+            except ValueError:
+                pass
+
+    def _close(self, conn):
+        """Close a connection that is not going back to the pool."""
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except self.engine.Error:
+            pass
+
+    def stats(self):
+        """Pool counters for this worker process."""
+        return {
+            "engine": self.engine.name,
+            "pid": self._pid,
+            "size": self.size,
+            "max_connections": self.max_connections,
+            "idle": len(self._idle),
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+            "timeouts": self.timeouts
+        }
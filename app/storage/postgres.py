@@ -0,0 +1,260 @@
+"""PostgreSQL storage engine.
+
+Connections are wrapped so that the data layer can keep its sqlite3
+style SQL: `?` placeholders, `cursor.lastrowid` and `executescript`.
+"""
+from functools import lru_cache
+from pathlib import Path
+from time import perf_counter
+from uuid import uuid4
+
+
+@lru_cache(maxsize=512)
+def translate(query):
+    """Rewrite a query with `?` placeholders to psycopg2's `%s` style.
+
+    Placeholders inside quoted literals are left alone and literal `%`
+    signs are escaped.
+
+    Args:
+        query (String): sqlite3 style query
+    """
+    out = []
+    quote = None
+    for char in query:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == '?':
+            out.append('%s')
+            continue
+
+        out.append('%%' if char == '%' else char)
+    return ''.join(out)
+
+
+class PostgresCursor:
+    """psycopg2 cursor with the sqlite3 cursor API"""
+
+    def __init__(self, cursor, connection=None):
+        self._cursor = cursor
+        self.connection = connection
+
+    def execute(self, query, params=()):
+        observer = self.connection and self.connection.observer
+        start = observer and perf_counter()
+        try:
+            self._cursor.execute(translate(query), tuple(params))
+        finally:
+            if observer:
+                observer(query, params, perf_counter() - start)
+        return self
+
+    def executemany(self, query, seq_of_params):
+        observer = self.connection and self.connection.observer
+        start = observer and perf_counter()
+        try:
+            self._cursor.executemany(translate(query),
+                                     [tuple(params) for params in seq_of_params])
+        finally:
+            if observer:
+                observer(query, None, perf_counter() - start)
+        return self
+
+    @property
+    def lastrowid(self):
+        """Id generated by the last INSERT of this session"""
+        with self._cursor.connection.cursor() as cursor:
+            cursor.execute("SELECT lastval()")
+            return cursor.fetchone()[0]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class PostgresConnection:
+    """psycopg2 connection with the sqlite3 connection API
+
+    When observer is set it is called with the query, its parameters
+    and the seconds it took after every statement.
+    """
+
+    dialect = 'postgresql'
+    observer = None
+
+    def __init__(self, conn, cursor_factory):
+        self._conn = conn
+        self._cursor_factory = cursor_factory
+
+    def cursor(self):
+        return PostgresCursor(self._conn.cursor(cursor_factory=self._cursor_factory), self)
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        return self.cursor().executemany(query, seq_of_params)
+
+    def stream(self, query, params=(), batch_size=500):
+        """Yield the rows of a query, fetching batch_size at a time.
+
+        A server side cursor is used so the result set stays on
+        the server instead of being loaded at once.
+        """
+        raw = self._conn.cursor(name=f"stream_{uuid4().hex}",
+                                cursor_factory=self._cursor_factory)
+        raw.itersize = batch_size
+        cursor = PostgresCursor(raw, self)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def executescript(self, script):
+        """Run several statements, like sqlite3's executescript.
+
+        Pending work is committed first and the script runs in
+        autocommit mode, so it controls its own transactions.
+        """
+        self._conn.commit()
+        self._conn.autocommit = True
+        try:
+            with self._conn.cursor() as cursor:
+                try:
+                    cursor.execute(script)
+                except Exception:
+                    if self.in_transaction:
+                        cursor.execute("ROLLBACK")
+                    raise
+        finally:
+            self._conn.autocommit = False
+
+    @property
+    def in_transaction(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        return self._conn.get_transaction_status() != TRANSACTION_STATUS_IDLE
+
+    def has_pending_writes(self):
+        """Whether the open transaction has changes not committed yet.
+
+        psycopg2 opens a transaction for reads too, the server only
+        gives it an id once it writes or locks rows.
+        """
+        from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+        if self._conn.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            return False
+        with self._conn.cursor() as cursor:
+            cursor.execute("SELECT txid_current_if_assigned()")
+            return cursor.fetchone()[0] is not None
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class PostgresEngine:
+    """Opens connections to a PostgreSQL server"""
+
+    name = dialect = 'postgresql'
+
+    def __init__(self, dsn, settings=None):
+        """Create the engine
+
+        Args:
+            dsn (String): libpq connection string or URL
+            settings (dict): server settings applied to every connection
+        """
+        try:
+            import psycopg2
+            import psycopg2.extras
+        except ImportError as error:
+            raise RuntimeError("DB_ENGINE 'postgresql' needs psycopg2, "
+                               "install psycopg2-binary") from error
+
+        self._psycopg2 = psycopg2
+        self._cursor_factory = psycopg2.extras.DictCursor
+        self.Error = psycopg2.Error
+        self.IntegrityError = psycopg2.IntegrityError
+        self.OperationalError = psycopg2.OperationalError
+
+        self.dsn = dsn
+        self.server_settings = settings or {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the engine from DATABASE_URL or the DATABASE_* settings"""
+        dsn = config.get('DATABASE_URL')
+        if not dsn:
+            from psycopg2.extensions import make_dsn
+            params = {
+                'dbname': Path(str(config['DATABASE'])).name,
+                'host': config.get('DATABASE_HOST'),
+                'port': config.get('DATABASE_PORT'),
+                'user': config.get('DATABASE_USER'),
+                'password': config.get('DATABASE_PASS')
+            }
+            dsn = make_dsn(**{key: value for key, value in params.items()
+                              if value is not None})
+        return cls(dsn, config.get('POSTGRES_SETTINGS'))
+
+    def connect(self):
+        """Open a new connection"""
+        options = " ".join(f"-c {name}={value}"
+                           for name, value in self.server_settings.items())
+        conn = self._psycopg2.connect(self.dsn, options=options or None)
+        return PostgresConnection(conn, self._cursor_factory)
+
+    def ping(self, conn):
+        """Check that a pooled connection is still usable."""
+        raw = conn._conn
+        if raw.closed:
+            return False
+        try:
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            raw.autocommit = False
+        except self.Error:
+            return False
+        return True
+
+    def settings(self, db):
+        """Get (name, active value, configured value) of the server settings"""
+        report = []
+        for name, value in self.server_settings.items():
+            active = db.execute(f"SHOW {name}").fetchone()[0]
+            report.append((name, active, value))
+        db.rollback()
+        return report
@@ -0,0 +1,144 @@
+"""SQLite storage engine"""
+import sqlite3
+from datetime import datetime
+from time import perf_counter
+
+# TIMESTAMP columns hold "YYYY-MM-DD HH:MM:SS" text which sorts in
+# time order, PARSE_DECLTYPES turns it back into a datetime.
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP",
+                           lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """sqlite3 cursor that reports statements to its connection's observer"""
+
+    def execute(self, query, params=()):
+        observer = self.connection.observer
+        if observer is None:
+            return super().execute(query, params)
+        start = perf_counter()
+        try:
+            return super().execute(query, params)
+        finally:
+            observer(query, params, perf_counter() - start)
+
+    def executemany(self, query, seq_of_params):
+        observer = self.connection.observer
+        if observer is None:
+            return super().executemany(query, seq_of_params)
+        start = perf_counter()
+        try:
+            return super().executemany(query, seq_of_params)
+        finally:
+            observer(query, None, perf_counter() - start)
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """sqlite3 connection that knows its SQL dialect
+
+    When observer is set it is called with the query, its parameters
+    and the seconds it took after every statement.
+    """
+    dialect = 'sqlite'
+    observer = None
+
+    def cursor(self, factory=SQLiteCursor):
+        return super().cursor(factory)
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        return self.cursor().executemany(query, seq_of_params)
+
+    def has_pending_writes(self):
+        """Whether the open transaction has changes not committed yet.
+        sqlite3 only opens one implicitly before a write.
+        """
+        return self.in_transaction
+
+    def stream(self, query, params=(), batch_size=500):
+        """Yield the rows of a query, fetching batch_size at a time"""
+        cursor = self.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+
+def connect(database, pragmas=None):
+    """Open a new configured connection to the database.
+
+    Args:
+        database (String): path to the database file
+        pragmas (dict): PRAGMA name to value, applied in order
+    """
+    conn = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=SQLiteConnection
+        )
+    conn.row_factory = sqlite3.Row
+
+    for name, value in (pragmas or {}).items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def get_pragmas(db, names):
+    """Read the active value of each PRAGMA in names.
+
+    Args:
+        db: Database connection
+        names (iterable): PRAGMA names
+
+    Returns:
+        dict: PRAGMA name to its active value
+    """
+    active = {}
+    for name in names:
+        row = db.execute(f"PRAGMA {name}").fetchone()
+        active[name] = row[0] if row else None
+    return active
+
+
+class SQLiteEngine:
+    """Opens tuned connections to an SQLite database file"""
+
+    name = dialect = 'sqlite'
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+    OperationalError = sqlite3.OperationalError
+
+    def __init__(self, database, pragmas=None):
+        """Create the engine
+
+        Args:
+            database (String): path to the database file
+            pragmas (dict): PRAGMA name to value set on every connection
+        """
+        self.database = database
+        self.pragmas = pragmas or {}
+
+    def connect(self):
+        """Open a new connection"""
+        return connect(self.database, self.pragmas)
+
+    def ping(self, conn):
+        """Check that a pooled connection is still usable."""
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def settings(self, db):
+        """Get (name, active value, configured value) of the tuning profile"""
+        active = get_pragmas(db, self.pragmas)
+        return [(name, active[name], value) for name, value in self.pragmas.items()]
@@ -0,0 +1,36 @@
+"""Access token decoding with a cache of verified tokens.
+
+Clients send the same access token with every request until it
+expires. The claims of a token whose signature and expiry were checked
+are kept in the worker's tokens cache, keyed by the whole encoded
+token, so a token is verified once per worker rather than once per
+request. Entries expire with their token. Blocklist and user loader
+callbacks still run on every request.
+"""
+import time
+
+from flask_jwt_extended import JWTManager
+
+from .cache import get_cache
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager that serves verified tokens from the tokens cache"""
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None,
+                                allow_expired=False):
+        # only plain checks of unexpired tokens are cached
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(
+                encoded_token, csrf_value, allow_expired)
+
+        cache = get_cache('tokens')
+        claims = cache.get(encoded_token)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+
+            ttl = claims['exp'] - time.time() if 'exp' in claims else None
+            if ttl is None or ttl > 0:
+                cache.set(encoded_token, claims, ttl=ttl)
+
+        return dict(claims)
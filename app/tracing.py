@@ -0,0 +1,152 @@
+"""SQL statement tracing for development.
+
+With SQL_TRACE set, every statement run on a connection of get_db is
+logged with its duration and the function that ran it. Within a
+request, a statement shape (the SQL with its literals and IN lists
+collapsed) run SQL_TRACE_REPEAT times is flagged as a likely N+1
+pattern. Statements slower than SQL_SLOW_QUERY_MS are written to the
+slow query log, SQL_SLOW_QUERY_LOG when set, with the plan the
+database made for them. In debug mode each response gets an X-SQL-Trace
+header summarising its statements.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+
+from flask import current_app
+
+from .db import add_query_observer, get_db
+
+# frames of these files are skipped when looking for the caller
+_INTERNAL = tuple(os.path.join(os.path.dirname(__file__), name)
+                  for name in ("db.py", "tracing.py", "metrics.py", "storage"))
+_APP_ROOT = os.path.dirname(os.path.dirname(__file__)) + os.sep
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+slow_logger = logging.getLogger("app.tracing.slow")
+
+
+def query_shape(query):
+    """Get the query with literals, IN lists and whitespace collapsed"""
+    shape = _STRING.sub("?", query)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def calling_function():
+    """Get "module.function" of the nearest caller outside the database layer"""
+    frame = sys._getframe(2)
+    while frame:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_INTERNAL):
+            path = os.path.relpath(filename, _APP_ROOT) if filename.startswith(_APP_ROOT) \
+                else os.path.basename(filename)
+            module = os.path.splitext(path)[0].replace(os.sep, ".")
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryTracer:
+    """Logs the statements of requests, repeated shapes and slow queries"""
+
+    def __init__(self, logger, repeat=3, slow_ms=100.0):
+        """Create a tracer
+
+        Args:
+            logger (Logger): where statements and repeated shapes are logged
+            repeat (Integer): runs of one shape in a request that flag it
+            slow_ms (Float): statements taking longer go to the slow query log
+        """
+        self.logger = logger
+        self.repeat = repeat
+        self.slow_ms = slow_ms
+        self._local = threading.local()
+
+    def start_request(self):
+        """Start tracing the request of this thread"""
+        self._local.request = {"statements": 0, "seconds": 0.0, "shapes": {}, "repeated": set()}
+
+    def observe(self, query, params, seconds):
+        """Trace a statement, called by the connection that ran it"""
+        if getattr(self._local, 'explaining', False):
+            return
+        caller = calling_function()
+        ms = seconds * 1000
+        self.logger.debug("SQL %.3fms %s: %s", ms, caller, _SPACE.sub(" ", query).strip())
+
+        served = getattr(self._local, 'request', None)
+        if served is not None:
+            served["statements"] += 1
+            served["seconds"] += seconds
+            shape = query_shape(query)
+            count = served["shapes"][shape] = served["shapes"].get(shape, 0) + 1
+            if count == self.repeat:
+                served["repeated"].add(shape)
+                self.logger.warning("Possible N+1 query: %s ran %d times in one "
+                                    "request, from %s", shape, count, caller)
+
+        if ms >= self.slow_ms:
+            slow_logger.warning("%.3fms %s: %s params=%r\n%s", ms, caller,
+                                _SPACE.sub(" ", query).strip(), params,
+                                self.explain(query, params))
+
+    def explain(self, query, params):
+        """Get the plan of a statement, its steps one per line"""
+        verb = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+        if params is None or verb not in _EXPLAINABLE:
+            return "(no plan)"
+        db = get_db()
+        prefix = "EXPLAIN QUERY PLAN " if db.dialect == 'sqlite' else "EXPLAIN "
+        # the plan's own statement is not traced
+        self._local.explaining = True
+        try:
+            rows = db.execute(prefix + query, params).fetchall()
+        except Exception as error:
+            return f"(no plan: {error})"
+        finally:
+            self._local.explaining = False
+        return "\n".join(str(row[-1]) for row in rows)
+
+    def finish_request(self, response):
+        """Log the summary of the request, in a header in debug mode"""
+        served = getattr(self._local, 'request', None)
+        if served is None:
+            return response
+        self._local.request = None
+        summary = "{} statements; {:.3f}ms; {} repeated".format(
+            served["statements"], served["seconds"] * 1000, len(served["repeated"]))
+        self.logger.debug("SQL request summary: %s", summary)
+        if current_app.debug:
+            response.headers["X-SQL-Trace"] = summary
+        return response
+
+
+def init_app(app):
+    """Trace the SQL statements of the app when SQL_TRACE is set.
+    This is called by the application factory.
+    """
+    if not app.config['SQL_TRACE']:
+        return
+
+    path = app.config['SQL_SLOW_QUERY_LOG']
+    if path and not any(getattr(handler, 'baseFilename', None) == os.path.abspath(path)
+                        for handler in slow_logger.handlers):
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_logger.addHandler(handler)
+
+    tracer = QueryTracer(app.logger, app.config['SQL_TRACE_REPEAT'],
+                         app.config['SQL_SLOW_QUERY_MS'])
+    app.extensions['sql_tracer'] = tracer
+    app.before_request(tracer.start_request)
+    app.after_request(tracer.finish_request)
+    add_query_observer(app, tracer.observe)
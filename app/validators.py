@@ -4,6 +4,8 @@ They are constructed to work with Flask-Restful.
 """
 from datetime import datetime
 
+DATE_FORMAT = "%d-%m-%Y %H:%M"
+
 def string_validator(value, name):
     """ Validate a string value
 
@@ -23,83 +25,55 @@ def string_validator(value, name):
     return value
 
 
-def email_validator(value):
-    """Validate an email
+def datetime_validator(value, name):
+    """Validate a date and time
 
-    Check that passed string is an actual email. Email should
-    not start with a number and should contain one '@'
+    Make sure that the value is a date in the
+    DATE_FORMAT: dd-mm-YYYY HH:MM
 
     :param value:
-    :return:
-    """
-
-    # check if empty or is a space
-    string_validator(value, 'email')
-
-    # check if '@' in value
-    message = "Invalid email address: Must have '@' "
-    if '@' not in value:
-        raise ValueError(message)
-
-    if value[0].isdigit():
-        message = "Invalid email address: Cannot start with digit"
-        raise ValueError(message)
-    return value
-
-
-def length_validator(value, name, min_length=8):
-    """Validate length of a value
-
-    Passes the value to string validator before
-    checking if value meets required length: min_length
-
-    :param value:
-        Value to check length
+        Value to validate
     :param name:
-        name of value  to check length
-    :param min_length:
-        Minimum length the value should
-    :return:
+        Name of value being validated
+
+    :return datetime:
     """
     string_validator(value, name)
 
-    if len(value) < min_length:
-        message = "{} must contain not less that {} characters".\
-            format(name, min_length)
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        message = "{} must be a date formatted as dd-mm-YYYY HH:MM".format(name)
         raise ValueError(message)
-    return value
-
-def date_validator(value, name):
-    """Validate date 
 
-    Make sure that the date is greater than today
+def number_validator(value, name, minimum, maximum):
+    """Validate a number within a range
 
     :param value:
         Value to validate
     :param name:
         Name of value being validated
-    
-    :return:
+    :param minimum:
+        Smallest allowed value
+    :param maximum:
+        Largest allowed value
+
+    :return float:
     """
-    string_validator(value, name)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("{} must be a number".format(name))
 
-    if datetime.strptime(value, "%d-%m-%Y %H:%M") < datetime.now():
-        message = "{} must be greater than the current time now: {}".\
-            format(name, datetime.now().strftime("%d-%m-%Y %H:%M"))
+    if not minimum <= number <= maximum:
+        message = "{} must be between {} and {}".format(name, minimum, maximum)
         raise ValueError(message)
-    return value
+    return number
 
-def action_validator(value, name):
-    """Validate Action to be either:accepted / rejected
-    
-    Arguments:
-        value {String} -- data to validate
-        name {String} -- field being validated
-    """
+def latitude_validator(value, name):
+    """Validate a latitude in degrees"""
+    return number_validator(value, name, -90, 90)
 
-    string_validator(value, name)
-    
-    if value.lower() in 'accepted' or value.lower() in 'rejected':
-        return value
-    message = "{} must be either 'rejected' or 'accepted'".format(name)
-    raise ValueError(message)
+def longitude_validator(value, name):
+    """Validate a longitude in degrees"""
+    return number_validator(value, name, -180, 180)
@@ -0,0 +1,6 @@
+"""Benchmarks for the Ride-my-way API.
+
+Run a benchmark as a module from the repository root, e.g.
+
+    $ python -m benchmarks.concurrency --help
+"""
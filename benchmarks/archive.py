@@ -0,0 +1,143 @@
+"""Ride archival benchmark.
+
+A fixed set of upcoming rides is kept while the history of rides that
+arrived grows in steps. After each step the queries of GET /rides and
+of ride creation are timed with the history in the live tables, the
+history is moved to the archive tables with archive_rides and the same
+queries are timed again. With the history archived their latency should
+stay flat however long it grows.
+
+    $ python -m benchmarks.archive --history 10000 100000 300000 --queries 100
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app, add_users, percentile
+
+DRIVERS = [f"driver-{n}" for n in range(100)]
+
+
+def add_rides(db, count, depart, rng):
+    """Insert count rides departing from depart on, each with a request
+
+    Returns:
+        Integer: id of the last ride
+    """
+    rows = []
+    for i in range(count):
+        leaves = depart + timedelta(minutes=10 * i)
+        rows.append(("Nairobi", "Voi", leaves, leaves + timedelta(hours=2),
+                     rng.randint(1, 5), "KCH 001", rng.choice(DRIVERS)))
+    db.executemany("""INSERT INTO rides (starting_point, destination,
+        depart_time, eta, seats, vehicle, driver)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+    last = db.execute("SELECT MAX(id) FROM rides").fetchone()[0]
+    db.executemany("INSERT INTO requests (ride_id, user_id, destination, req_status) "
+                   "VALUES (?, 'passenger', 'Voi', 'accepted')",
+                   [(ride_id,) for ride_id in range(last - count + 1, last + 1)])
+    db.commit()
+    return last
+
+
+def unarchive(db):
+    """Move the archived rides back to the live tables"""
+    from app.archive import RIDE_COLUMNS, REQUEST_COLUMNS
+
+    db.execute(f"INSERT INTO rides ({RIDE_COLUMNS}) "
+               f"SELECT {RIDE_COLUMNS} FROM rides_archive")
+    db.execute(f"INSERT INTO requests ({REQUEST_COLUMNS}) "
+               f"SELECT {REQUEST_COLUMNS} FROM requests_archive")
+    db.execute("DELETE FROM requests_archive")
+    db.execute("DELETE FROM rides_archive")
+    db.commit()
+
+
+def live_queries(now):
+    """The queries timed, named after what they serve"""
+    from app.data.ride_data import rides_query
+
+    later = now + timedelta(days=3)
+    return {
+        # min_seats has no index, the page is found by scanning rides
+        "seats filter": rides_query(min_seats=6, limit=50),
+        "destination": rides_query(destination="Voi", departs_after=now, limit=50),
+        # abort_active_ride's overlap check of a driver's rides
+        "overlap": ("""SELECT * FROM rides WHERE driver=? AND depart_time<?
+            AND eta>? ORDER BY depart_time LIMIT 1""",
+                    [DRIVERS[0], later + timedelta(hours=2), later]),
+    }
+
+
+def measure(db, queries, repeat):
+    """p50 seconds of each query"""
+    timings = {}
+    for name, (query, params) in queries.items():
+        runs = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            db.execute(query, params).fetchall()
+            runs.append(time.perf_counter() - t0)
+        timings[name] = percentile(runs, 50)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', type=int, nargs='+',
+                        default=[10000, 100000, 300000],
+                        help='rides that have arrived at each step')
+    parser.add_argument('--live', type=int, default=2000,
+                        help='upcoming rides')
+    parser.add_argument('--queries', type=int, default=100,
+                        help='runs of each query per measurement')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    from app.db import get_db, initialize
+    from app.archive import archive_rides
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    app = make_app()
+
+    with app.app_context():
+        initialize()
+        db = get_db()
+        add_users(db, DRIVERS + ["passenger"])
+        add_rides(db, args.live, now + timedelta(hours=1), rng)
+        queries = live_queries(now)
+
+        names = list(queries)
+        print(f"{'history':>9} " + " ".join(f"{name + ' live':>19} {'archived':>9}"
+                                              for name in names)
+              + f" {'archive rate':>13}")
+
+        total = 0
+        for size in sorted(args.history):
+            # history departs well before the archival cut off
+            depart = now - timedelta(days=30) - timedelta(minutes=10 * size)
+            add_rides(db, size - total, depart, rng)
+            total = size
+            db.execute("ANALYZE")
+            db.commit()
+            before = measure(db, queries, args.queries)
+
+            t0 = time.perf_counter()
+            moved = archive_rides(pause=0)
+            elapsed = time.perf_counter() - t0
+            db.execute("ANALYZE")
+            db.commit()
+            after = measure(db, queries, args.queries)
+
+            print(f"{size:>9} " + " ".join(
+                f"{before[name] * 1000:>17.3f}ms {after[name] * 1000:>7.3f}ms"
+                for name in names) + f" {moved / elapsed:>8.0f} rides/s")
+
+            # the next step starts with all of the history live again
+            unarchive(db)
+
+
+if __name__ == '__main__':
+    main()
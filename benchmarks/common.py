@@ -0,0 +1,75 @@
+"""Helpers shared by the benchmarks"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+
+def make_app(database=None, **config):
+    """Create a 'test' app backed by a throwaway database.
+
+    The configuration classes read their settings from the environment
+    when they are imported, so the environment is prepared first.
+
+    Args:
+        database (String): path of the database file, a temporary file
+                           is used when not given
+        config (Keyword args): extra environment settings, e.g.
+                               SQLITE_JOURNAL_MODE="DELETE"
+
+    Returns:
+        Flask: application using the benchmark database
+    """
+    if database is None:
+        database = os.path.join(tempfile.mkdtemp(prefix="rmw-bench-"),
+                                "bench.db")
+    os.environ['DATABASE_TEST'] = str(database)
+    os.environ.setdefault('DATABASE', str(database))
+    for name, value in config.items():
+        os.environ[name] = str(value)
+
+    from app.core import create_app
+    return create_app("test")
+
+
+def ride_details(depart_in_hours=24, duration_hours=2, **overrides):
+    """Build the details of a ride that departs in the future.
+
+    Args:
+        depart_in_hours (Integer): hours from now until departure
+        duration_hours (Integer): hours from departure until arrival
+    """
+    depart = datetime.now() + timedelta(hours=depart_in_hours)
+    eta = depart + timedelta(hours=duration_hours)
+    details = {
+        "starting_point": "Nairobi-Kencom",
+        "destination": "Taita-wunda",
+        "depart_time": depart.strftime("%d-%m-%Y %H:%M"),
+        "eta": eta.strftime("%d-%m-%Y %H:%M"),
+        "seats": 4,
+        "vehicle": "KCH 001"
+    }
+    details.update(overrides)
+    return details
+
+
+def add_users(db, user_ids):
+    """Insert users with the given ids.
+
+    Users are inserted directly because hashing their passwords is
+    slow. PostgreSQL needs them for the foreign keys of rides and
+    requests.
+    """
+    db.executemany("INSERT INTO users (id, name, email, password) "
+                   "VALUES (?, ?, ?, '-')",
+                   [(user, user, f"{user}@bench.dev") for user in user_ids])
+    db.commit()
+
+
+def percentile(values, pct):
+    """Get the pct percentile of values (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1,
+                      int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
@@ -0,0 +1,138 @@
+"""Concurrent write benchmark for the SQLite storage profile.
+
+Several processes, like gunicorn workers, create rides and make join
+requests on one database file at the same time. Each write first takes
+the database write lock with BEGIN IMMEDIATE, the time spent waiting
+for that lock is reported as lock-wait time.
+
+    $ python -m benchmarks.concurrency --workers 4 --ops 500
+    $ python -m benchmarks.concurrency --journal-mode DELETE
+"""
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.common import make_app, ride_details, percentile
+
+
+def worker(database, worker_id, ops, start, results):
+    """Run ops ride creations and join requests, report timings."""
+    from app.db import get_db
+    from app.data.ride_data import create_ride, join_ride, get_ride
+
+    app = make_app(database)
+    timings = {"create_ride": [], "join_ride": [], "get_ride": []}
+    lock_wait = 0.0
+    errors = 0
+    ride_id = None
+
+    start.wait()
+    began = time.perf_counter()
+    for i in range(ops):
+        with app.app_context():
+            db = get_db()
+            try:
+                t0 = time.perf_counter()
+                db.execute("BEGIN IMMEDIATE")
+                t1 = time.perf_counter()
+                lock_wait += t1 - t0
+
+                if ride_id is None or i % 2 == 0:
+                    ride_id = create_ride(f"driver-{worker_id}",
+                                          **ride_details(depart_in_hours=i + 1))
+                    timings["create_ride"].append(time.perf_counter() - t0)
+                else:
+                    join_ride(ride_id, f"passenger-{worker_id}-{i}", "Voi")
+                    timings["join_ride"].append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                get_ride(ride_id)
+                timings["get_ride"].append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - began
+
+    results.put({
+        "elapsed": elapsed,
+        "lock_wait": lock_wait,
+        "errors": errors,
+        "timings": timings
+    })
+
+
+def run(app, workers, ops):
+    """Run the benchmark and return the aggregated results."""
+    from app.db import initialize, get_db
+    from app.storage.sqlite import get_pragmas
+
+    database = app.config['DATABASE']
+    with app.app_context():
+        initialize()
+        active = get_pragmas(get_db(), app.config['SQLITE_PRAGMAS'])
+
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker,
+                                     args=(database, n, ops, start, results))
+             for n in range(workers)]
+    for proc in procs:
+        proc.start()
+    start.set()
+
+    reports = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    timings = {}
+    for report in reports:
+        for name, values in report["timings"].items():
+            timings.setdefault(name, []).extend(values)
+
+    wall = max(report["elapsed"] for report in reports)
+    writes = len(timings["create_ride"]) + len(timings["join_ride"])
+    return {
+        "pragmas": active,
+        "workers": workers,
+        "writes": writes,
+        "errors": sum(report["errors"] for report in reports),
+        "throughput": writes / wall if wall else 0.0,
+        "lock_wait_total": sum(report["lock_wait"] for report in reports),
+        "lock_wait_mean": (sum(report["lock_wait"] for report in reports)
+                           / writes if writes else 0.0),
+        "latency": {
+            name: {"p50": percentile(values, 50), "p99": percentile(values, 99)}
+            for name, values in timings.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200,
+                        help="operations per worker")
+    parser.add_argument("--journal-mode", default=None,
+                        help="override SQLITE_JOURNAL_MODE, e.g. DELETE")
+    args = parser.parse_args()
+
+    settings = {}
+    if args.journal_mode:
+        settings['SQLITE_JOURNAL_MODE'] = args.journal_mode
+    # the environment is set up before any worker imports the config
+    app = make_app(**settings)
+
+    result = run(app, args.workers, args.ops)
+
+    print("pragmas:", ", ".join(f"{k}={v}" for k, v in result["pragmas"].items()))
+    print(f"workers: {result['workers']}  writes: {result['writes']}  "
+          f"errors: {result['errors']}")
+    print(f"throughput: {result['throughput']:.1f} writes/s")
+    print(f"lock wait: {result['lock_wait_total'] * 1000:.1f} ms total, "
+          f"{result['lock_wait_mean'] * 1000:.3f} ms per write")
+    for name, lat in result["latency"].items():
+        print(f"{name:<13} p50 {lat['p50'] * 1000:.3f} ms  "
+              f"p99 {lat['p99'] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
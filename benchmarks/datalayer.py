@@ -0,0 +1,398 @@
+"""Data layer microbenchmarks.
+
+Times each function of app.data.ride_data and app.data.user_data and
+each save() of app.models against a generated database that grows to
+each of --sizes rides, a quarter of them with a request. Every function
+is called --number times with arguments prepared beforehand, the best
+of --repeat runs is reported in calls per second. The memory each call
+allocates at its peak is then measured with tracemalloc over
+--alloc-calls more calls, apart from the timed runs it would slow down.
+
+The ride caches are off, so the queries behind get_ride and get_rides
+are what is timed. Functions that hash a password are called a tenth
+as often; set PASSWORD_HASH_ROUNDS to change their cost.
+
+--output saves the results as JSON. --compare BASELINE prints the
+change from an earlier run at the sizes both have and exits with
+status 1 when a function's calls per second fell, or its peak memory
+grew, by more than --threshold percent.
+
+    $ python -m benchmarks.datalayer --sizes 1000 100000 1000000 --output base.json
+    $ python -m benchmarks.datalayer --sizes 1000 100000 --compare base.json --threshold 15
+    $ python -m benchmarks.datalayer --sizes 1000 --only get_ride --only save
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import count
+from uuid import uuid4
+
+from benchmarks.common import make_app, add_users
+
+DRIVERS = [f"driver-{n}" for n in range(1000)]
+PASSENGERS = [f"passenger-{n}" for n in range(1000)]
+# users that make the requests of the benchmarks, none made by the seed
+BENCH_PASSENGERS = [f"bench-passenger-{n}" for n in range(200)]
+BENCH_DRIVER = "bench-driver"
+PASSWORD = "bench-password"
+
+TOWNS = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Voi",
+         "Malindi", "Naivasha", "Nyeri", "Machakos", "Kitale"]
+
+
+def add_rides(db, count, rng, now):
+    """Insert count rides departing within 30 days of now, every
+    fourth with a pending or accepted request
+    """
+    from app.models import Ride
+    from app.geo import encode
+
+    def ride():
+        depart = now + timedelta(minutes=rng.randint(-30 * 24 * 60, 30 * 24 * 60))
+        lat, lon = rng.uniform(-1.5, -1.0), rng.uniform(36.6, 37.1)
+        start, destination = rng.sample(TOWNS, 2)
+        return (start, destination, depart, depart + timedelta(hours=rng.randint(1, 9)),
+                rng.randint(1, 5), "KCH 001", rng.choice(DRIVERS), lat, lon, encode(lat, lon))
+
+    # in chunks, a million rows at once would take gigabytes
+    for n in range(0, count, 50000):
+        db.executemany(Ride.INSERT, [ride() for _ in range(min(50000, count - n))])
+
+    last = db.execute("SELECT MAX(id) FROM rides").fetchone()[0]
+    db.executemany("INSERT INTO requests (ride_id, user_id, destination, req_status) "
+                   "VALUES (?, ?, ?, ?)",
+                   [(ride_id, rng.choice(PASSENGERS), rng.choice(TOWNS),
+                     rng.choice(("pending", "accepted")))
+                    for ride_id in range(last - count + 1, last + 1, 4)])
+    db.execute("ANALYZE")
+    db.commit()
+
+
+class Fixture:
+    """The generated data the benchmarks pick their arguments from"""
+
+    def __init__(self, db, rng, now):
+        self.db = db
+        self.rng = rng
+        self.now = now
+        self.requested = []
+        self._pairs = self._unrequested()
+        self._slots = count(1)
+        self._users = count()
+        self.refresh()
+
+    def refresh(self):
+        """Read the ids the database has now"""
+        self.max_ride = self.db.execute("SELECT MAX(id) FROM rides").fetchone()[0]
+        # requests of the benchmarks' passengers are retracted, the seeded stay
+        self.request_ids = [row[0] for row in self.db.execute(
+            "SELECT id FROM requests WHERE user_id LIKE 'passenger-%'").fetchall()]
+
+    def ride_id(self):
+        return self.rng.randint(1, self.max_ride)
+
+    def request_id(self):
+        return self.rng.choice(self.request_ids)
+
+    def _unrequested(self):
+        for passenger in BENCH_PASSENGERS:
+            for ride_id in range(1, self.max_ride + 1):
+                yield ride_id, passenger
+
+    def pair(self):
+        """A ride and a passenger that has not asked to join it"""
+        return next(self._pairs)
+
+    def slot(self, duration_hours=2):
+        """Depart time and eta of a ride of BENCH_DRIVER no other overlaps"""
+        depart = self.now + timedelta(days=400, hours=3 * next(self._slots))
+        return depart, depart + timedelta(hours=duration_hours)
+
+    def ride_details(self):
+        depart, eta = self.slot()
+        start, destination = self.rng.sample(TOWNS, 2)
+        return {"starting_point": start, "destination": destination,
+                "depart_time": depart, "eta": eta, "seats": self.rng.randint(1, 5),
+                "vehicle": "KCH 001", "start_lat": self.rng.uniform(-1.5, -1.0),
+                "start_lon": self.rng.uniform(36.6, 37.1)}
+
+    def email(self):
+        return f"bench.{next(self._users)}@bench.dev"
+
+
+def consume_rides(**filters):
+    """Read every ride iter_rides yields"""
+    from app.data.ride_data import iter_rides
+
+    for _ in iter_rides(batch_size=100, **filters):
+        pass
+
+
+def benchmarks():
+    """Get the benchmarks by name
+
+    Each is a tuple of the function, a function preparing the
+    arguments of n calls as (args, kwargs) tuples and the fraction of
+    --number calls it gets.
+    """
+    from app.data import ride_data, user_data
+    from app.hashing import hash_password
+    from app.models import User, Ride, RideRequest
+    from werkzeug.security import generate_password_hash
+
+    password_hash = hash_password(PASSWORD)
+
+    def same(*args, **kwargs):
+        return lambda fx, n: [(args, kwargs)] * n
+
+    def each(make):
+        return lambda fx, n: [make(fx) for _ in range(n)]
+
+    def ride_rows(fx, n):
+        query = "SELECT * FROM rides WHERE id=?"
+        return [((fx.db.execute(query, (fx.ride_id(),)).fetchone(),), {}) for _ in range(n)]
+
+    def joins(fx, n):
+        pairs = [fx.pair() for _ in range(n)]
+        fx.requested += pairs
+        return [((ride_id, passenger, "Voi"), {}) for ride_id, passenger in pairs]
+
+    def retractions(fx, n):
+        missing = n - len(fx.requested)
+        if missing > 0:
+            pairs = [fx.pair() for _ in range(missing)]
+            fx.db.executemany("INSERT INTO requests (ride_id, user_id, destination, "
+                              "req_status) VALUES (?, ?, 'Voi', 'accepted')", pairs)
+            fx.db.commit()
+            fx.requested += pairs
+        taken, fx.requested = fx.requested[:n], fx.requested[n:]
+        return [(pair, {}) for pair in taken]
+
+    def status_changes(fx, n):
+        ride_id, passenger = fx.pair()
+        fx.db.execute("UPDATE rides SET seats=4 WHERE id=?", (ride_id,))
+        req_id = RideRequest(ride_id, passenger, "Voi").save()
+        # accepting and rejecting in turn never repeats a status
+        return [((("accepted", "rejected")[i % 2], req_id), {}) for i in range(n)]
+
+    def old_hashes(fx, n):
+        old = generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+        emails = [fx.email() for _ in range(n)]
+        fx.db.executemany("INSERT INTO users (id, name, email, password) "
+                          "VALUES (?, 'Bench User', ?, ?)",
+                          [(email, email, old) for email in emails])
+        fx.db.commit()
+        return [((email, old, PASSWORD), {}) for email in emails]
+
+    def users(fx, n):
+        made = []
+        for _ in range(n):
+            # User() hashes the password, which is not what save() costs
+            user = User.__new__(User)
+            user.id, user.name, user.email = uuid4().hex, "Bench User", fx.email()
+            user.password = password_hash
+            made.append(((user,), {}))
+        return made
+
+    def ride_requests(fx, n):
+        pairs = [fx.pair() for _ in range(n)]
+        fx.requested += pairs
+        return [((RideRequest(ride_id, passenger, "Voi"),), {})
+                for ride_id, passenger in pairs]
+
+    return {
+        "ride_data.create_ride": (ride_data.create_ride, each(
+            lambda fx: ((BENCH_DRIVER,), fx.ride_details())), 1),
+        "ride_data.create_rides": (ride_data.create_rides, each(
+            lambda fx: ((BENCH_DRIVER, [fx.ride_details() for _ in range(10)]), {})), 1),
+        "ride_data.ride_to_dict": (ride_data.ride_to_dict, ride_rows, 1),
+        "ride_data.rides_query": (ride_data.rides_query, each(lambda fx: ((), {
+            "after": fx.ride_id(), "destination": fx.rng.choice(TOWNS),
+            "departs_after": fx.now, "min_seats": 2, "limit": 20})), 1),
+        "ride_data.get_rides": (ride_data.get_rides, each(lambda fx: fx.rng.choice([
+            ((), {"after": fx.ride_id(), "limit": 20}),
+            ((), {"destination": fx.rng.choice(TOWNS), "departs_after": fx.now,
+                  "limit": 20}),
+            ((), {"starting_point": fx.rng.choice(TOWNS), "min_seats": 3, "limit": 20})
+        ])), 1),
+        "ride_data.iter_rides": (consume_rides, each(
+            lambda fx: ((), {"after": fx.ride_id(), "limit": 500})), 1),
+        "ride_data.search_terms": (ride_data.search_terms, same("Nairobi to Mombasa-Voi"), 1),
+        "ride_data.search_rides": (ride_data.search_rides, each(lambda fx: ((
+            " ".join(town[:4] for town in fx.rng.sample(TOWNS, 2)),), {})), 1),
+        "ride_data.nearby_rides": (ride_data.nearby_rides, each(lambda fx: ((
+            fx.rng.uniform(-1.5, -1.0), fx.rng.uniform(36.6, 37.1), 2),
+            {"departs_after": fx.now})), 1),
+        "ride_data.get_ride": (ride_data.get_ride, each(
+            lambda fx: ((fx.ride_id(),), {})), 1),
+        "ride_data.get_ride_version": (ride_data.get_ride_version, each(
+            lambda fx: ((fx.ride_id(),), {})), 1),
+        "ride_data.get_rides_version": (ride_data.get_rides_version, same(), 1),
+        "ride_data.update_ride": (ride_data.update_ride, each(
+            lambda fx: ((fx.ride_id(),), fx.ride_details())), 1),
+        "ride_data.join_ride": (ride_data.join_ride, joins, 1),
+        "ride_data.retract_request": (ride_data.retract_request, retractions, 1),
+        "ride_data.get_ride_requests": (ride_data.get_ride_requests, each(
+            lambda fx: ((fx.ride_id(),), {})), 1),
+        "ride_data.get_request": (ride_data.get_request, each(
+            lambda fx: ((fx.request_id(),), {})), 1),
+        "ride_data.update_request_status": (ride_data.update_request_status,
+                                            status_changes, 1),
+        "ride_data.abort_ride_not_found": (ride_data.abort_ride_not_found, each(
+            lambda fx: ((fx.ride_id(),), {})), 1),
+        "ride_data.abort_request_not_found": (ride_data.abort_request_not_found, each(
+            lambda fx: ((fx.request_id(),), {})), 1),
+        "ride_data.abort_active_ride": (ride_data.abort_active_ride, each(
+            lambda fx: (fx.slot() + (fx.rng.choice(DRIVERS),), {})), 1),
+        "user_data.create_user": (user_data.create_user, each(
+            lambda fx: (("Bench User", fx.email(), PASSWORD), {})), 0.1),
+        "user_data.get_user_by_email": (user_data.get_user_by_email, each(
+            lambda fx: ((f"{fx.rng.choice(PASSENGERS)}@bench.dev",), {})), 1),
+        "user_data.verify_password": (user_data.verify_password,
+                                      same(password_hash, PASSWORD), 0.1),
+        "user_data.upgrade_password_hash": (user_data.upgrade_password_hash,
+                                            old_hashes, 0.1),
+        "user_data.abort_if_user_found": (user_data.abort_if_user_found, each(
+            lambda fx: ((fx.email(),), {})), 1),
+        "models.User.save": (User.save, users, 1),
+        "models.Ride.save": (Ride.save, each(
+            lambda fx: ((Ride(BENCH_DRIVER, **fx.ride_details()),), {})), 1),
+        "models.Ride.save_many": (Ride.save_many, each(lambda fx: (([
+            Ride(BENCH_DRIVER, **fx.ride_details()) for _ in range(10)],), {})), 1),
+        "models.RideRequest.save": (RideRequest.save, ride_requests, 1),
+    }
+
+
+def time_calls(func, calls):
+    """Calls per second of func over the prepared calls"""
+    gc.collect()
+    t0 = time.perf_counter()
+    for args, kwargs in calls:
+        func(*args, **kwargs)
+    return len(calls) / (time.perf_counter() - t0)
+
+
+def peak_kib(func, calls):
+    """Mean KiB allocated at the peak of each call"""
+    tracemalloc.start()
+    try:
+        total = 0
+        for args, kwargs in calls:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func(*args, **kwargs)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(calls) / 1024
+
+
+def compare(results, baseline, threshold):
+    """Print the change of each function from the baseline results
+
+    Returns:
+        list: (size, function) of those that got slower, or allocate
+              more, by more than threshold percent
+    """
+    def change(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressions = []
+    for size, functions in results.items():
+        old_functions = baseline["sizes"].get(size)
+        if not old_functions:
+            continue
+        print(f"\n{size} rides vs baseline {'calls/s':>10} {'peak':>9}")
+        for name, result in functions.items():
+            old = old_functions.get(name)
+            if not old:
+                continue
+            speed = change(result["calls_per_sec"], old["calls_per_sec"])
+            memory = change(result["peak_kib"], old["peak_kib"])
+            # a change of less than a KiB is noise however large in percent
+            grew = memory > threshold and result["peak_kib"] - old["peak_kib"] >= 1
+            worse = speed < -threshold or grew
+            if worse:
+                regressions.append((size, name))
+            print(f"{name:<45} {speed:+9.1f}% {memory:+8.1f}%"
+                  f"{'  REGRESSED' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='rides in the database at each step')
+    parser.add_argument('--number', type=int, default=200,
+                        help='calls of each function per run')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each function, the best is kept')
+    parser.add_argument('--alloc-calls', type=int, default=20,
+                        help='calls of each function traced for allocations')
+    parser.add_argument('--only', action='append',
+                        help='run the functions whose name contains this')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='file the results are saved to as JSON')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='percent change that fails --compare')
+    args = parser.parse_args()
+
+    from app.db import initialize, get_db
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    app = make_app(RIDE_CACHE_SIZE=0, RIDES_CACHE_SIZE=0)
+
+    results = {}
+    with app.app_context():
+        initialize()
+        db = get_db()
+        add_users(db, DRIVERS + PASSENGERS + BENCH_PASSENGERS + [BENCH_DRIVER])
+
+        selected = {name: bench for name, bench in benchmarks().items()
+                    if not args.only or any(part in name for part in args.only)}
+        fx = None
+        seeded = 0
+        for size in sorted(args.sizes):
+            t0 = time.perf_counter()
+            add_rides(db, size - seeded, rng, now)
+            seeded = size
+            fx = fx or Fixture(db, rng, now)
+            fx.refresh()
+            print(f"\n{size} rides (generated in {time.perf_counter() - t0:.1f}s)")
+            print(f"{'function':<45} {'calls/s':>10} {'us/call':>10} {'peak KiB':>9}")
+
+            results[str(size)] = functions = {}
+            for name, (func, prepare, share) in selected.items():
+                number = max(1, int(args.number * share))
+                speed = max(time_calls(func, prepare(fx, number))
+                            for _ in range(args.repeat))
+                memory = peak_kib(func, prepare(fx, max(1, int(args.alloc_calls * share))))
+                functions[name] = {"calls_per_sec": speed, "peak_kib": memory}
+                print(f"{name:<45} {speed:>10.1f} {1e6 / speed:>10.1f} {memory:>9.1f}")
+
+    report = {"number": args.number, "repeat": args.repeat,
+              "engine": app.config['DB_ENGINE'], "sizes": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nregressed by more than {args.threshold}%: " + ", ".join(
+                f"{name} at {size} rides" for size, name in regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
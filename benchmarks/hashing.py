@@ -0,0 +1,131 @@
+"""Sign up and login throughput under concurrent load.
+
+Client threads sign up and then log in users through the app while
+the worker's password hasher bounds how many passwords are hashed at
+once. Requests turned away with 503 are counted separately.
+
+The in-process target calls the app from the client threads, the
+gunicorn target sends them over HTTP to gunicorn's gthread workers as
+started by the Procfile.
+
+    $ python -m benchmarks.hashing --clients 16 --users 200 --hash-workers 4
+    $ python -m benchmarks.hashing --target gunicorn --workers 4 --clients 64
+
+The gunicorn target needs gunicorn installed.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import threading
+import time
+
+from benchmarks.common import make_app, percentile
+from benchmarks.servers import SERVERS, THREADS, wait_for_port
+
+
+def app_poster(app):
+    """Post JSON bodies to app in-process, returns the status"""
+    client = app.test_client()
+
+    def post(url, body):
+        return client.post(url, data=json.dumps(body),
+                           content_type='application/json').status_code
+    return post
+
+
+def http_poster(port):
+    """Post JSON bodies to the server listening on port, returns the status"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def post(url, body):
+        connection.request('POST', url, json.dumps(body),
+                           {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    return post
+
+
+def run_client(post, emails, timings, statuses):
+    for email in emails:
+        user = {"name": "Bench User", "email": email, "password": "12345dfgh"}
+        for url, body in (('/api/v1/auth/signup', user),
+                          ('/api/v1/auth/login', {"email": email,
+                                                  "password": "12345dfgh"})):
+            t0 = time.perf_counter()
+            status = post(url, body)
+            timings[url.rsplit('/', 1)[1]].append(time.perf_counter() - t0)
+            statuses.append(status)
+        post('/api/v1/auth/logout', {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=("inprocess", "gunicorn"), default="inprocess",
+                        help='serve the app in-process or with gunicorn')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='gunicorn worker processes')
+    parser.add_argument('--port', type=int, default=8078)
+    parser.add_argument('--clients', type=int, default=16,
+                        help='concurrent client threads')
+    parser.add_argument('--users', type=int, default=200,
+                        help='users signed up and logged in')
+    parser.add_argument('--hash-workers', type=int, default=4,
+                        help='HASH_WORKERS of the app')
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help='HASH_QUEUE_SIZE of the app')
+    parser.add_argument('--queue-timeout', type=float, default=5,
+                        help='HASH_QUEUE_TIMEOUT of the app')
+    parser.add_argument('--rounds', type=int, default=150000,
+                        help='PASSWORD_HASH_ROUNDS of the app')
+    args = parser.parse_args()
+
+    from app.db import initialize
+
+    app = make_app(ENV_CONFIG="test", HASH_WORKERS=args.hash_workers,
+                   HASH_QUEUE_SIZE=args.queue_size, HASH_QUEUE_TIMEOUT=args.queue_timeout,
+                   PASSWORD_HASH_ROUNDS=args.rounds)
+    with app.app_context():
+        initialize()
+
+    server = None
+    if args.target == "gunicorn":
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        server = subprocess.Popen(SERVERS["flask"](args.port, args.workers), cwd=root,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for_port(args.port)
+
+    timings = {'signup': [], 'login': []}
+    statuses = []
+    clients = [threading.Thread(target=run_client, args=(
+        http_poster(args.port) if server else app_poster(app),
+        [f"user{n}@bench.dev" for n in range(c, args.users, args.clients)],
+        timings, statuses)) for c in range(args.clients)]
+
+    t0 = time.perf_counter()
+    try:
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    elapsed = time.perf_counter() - t0
+
+    if server:
+        print(f"gunicorn, {args.workers} workers of {THREADS} threads")
+    print(f"{args.clients} clients, {args.hash_workers} hash workers, "
+          f"queue {args.queue_size} ({args.queue_timeout}s), {args.rounds} rounds")
+    for name, values in timings.items():
+        print(f"{name:<7} p50 {percentile(values, 50) * 1000:.1f} ms  "
+              f"p99 {percentile(values, 99) * 1000:.1f} ms")
+    print(f"{len(statuses) / elapsed:.1f} requests/s, "
+          f"{statuses.count(503)} turned away with 503")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Join request latency benchmark.
+
+Times POST /rides/<id>/requests' data access: the old path, which reads
+the ride, checks for an earlier request and then inserts, against
+join_ride's single guarded INSERT. The ride cache is turned off so
+both paths go to the database.
+
+    $ python -m benchmarks.join --requests 2000
+"""
+import argparse
+import time
+
+from benchmarks.common import make_app, ride_details, add_users, percentile
+
+
+def three_steps(ride_id, passenger):
+    from app.db import get_db
+    from app.models import RideRequest
+    from app.data.ride_data import get_ride
+
+    ride = get_ride(ride_id)
+    if ride and ride['driver'] != passenger:
+        query = "SELECT * FROM requests WHERE ride_id=? AND user_id=?"
+        if not get_db().execute(query, (ride_id, passenger)).fetchone():
+            RideRequest(ride_id, passenger, "Voi").save()
+
+
+def one_statement(ride_id, passenger):
+    from app.data.ride_data import join_ride
+
+    join_ride(ride_id, passenger, "Voi")
+
+
+def measure(app, func, ride_id, passengers):
+    timings = []
+    for passenger in passengers:
+        t0 = time.perf_counter()
+        with app.app_context():
+            func(ride_id, passenger)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='join requests made by each path')
+    args = parser.parse_args()
+
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_ride
+
+    paths = (("three steps", three_steps), ("one statement", one_statement))
+    passengers = {name: [f"{name.replace(' ', '-')}-{n}" for n in range(args.requests)]
+                  for name, _ in paths}
+
+    app = make_app(RIDE_CACHE_SIZE=0)
+    with app.app_context():
+        initialize()
+        add_users(get_db(), ["driver"] + sum(passengers.values(), []))
+        rides = [create_ride("driver", **ride_details(depart_in_hours=hours))
+                 for hours in (24, 48)]
+
+    for (name, func), ride_id in zip(paths, rides):
+        timings = measure(app, func, ride_id, passengers[name])
+        print(f"{name:<14} mean {sum(timings) / len(timings) * 1000:.3f} ms  "
+              f"p50 {percentile(timings, 50) * 1000:.3f} ms  "
+              f"p99 {percentile(timings, 99) * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+"""End-to-end load test with a mix of what riders and drivers do.
+
+Seeds --drivers drivers with --rides-per-driver rides each and
+--passengers passengers, all able to log in, then --clients simulated
+users send requests for --duration seconds, each picked from the
+weighted --mix of:
+
+    signup          POST   /auth/signup
+    login           POST   /auth/login
+    create_ride     POST   /users/rides
+    list_rides      GET    /rides?limit=20
+    join            POST   /rides/<rideId>/requests
+    retract         DELETE /users/rides/<rideId>/requests
+    view_requests   GET    /users/rides/<rideId>/requests
+
+Rides are joined and retracted as they are created, so every request
+is one that should succeed; a response with another status counts as
+an error. The app is served in-process through the test client, one
+thread per client, or by gunicorn started with --workers workers.
+
+Throughput, p50/p95/p99 latency and the error rate of each operation
+are printed and, with --output, saved as JSON. --compare BASELINE
+prints the change from an earlier run and exits with status 1 when the
+throughput of an operation fell or its p95 rose by more than
+--threshold percent.
+
+    $ python -m benchmarks.loadtest --target inprocess --duration 10
+    $ python -m benchmarks.loadtest --target gunicorn --workers 4 --clients 32 --output base.json
+    $ python -m benchmarks.loadtest --target gunicorn --workers 4 --clients 32 --compare base.json
+
+Login checks a real password hash; set PASSWORD_HASH_ROUNDS to change
+its cost. The gunicorn target needs gunicorn installed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from itertools import count
+
+from benchmarks.common import make_app, ride_details, percentile
+from benchmarks.servers import SERVERS, fetch, wait_for_port
+
+PASSWORD = "load-test-password"
+
+DEFAULT_MIX = {
+    "list_rides": 40,
+    "login": 10,
+    "join": 15,
+    "retract": 5,
+    "view_requests": 15,
+    "create_ride": 10,
+    "signup": 5
+}
+
+
+def parse_mix(text):
+    """Parse "name=weight,..." into a dict of weights"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                f"unknown operation {name!r}, one of {', '.join(DEFAULT_MIX)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight of {name}: {weight!r}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("no operation has a weight")
+    return mix
+
+
+class Call:
+    """A request of an operation and the status it should get"""
+
+    __slots__ = ("operation", "method", "path", "body", "token", "expected", "key")
+
+    def __init__(self, operation, method, path, body=None, token=None, expected=200,
+                 key=None):
+        self.operation = operation
+        self.method = method
+        self.path = path
+        self.body = body
+        self.token = token
+        self.expected = expected
+        self.key = key
+
+
+class Workload:
+    """Picks the requests of the simulated users and keeps track of the
+    rides and ride requests they made, so later requests use them.
+    """
+
+    def __init__(self, mix, drivers, passengers, rides, tokens, hours):
+        """Create the workload
+
+        Args:
+            mix (dict): weight of each operation
+            drivers (list): ids of the drivers
+            passengers (list): ids of the passengers
+            rides (list): (ride id, driver) of the seeded rides
+            tokens (dict): access token of each user
+            hours (Integer): hours from now after which rides are free
+                             for drivers to create
+        """
+        self.operations = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.operations]
+        self.drivers = drivers
+        self.passengers = passengers
+        self.users = drivers + passengers
+        self.rides = list(rides)
+        self.tokens = tokens
+        self.joined = []
+        self.pending = set()
+        self._slots = {driver: count(hours // 3 + 1) for driver in drivers}
+        self._signups = count()
+        self._run = f"{os.getpid()}-{int(time.time())}"
+        self._lock = threading.Lock()
+
+    def next_call(self, rng):
+        """Get the next request of a simulated user"""
+        operation = rng.choices(self.operations, self.weights)[0]
+        return getattr(self, operation)(rng)
+
+    def signup(self, rng):
+        n = next(self._signups)
+        return Call("signup", "POST", "/api/v1/auth/signup", {
+            "name": f"Load User {n}",
+            "email": f"load.{self._run}.{n}@loadtest.dev",
+            "password": PASSWORD
+        }, expected=201)
+
+    def login(self, rng):
+        user = rng.choice(self.users)
+        return Call("login", "POST", "/api/v1/auth/login",
+                    {"email": f"{user}@loadtest.dev", "password": PASSWORD})
+
+    def create_ride(self, rng):
+        driver = rng.choice(self.drivers)
+        with self._lock:
+            # rides of a driver three hours apart never overlap
+            slot = next(self._slots[driver])
+        return Call("create_ride", "POST", "/api/v1/users/rides",
+                    ride_details(depart_in_hours=3 * slot),
+                    self.tokens[driver], expected=201, key=driver)
+
+    def list_rides(self, rng):
+        return Call("list_rides", "GET", "/api/v1/rides?limit=20",
+                    token=self.tokens[rng.choice(self.users)])
+
+    def join(self, rng):
+        with self._lock:
+            for _ in range(5):
+                ride_id, driver = rng.choice(self.rides)
+                passenger = rng.choice(self.passengers)
+                if (passenger, ride_id) not in self.pending:
+                    break
+            else:
+                return self.list_rides(rng)
+            self.pending.add((passenger, ride_id))
+        return Call("join", "POST", f"/api/v1/rides/{ride_id}/requests",
+                    {"destination": "Taita-wunda"}, self.tokens[passenger],
+                    expected=201, key=(passenger, ride_id))
+
+    def retract(self, rng):
+        with self._lock:
+            picked = None
+            if self.joined:
+                # swap the pick with the last one to pop it in constant time
+                n = rng.randrange(len(self.joined))
+                self.joined[n], self.joined[-1] = self.joined[-1], self.joined[n]
+                picked = self.joined.pop()
+        if picked is None:
+            return self.join(rng)
+        passenger, ride_id = picked
+        return Call("retract", "DELETE", f"/api/v1/users/rides/{ride_id}/requests",
+                    token=self.tokens[passenger], key=(passenger, ride_id))
+
+    def view_requests(self, rng):
+        ride_id, driver = rng.choice(self.rides)
+        return Call("view_requests", "GET", f"/api/v1/users/rides/{ride_id}/requests",
+                    token=self.tokens[driver])
+
+    def finish(self, call, status, body):
+        """Keep what a request made for later ones"""
+        with self._lock:
+            if call.operation == "create_ride" and status == 201:
+                ride_id = json.loads(body)["view_ride"].rsplit("/", 1)[1]
+                self.rides.append((int(ride_id), call.key))
+            elif call.operation == "join":
+                if status == 201:
+                    self.joined.append(call.key)
+                else:
+                    self.pending.discard(call.key)
+            elif call.operation == "retract" and status == 200:
+                self.pending.discard(call.key)
+
+
+class Results:
+    """Latency and statuses of the requests of each operation"""
+
+    def __init__(self):
+        self.timings = {}
+        self.statuses = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, call, status, seconds):
+        with self._lock:
+            self.timings.setdefault(call.operation, []).append(seconds)
+            statuses = self.statuses.setdefault(call.operation, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            self.errors[call.operation] = (self.errors.get(call.operation, 0)
+                                           + (status != call.expected))
+
+    def summary(self, duration):
+        """Get throughput, latency and errors of each operation and in total"""
+        def summarise(timings, errors):
+            return {
+                "requests": len(timings),
+                "throughput": len(timings) / duration,
+                "p50_ms": percentile(timings, 50) * 1000,
+                "p95_ms": percentile(timings, 95) * 1000,
+                "p99_ms": percentile(timings, 99) * 1000,
+                "errors": errors,
+                "error_rate": errors / len(timings) if timings else 0.0
+            }
+
+        operations = {}
+        for operation in sorted(self.timings):
+            operations[operation] = summarise(self.timings[operation],
+                                              self.errors[operation])
+            operations[operation]["statuses"] = {
+                str(status): n for status, n in sorted(self.statuses[operation].items())}
+        every = [seconds for timings in self.timings.values() for seconds in timings]
+        return operations, summarise(every, sum(self.errors.values()))
+
+
+def run_inprocess(app, workload, clients, duration, seed):
+    """Send the requests through the test client, a thread per client"""
+    results = Results()
+    deadline = time.perf_counter() + duration
+
+    def client(rng):
+        # without cookies, a login does not find the session of the last
+        test_client = app.test_client(use_cookies=False)
+        while time.perf_counter() < deadline:
+            call = workload.next_call(rng)
+            headers = {"Authorization": f"Bearer {call.token}"} if call.token else {}
+            t0 = time.perf_counter()
+            response = test_client.open(call.path, method=call.method, json=call.body,
+                                        headers=headers)
+            results.add(call, response.status_code, time.perf_counter() - t0)
+            workload.finish(call, response.status_code, response.get_data())
+
+    threads = [threading.Thread(target=client, args=(random.Random(seed + n),))
+               for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def encode(call):
+    """Get the HTTP/1.1 request of a call"""
+    body = json.dumps(call.body).encode() if call.body is not None else b""
+    head = [f"{call.method} {call.path} HTTP/1.1", "Host: localhost",
+            f"Content-Length: {len(body)}"]
+    if body:
+        head.append("Content-Type: application/json")
+    if call.token:
+        head.append(f"Authorization: Bearer {call.token}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+async def http_client(port, workload, rng, deadline, results):
+    connection = None
+    while time.perf_counter() < deadline:
+        call = workload.next_call(rng)
+        t0 = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            status, keep_alive, body = await fetch(connection, encode(call))
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            status, keep_alive, body = 0, False, b""
+        results.add(call, status, time.perf_counter() - t0)
+        workload.finish(call, status, body)
+        if not keep_alive and connection:
+            connection[1].close()
+            connection = None
+    if connection:
+        connection[1].close()
+
+
+async def run_http(port, workload, clients, duration, seed):
+    """Send the requests to the server listening on port"""
+    results = Results()
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(http_client(port, workload, random.Random(seed + n),
+                                       deadline, results)
+                           for n in range(clients)))
+    return results
+
+
+def seed(app, drivers, passengers, rides_per_driver):
+    """Create the users and rides of the load test
+
+    Returns:
+        tuple: ids of the drivers and of the passengers, (ride id,
+               driver) of the rides and the access token of each user
+    """
+    from flask_jwt_extended import create_access_token
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_rides
+    from app.hashing import hash_password
+
+    driver_ids = [f"driver-{n}" for n in range(drivers)]
+    passenger_ids = [f"passenger-{n}" for n in range(passengers)]
+    with app.app_context():
+        initialize()
+        db = get_db()
+        # everyone shares one hash, hashing a password per user is slow
+        password = hash_password(PASSWORD)
+        db.executemany("INSERT INTO users (id, name, email, password) VALUES (?, ?, ?, ?)",
+                       [(user, user, f"{user}@loadtest.dev", password)
+                        for user in driver_ids + passenger_ids])
+        db.commit()
+        rides = []
+        for driver in driver_ids:
+            created = create_rides(driver, [ride_details(depart_in_hours=3 * n)
+                                            for n in range(1, rides_per_driver + 1)])
+            rides += [(ride_id, driver) for ride_id, _ in created]
+        tokens = {user: create_access_token(identity=user)
+                  for user in driver_ids + passenger_ids}
+    return driver_ids, passenger_ids, rides, tokens
+
+
+def compare(report, baseline, threshold):
+    """Print the change of each operation from the baseline report
+
+    Returns:
+        list: operations whose throughput fell or p95 rose by more
+              than threshold percent
+    """
+    def change(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    settings = ("target", "workers", "clients", "mix")
+    differing = [name for name in settings if report.get(name) != baseline.get(name)]
+    if differing:
+        print(f"\nwarning: the baseline ran with other {', '.join(differing)}")
+
+    regressions = []
+    print(f"\n{'vs baseline':<14} {'req/s':>9} {'p95':>9} {'errors':>9}")
+    for operation, result in sorted(report["operations"].items()):
+        old = baseline["operations"].get(operation)
+        if not old:
+            continue
+        throughput = change(result["throughput"], old["throughput"])
+        p95 = change(result["p95_ms"], old["p95_ms"])
+        errors = (result["error_rate"] - old["error_rate"]) * 100
+        worse = throughput < -threshold or p95 > threshold
+        if worse:
+            regressions.append(operation)
+        print(f"{operation:<14} {throughput:+8.1f}% {p95:+8.1f}% {errors:+8.1f}pt"
+              f"{'  REGRESSED' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=("inprocess", "gunicorn"), default="inprocess",
+                        help='where the app is served')
+    parser.add_argument('--clients', type=int, default=16,
+                        help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds the app is loaded for')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weights of the operations, e.g. list_rides=60,join=40')
+    parser.add_argument('--drivers', type=int, default=50)
+    parser.add_argument('--passengers', type=int, default=200)
+    parser.add_argument('--rides-per-driver', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='gunicorn worker processes')
+    parser.add_argument('--port', type=int, default=8078)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random choices of the clients')
+    parser.add_argument('--output', help='file the report is saved to as JSON')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='report of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='percent change of throughput or p95 that fails --compare')
+    args = parser.parse_args()
+
+    app = make_app(ENV_CONFIG="test")
+    drivers, passengers, rides, tokens = seed(app, args.drivers, args.passengers,
+                                              args.rides_per_driver)
+    workload = Workload(args.mix, drivers, passengers, rides, tokens,
+                        3 * args.rides_per_driver)
+
+    if args.target == "inprocess":
+        results = run_inprocess(app, workload, args.clients, args.duration, args.seed)
+    else:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        server = subprocess.Popen(SERVERS["flask"](args.port, args.workers), cwd=root,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.port)
+            results = asyncio.run(run_http(args.port, workload, args.clients,
+                                           args.duration, args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+
+    operations, total = results.summary(args.duration)
+    print(f"{'operation':<14} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>8}")
+    for operation, result in list(operations.items()) + [("total", total)]:
+        print(f"{operation:<14} {result['requests']:>9} {result['throughput']:>9.1f} "
+              f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['error_rate'] * 100:>7.2f}%")
+    for operation, result in operations.items():
+        if result["errors"]:
+            print(f"  {operation} responses by status: {result['statuses']}")
+
+    report = {
+        "target": args.target,
+        "workers": args.workers if args.target == "gunicorn" else None,
+        "clients": args.clients,
+        "duration": args.duration,
+        "mix": args.mix,
+        "operations": operations,
+        "total": total
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\nregressed by more than {args.threshold}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Metrics recording overhead benchmark.
+
+Times what app.metrics adds to every request: Metrics.record, the
+hooks that run before and after the request and the observer called
+after each SQL statement. Each is reported in microseconds per call,
+with the write of a worker's file that happens at most once a second,
+next to a whole GET /rides/<rideId> request served in-process.
+
+    $ python -m benchmarks.metrics --calls 200000
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.common import make_app, ride_details, add_users, percentile
+
+
+def per_call(func, calls):
+    """Average microseconds of func()"""
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000,
+                        help='calls of each recording function')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='requests timed end to end')
+    args = parser.parse_args()
+
+    from flask import Response
+    from flask_jwt_extended import create_access_token
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_rides
+    from app.metrics import Metrics, get_metrics
+
+    app = make_app()
+    with app.app_context():
+        initialize()
+        add_users(get_db(), ["driver"])
+        (ride_id, _), = create_rides("driver", [ride_details()])
+        token = create_access_token(identity="driver")
+
+    metrics = get_metrics(app)
+    endpoints = ["api_Bp.view_ride", "api_Bp.rides", "api_Bp.login", "api_Bp.signup"]
+    counter = iter(range(10 ** 12))
+
+    def record():
+        n = next(counter)
+        metrics.record(endpoints[n % 4], "GET", 200, n % 97 / 1000.0, 3, 0.0004)
+
+    # next() on the counter is part of the loop, not of the recording
+    baseline = per_call(lambda: endpoints[next(counter) % 4], args.calls)
+    results = {"Metrics.record": per_call(record, args.calls) - baseline}
+
+    response = Response(status=200)
+    with app.test_request_context(f"/api/v1/rides/{ride_id}"):
+        results["request hooks"] = per_call(
+            lambda: metrics.record_response(metrics.start_request() or response),
+            args.calls)
+
+        metrics.start_request()
+        db = get_db()
+        observer = db.observer
+        db.observer = None
+        bare = per_call(lambda: db.execute("SELECT 1"), args.calls)
+        db.observer = observer
+        results["per SQL statement"] = per_call(lambda: db.execute("SELECT 1"),
+                                                args.calls) - bare
+
+    # workers write their file at most once a second
+    with tempfile.TemporaryDirectory() as directory:
+        shared = Metrics(app.config['METRICS_BUCKETS'], directory, flush_interval=3600)
+        for n in range(1000):
+            shared.record(endpoints[n % 4], "GET", 200, n % 97 / 1000.0, 3, 0.0004)
+        results["flush to file"] = per_call(shared.flush, max(1, args.calls // 100))
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    timings = []
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        client.get(f"/api/v1/rides/{ride_id}", headers=headers)
+        timings.append(time.perf_counter() - t0)
+
+    for name, micros in results.items():
+        print(f"{name:<20} {micros:8.2f} us")
+    print(f"{'GET /rides/<id> p50':<20} {percentile(timings, 50) * 1e6:8.2f} us")
+
+
+if __name__ == '__main__':
+    main()
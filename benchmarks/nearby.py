@@ -0,0 +1,105 @@
+"""Nearby ride lookup benchmark.
+
+Rides starting at random points around Kenya are added in steps and
+after each step GET /rides/nearby's lookup is timed against a full
+scan that computes the distance to every ride. The lookup only reads
+the geohash cells around the point so its time should grow far slower
+than the table.
+
+    $ python -m benchmarks.nearby --sizes 1000 10000 100000 --queries 200
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app, percentile
+
+# south west and north east corners of the area rides start in
+AREA = ((-4.7, 33.9), (4.6, 41.9))
+
+
+def random_point(rng):
+    (south, west), (north, east) = AREA
+    return rng.uniform(south, north), rng.uniform(west, east)
+
+
+def add_rides(db, count, rng):
+    """Insert count rides starting at random points"""
+    from app.geo import encode
+
+    depart = datetime.now() + timedelta(days=1)
+    rows = []
+    for i in range(count):
+        lat, lon = random_point(rng)
+        rows.append(("Somewhere", "Elsewhere", depart, depart + timedelta(hours=2),
+                     4, "KCH 001", f"driver-{i}", lat, lon, encode(lat, lon)))
+    db.executemany("""INSERT INTO rides (starting_point, destination,
+        depart_time, eta, seats, vehicle, driver,
+        start_lat, start_lon, start_geohash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+    db.commit()
+
+
+def full_scan(db, lat, lon, radius):
+    """Find nearby rides by computing the distance to every ride"""
+    from app.geo import distances_km
+
+    rows = db.execute("SELECT id, start_lat, start_lon FROM rides").fetchall()
+    distances = distances_km(lat, lon, [row[1] for row in rows],
+                             [row[2] for row in rows])
+    return [row[0] for row, distance in zip(rows, distances) if distance <= radius]
+
+
+def measure(func, points):
+    timings = []
+    for lat, lon in points:
+        t0 = time.perf_counter()
+        func(lat, lon)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=5.0, help='km')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    from app.db import get_db, initialize
+    from app.data.ride_data import nearby_rides
+
+    rng = random.Random(args.seed)
+    points = [random_point(rng) for _ in range(args.queries)]
+
+    app = make_app()
+    print(f"{'rides':>9} {'nearby p50':>11} {'nearby p95':>11} "
+          f"{'scan p50':>10} {'found':>6}")
+
+    with app.app_context():
+        initialize()
+        db = get_db()
+        total = 0
+        for size in sorted(args.sizes):
+            add_rides(db, size - total, rng)
+            total = size
+            db.execute("ANALYZE")
+
+            found = sum(len(nearby_rides(lat, lon, args.radius, limit=10 ** 6))
+                        for lat, lon in points)
+            nearby = measure(lambda lat, lon: nearby_rides(lat, lon, args.radius),
+                             points)
+            scan = measure(lambda lat, lon: full_scan(db, lat, lon, args.radius),
+                           points[:max(1, args.queries // 10)])
+
+            print(f"{size:>9} {percentile(nearby, 50) * 1000:>9.2f}ms "
+                  f"{percentile(nearby, 95) * 1000:>9.2f}ms "
+                  f"{percentile(scan, 50) * 1000:>8.2f}ms "
+                  f"{found / len(points):>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Seat reservation contention benchmark.
+
+Many processes, like gunicorn workers, accept join requests on the same
+ride at once. Every accept races for the ride's last seats, the run
+reports the accepts per second and checks that exactly as many requests
+were accepted as the ride had seats.
+
+    $ python -m benchmarks.seats --workers 32 --seats 10 --requests 320
+"""
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.common import make_app, ride_details, add_users, percentile
+
+
+def worker(database, request_ids, start, results):
+    """Accept each request, report timings and outcomes."""
+    from werkzeug.exceptions import HTTPException
+    from app.data.ride_data import update_request_status
+
+    app = make_app(database)
+    outcomes = {"accepted": 0, "full": 0, "errors": 0}
+    timings = []
+
+    start.wait()
+    for request_id in request_ids:
+        t0 = time.perf_counter()
+        with app.app_context():
+            try:
+                update_request_status("accepted", request_id)
+                outcomes["accepted"] += 1
+            except HTTPException:
+                outcomes["full"] += 1
+            except Exception:
+                outcomes["errors"] += 1
+        timings.append(time.perf_counter() - t0)
+
+    results.put({"outcomes": outcomes, "timings": timings})
+
+
+def setup(app, seats, requests):
+    """Create a ride and requests to join it, return the request ids."""
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_ride, join_ride
+
+    with app.app_context():
+        initialize()
+        add_users(get_db(), ["driver"] + [f"passenger-{n}"
+                                          for n in range(requests)])
+
+        ride_id = create_ride("driver", **ride_details(seats=seats))
+        request_ids = [join_ride(ride_id, f"passenger-{n}", "Voi")[1]
+                       for n in range(requests)]
+    return ride_id, request_ids
+
+
+def run(app, workers, seats, requests):
+    """Run the benchmark and return the aggregated results."""
+    from app.db import get_db
+
+    ride_id, request_ids = setup(app, seats, requests)
+
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(
+                target=worker,
+                args=(app.config['DATABASE'], request_ids[n::workers], start, results))
+             for n in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    began = time.perf_counter()
+    start.set()
+    reports = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+
+    with app.app_context():
+        db = get_db()
+        seats_left = db.execute("SELECT seats FROM rides WHERE id=?",
+                                (ride_id,)).fetchone()[0]
+        booked = db.execute("""SELECT COUNT(*) FROM requests
+            WHERE ride_id=? AND req_status='accepted'""", (ride_id,)).fetchone()[0]
+
+    outcomes = {"accepted": 0, "full": 0, "errors": 0}
+    timings = []
+    for report in reports:
+        timings.extend(report["timings"])
+        for name, count in report["outcomes"].items():
+            outcomes[name] += count
+
+    return {
+        "workers": workers,
+        "seats": seats,
+        "outcomes": outcomes,
+        "seats_left": seats_left,
+        "booked": booked,
+        "overbooked": max(0, booked - seats),
+        "throughput": len(timings) / elapsed if elapsed else 0.0,
+        "p50": percentile(timings, 50),
+        "p99": percentile(timings, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seats", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=320,
+                        help="join requests accepted by the workers")
+    args = parser.parse_args()
+
+    app = make_app()
+    result = run(app, args.workers, args.seats, args.requests)
+
+    outcomes = result["outcomes"]
+    print(f"workers: {result['workers']}  seats: {result['seats']}  "
+          f"accepted: {outcomes['accepted']}  full: {outcomes['full']}  "
+          f"errors: {outcomes['errors']}")
+    print(f"throughput: {result['throughput']:.1f} accepts/s  "
+          f"p50 {result['p50'] * 1000:.3f} ms  p99 {result['p99'] * 1000:.3f} ms")
+    print(f"booked: {result['booked']}  seats left: {result['seats_left']}  "
+          f"overbooked: {result['overbooked']}")
+
+
+if __name__ == "__main__":
+    main()
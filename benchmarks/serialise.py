@@ -0,0 +1,81 @@
+"""GET /rides payload size and serialisation benchmark.
+
+Serialises a page of rides with the standard library's json and with
+orjson, then fetches the page through the app uncompressed, deflate
+and gzip compressed at a few levels.
+
+    $ python -m benchmarks.serialise --rides 200 --repeat 500
+"""
+import argparse
+import time
+
+from benchmarks.common import make_app, ride_details, add_users, percentile
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def report(name, timings, size=None):
+    line = f"{name:<16} p50 {percentile(timings, 50) * 1000:.3f} ms  " \
+           f"p99 {percentile(timings, 99) * 1000:.3f} ms"
+    if size is not None:
+        line += f"  {size:>8} bytes"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=200,
+                        help='rides on the page')
+    parser.add_argument('--repeat', type=int, default=500,
+                        help='times each variant is measured')
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_rides, get_rides
+    from app.api import representations
+
+    app = make_app(RIDE_CACHE_SIZE=0, RIDES_CACHE_SIZE=0)
+    with app.app_context():
+        initialize()
+        add_users(get_db(), ["driver"])
+        create_rides("driver", [ride_details(depart_in_hours=3 * n)
+                                for n in range(1, args.rides + 1)])
+        token = create_access_token(identity="driver")
+        page = {"rides": get_rides(limit=args.rides)}
+
+    print(f"serialising {len(page['rides'])} rides")
+    for name in ("json", "orjson"):
+        if name == "orjson" and representations.orjson is None:
+            print("orjson           not installed")
+            continue
+        dumps = representations.get_dumps(name)
+        report(name, time_calls(lambda: dumps(page), args.repeat), len(dumps(page)))
+
+    print(f"\nGET /rides?limit={args.rides}")
+    client = app.test_client()
+    url = f'/api/v1/rides?limit={args.rides}'
+    variants = [("identity", None, 6), ("deflate 6", "deflate", 6)] \
+        + [(f"gzip {level}", "gzip", level) for level in (1, 6, 9)]
+    for name, encoding, level in variants:
+        app.config['COMPRESS_LEVEL'] = level
+        headers = {'Authorization': 'Bearer ' + token}
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+
+        def fetch():
+            return client.get(url, headers=headers)
+
+        size = len(fetch().get_data())
+        report(name, time_calls(fetch, args.repeat // 5 or 1), size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Concurrent connection load test of the sync and asyncio servers.
+
+Seeds rides, then starts the Flask app under gunicorn and the ASGI app
+of app.aio under uvicorn, each with the same number of worker
+processes, and keeps --connections keep-alive connections busy with
+GET /rides pages and GET /rides/<rideId> for --duration seconds.
+Throughput and tail latency of each are reported.
+
+    $ python -m benchmarks.servers --connections 64 --workers 4 --duration 10
+
+gunicorn and uvicorn must be installed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import make_app, ride_details, add_users, percentile
+
+# threads of each gunicorn worker, as in the Procfile
+THREADS = 8
+
+SERVERS = {
+    "flask": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "-w", str(workers),
+        "-k", "gthread", "--threads", str(THREADS),
+        "-b", f"127.0.0.1:{port}", "run:app"],
+    "asyncio": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "run:app", "--workers", str(workers),
+        "--port", str(port), "--no-access-log"],
+}
+
+
+async def fetch(connection, request):
+    """Send request on connection and read the response
+
+    Returns:
+        tuple: status code, whether the server keeps the connection
+               and the body
+    """
+    reader, writer = connection
+    writer.write(request)
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    length, keep_alive = 0, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            keep_alive = False
+    body = await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive, body
+
+
+async def client(port, paths, token, deadline, timings, statuses):
+    connection = None
+    while time.perf_counter() < deadline:
+        request = (f"GET {random.choice(paths)} HTTP/1.1\r\nHost: localhost\r\n"
+                   f"Authorization: Bearer {token}\r\n\r\n").encode()
+        t0 = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            status, keep_alive, _ = await fetch(connection, request)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            statuses.append(0)
+            connection = None
+            continue
+        timings.append(time.perf_counter() - t0)
+        statuses.append(status)
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection:
+        connection[1].close()
+
+
+async def load(port, paths, token, connections, duration):
+    timings, statuses = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, paths, token, deadline, timings, statuses)
+                           for _ in range(connections)))
+    return timings, statuses
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not listen on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=64,
+                        help='concurrent client connections')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='worker processes of each server')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds each server is loaded for')
+    parser.add_argument('--rides', type=int, default=500,
+                        help='rides seeded')
+    parser.add_argument('--port', type=int, default=8077)
+    parser.add_argument('--server', choices=sorted(SERVERS), action='append',
+                        help='server to load, all by default')
+    args = parser.parse_args()
+
+    from flask_jwt_extended import create_access_token
+    from app.db import initialize, get_db
+    from app.data.ride_data import create_rides
+
+    app = make_app(ENV_CONFIG="test")
+    with app.app_context():
+        initialize()
+        add_users(get_db(), ["driver"])
+        created = create_rides("driver", [ride_details(depart_in_hours=3 * n)
+                                          for n in range(1, args.rides + 1)])
+        token = create_access_token(identity="driver")
+
+    ride_ids = [ride_id for ride_id, _ in created]
+    paths = ["/api/v1/rides?limit=20"] + [f"/api/v1/rides/{ride_id}"
+                                           for ride_id in ride_ids[:50]]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    for name in args.server or sorted(SERVERS):
+        env = dict(os.environ, SERVER=name)
+        server = subprocess.Popen(SERVERS[name](args.port, args.workers), cwd=root,
+                                  env=env, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.port)
+            timings, statuses = asyncio.run(load(args.port, paths, token,
+                                                 args.connections, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+        errors = sum(status != 200 for status in statuses)
+        print(f"{name:<8} {len(timings) / args.duration:8.1f} requests/s  "
+              f"p50 {percentile(timings, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(timings, 99) * 1000:7.2f} ms  "
+              f"{errors} errors")
+
+
+if __name__ == '__main__':
+    main()
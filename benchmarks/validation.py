@@ -0,0 +1,84 @@
+"""Ride payload validation benchmark.
+
+Times validating the body of POST /users/rides with the RequestParser
+the endpoint used to have against the compiled ride schema, for a
+valid payload and one with several invalid fields.
+
+    $ python -m benchmarks.validation --repeat 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks.common import make_app, ride_details, percentile
+
+
+def date_validator(value, name):
+    """The check of ride times before app.schema: a future date"""
+    from app.validators import string_validator, DATE_FORMAT
+
+    string_validator(value, name)
+    if datetime.strptime(value, DATE_FORMAT) < datetime.now():
+        raise ValueError(f"{name} must be greater than the current time now: "
+                         f"{datetime.now().strftime(DATE_FORMAT)}")
+    return value
+
+
+def old_ride_parser():
+    """The RequestParser of POST /users/rides before app.schema"""
+    from flask_restplus import reqparse
+    from app.validators import string_validator, \
+        latitude_validator, longitude_validator
+
+    parser = reqparse.RequestParser()
+    for name, kind, required in (
+            ('starting_point', string_validator, True),
+            ('destination', string_validator, True),
+            ('depart_time', date_validator, True),
+            ('eta', date_validator, True),
+            ('seats', int, True),
+            ('vehicle', string_validator, True),
+            ('start_lat', latitude_validator, False),
+            ('start_lon', longitude_validator, False)):
+        parser.add_argument(name, type=kind, required=required, location='json')
+    return parser
+
+
+def measure(app, payload, parse, repeat):
+    from werkzeug.exceptions import HTTPException
+
+    timings = []
+    with app.test_request_context('/api/v1/users/rides', method='POST', json=payload):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            try:
+                parse()
+            except HTTPException:
+                pass
+            timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20000,
+                        help='times each payload is validated')
+    args = parser.parse_args()
+
+    app = make_app()
+    from app.api.ride_ns import ride_schema
+
+    valid = dict(ride_details(), start_lat=-1.28, start_lon=36.82)
+    invalid = dict(valid, destination=" ", eta="31-02-2020 10:00", seats="four")
+    old = old_ride_parser()
+
+    for name, payload in (("valid", valid), ("invalid", invalid)):
+        for kind, parse in (("RequestParser", old.parse_args),
+                            ("compiled schema", ride_schema.parse)):
+            timings = measure(app, payload, parse, args.repeat)
+            print(f"{name:<8} {kind:<16} mean {sum(timings) / len(timings) * 1e6:7.1f} us  "
+                  f"p99 {percentile(timings, 99) * 1e6:7.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,18 @@
+import hashlib
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
 basedir = Path(__file__).resolve().parent
 
+
+def deployment_dir(name, database):
+    """Temporary directory shared by the workers using database"""
+    digest = hashlib.sha1(str(database).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'ridemyway-{name}-{digest}')
+
+
 class Config(object):
     """Parent configuration class for enviroments.
     """
@@ -13,9 +22,129 @@ class Config(object):
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=60)
 
     DATABASE = Path(basedir).joinpath(os.environ.get('DATABASE'))
-    # DATABASE_HOST = os.environ.get('DATABASE_HOST')
-    # DATABASE_USER = os.environ.get('DATABASE_USER')
-    # DATABASE_PASS = os.environ.get('DATABASE_PASS')
+
+    # Storage engine: 'sqlite' or 'postgresql', see app.storage.
+    # PostgreSQL uses DATABASE_URL when set, else the DATABASE_* settings
+    # with the database name taken from DATABASE.
+    DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+    DATABASE_URL = os.environ.get('DATABASE_URL')
+    DATABASE_HOST = os.environ.get('DATABASE_HOST')
+    DATABASE_PORT = os.environ.get('DATABASE_PORT')
+    DATABASE_USER = os.environ.get('DATABASE_USER')
+    DATABASE_PASS = os.environ.get('DATABASE_PASS')
+
+    # Connections kept warm per worker process, see app.storage.ConnectionPool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_HEALTH_CHECK = True
+    DB_POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', 0)) or None
+    DB_POOL_TIMEOUT = 30
+
+    # Storage tuning applied to every new SQLite connection. WAL lets
+    # readers carry on while one of the gunicorn workers is writing.
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY'
+    }
+
+    # Server settings applied to every PostgreSQL connection
+    POSTGRES_SETTINGS = {
+        'lock_timeout': '5s',
+        'statement_timeout': '30s'
+    }
+
+    # Page size of GET /rides, clients may ask for up to RIDES_PAGE_MAX
+    RIDES_PAGE_SIZE = 50
+    RIDES_PAGE_MAX = 200
+
+    # Per worker caches of get_ride and get_rides, see app.cache. Writes
+    # by other workers are picked up within CACHE_SYNC_INTERVAL seconds,
+    # or RIDE_CACHE_TTL seconds when it is negative.
+    RIDE_CACHE_SIZE = int(os.environ.get('RIDE_CACHE_SIZE', 1024))
+    RIDES_CACHE_SIZE = int(os.environ.get('RIDES_CACHE_SIZE', 128))
+    RIDE_CACHE_TTL = 30
+    CACHE_SYNC_INTERVAL = float(os.environ.get('CACHE_SYNC_INTERVAL', 1.0))
+
+    # Claims of verified access tokens, see app.tokens. An entry is
+    # served until its token expires, for at most JWT_CACHE_TTL seconds.
+    JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 4096))
+    JWT_CACHE_TTL = 300
+
+    # Most rides POST /users/rides/batch takes at once
+    RIDES_BATCH_MAX = 100
+    # Largest request body in bytes, larger ones get 413
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 1024 * 1024))
+
+    # Search radius in km of GET /rides/nearby and the largest allowed
+    NEARBY_RADIUS_KM = 5
+    NEARBY_RADIUS_MAX_KM = 100
+
+    # JSON serialiser of API responses: 'auto' uses orjson when it is
+    # installed, 'orjson' or 'json' force one, see app.api.representations
+    JSON_SERIALIZER = os.environ.get('JSON_SERIALIZER', 'auto')
+
+    # gzip/deflate compression of API responses of at least
+    # COMPRESS_MIN_SIZE bytes, COMPRESS_LEVEL is 1 (fast) to 9 (small)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_MIMETYPES = ('application/json',)
+
+    # Password hashing, see app.hashing. PASSWORD_HASH_ROUNDS is the cost
+    # of pbkdf2 methods, stored hashes are upgraded on login when either
+    # changes. Each worker hashes HASH_WORKERS passwords at once with
+    # HASH_QUEUE_SIZE more waiting, other requests get 503 after waiting
+    # HASH_QUEUE_TIMEOUT seconds for room.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', 150000))
+    HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+    HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', 16))
+    HASH_QUEUE_TIMEOUT = float(os.environ.get('HASH_QUEUE_TIMEOUT', 5))
+
+    # Threads running data functions for the asyncio entry point, see
+    # app.aio. Each holds a connection of the pool while it runs.
+    AIO_DB_THREADS = int(os.environ.get('AIO_DB_THREADS', 16))
+
+    # Directory of the UNIX sockets that carry ride request events to
+    # every worker, see app.events. Workers of one deployment share it,
+    # the default is named after the database so deployments do not.
+    EVENTS_DIR = os.environ.get('EVENTS_DIR') or \
+        deployment_dir('events', DATABASE_URL or DATABASE)
+    # Seconds between keep-alive comments of idle event streams
+    EVENTS_HEARTBEAT = 15
+    # Events an event stream may fall behind before it is ended
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+
+    # Rides are moved to the archive tables ARCHIVE_AFTER_HOURS after
+    # their eta, ARCHIVE_BATCH_SIZE per transaction, see app.archive.
+    # ARCHIVE_INTERVAL seconds between runs of each worker, 0 leaves
+    # archiving to `flask db archive`.
+    ARCHIVE_AFTER_HOURS = float(os.environ.get('ARCHIVE_AFTER_HOURS', 24))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_PAUSE = 0.05
+    ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', 0))
+
+    # Request metrics served at /metrics, see app.metrics. Workers write
+    # theirs to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds.
+    # /metrics is not authenticated, it is off unless METRICS_ENABLED=1.
+    # Like EVENTS_DIR the default directory is named after the database.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or \
+        deployment_dir('metrics', DATABASE_URL or DATABASE)
+    METRICS_FLUSH_INTERVAL = 1.0
+    METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    # SQL tracing for development, see app.tracing. Statements are logged
+    # with their caller, a statement shape run SQL_TRACE_REPEAT times in
+    # one request is flagged as N+1 and statements slower than
+    # SQL_SLOW_QUERY_MS go with their plan to SQL_SLOW_QUERY_LOG.
+    SQL_TRACE = os.environ.get('SQL_TRACE') == '1'
+    SQL_TRACE_REPEAT = 3
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+    SQL_SLOW_QUERY_LOG = os.environ.get('SQL_SLOW_QUERY_LOG')
 
 class Development(Config):
     pass
@@ -26,6 +155,12 @@ class Testing(Config):
 
     TESTING = True
     DATABASE = os.environ.get('DATABASE_TEST')
+    DATABASE_URL = os.environ.get('DATABASE_TEST_URL')
+    # metrics of test apps are kept apart from those of running workers
+    METRICS_ENABLED = True
+    METRICS_DIR = None
+    # events of test apps stay in their own process
+    EVENTS_DIR = None
 
 
 app_configs = {
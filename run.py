@@ -2,7 +2,19 @@ import os
 
 from app.core import create_app
 
-app = create_app(os.environ.get("ENV_CONFIG"))
+# SERVER=asyncio serves the ASGI app of app.aio instead of the Flask
+# app, e.g. SERVER=asyncio uvicorn run:app --workers 4
+ASYNCIO = os.environ.get("SERVER") == "asyncio"
+
+if ASYNCIO:
+    from app.aio import create_app as create_asgi_app
+    app = create_asgi_app(os.environ.get("ENV_CONFIG"))
+else:
+    app = create_app(os.environ.get("ENV_CONFIG"))
 
 if __name__ == '__main__':
-    app.run()
+    if ASYNCIO:
+        import uvicorn
+        uvicorn.run(app)
+    else:
+        app.run()
@@ -1,5 +1,9 @@
 from unittest import TestCase
 
+from app.core import create_app
+from app.db import initialize, close_db, get_db
+
+
 class TestBase(TestCase):
     """Adds Http Status code testing methods
     """
@@ -86,4 +90,31 @@ class TestBase(TestCase):
         :return bool:
         """
         assert response.status_code == 409
-        
\ No newline at end of file
+        
+
+
+class DatabaseCase(TestBase):
+    """Runs each test on freshly created tables of a 'test' app
+
+    Subclasses serving another app override make_app, an app that is
+    not a Flask app exposes the Flask app it wraps as flask_app.
+    """
+
+    def make_app(self):
+        return create_app("test")
+
+    def setUp(self):
+        self.app = self.make_app()
+        self.flask_app = getattr(self.app, 'flask_app', self.app)
+        with self.flask_app.app_context():
+            close_db()
+            initialize()
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            close_db()
+            db = get_db()
+            for table in ("requests", "rides", "users"):
+                db.execute(f"DROP TABLE {table}")
+            db.commit()
+            close_db()
@@ -0,0 +1,293 @@
+"""Defines tests for the asyncio entry point"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from unittest import main
+
+from app.aio import create_app
+from app.db import get_db
+from app.events import ride_topic
+from tests.basetest import DatabaseCase
+
+
+class Response:
+    """Response collected from the ASGI app"""
+
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class AsyncAppCase(DatabaseCase):
+    """Tests the auth, ride and join request routes of the ASGI app"""
+
+    driver = {"name": "Bob Rider", "email": "bobrider@dev.com", "password": "12345dfgh"}
+    passenger = {"name": "Bob Pass", "email": "bobpass@dev.com", "password": "12345dfghqwyn"}
+
+    def make_app(self):
+        return create_app("test")
+
+    def setUp(self):
+        super().setUp()
+        self.cookie = None
+
+    def tearDown(self):
+        super().tearDown()
+        self.app.db.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request to the app and collect its response"""
+        return asyncio.run(self.send_request(method, path, body, headers))
+
+    def scope(self, method, path, headers=None):
+        raw_headers = [(b'content-type', b'application/json')]
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode(), value.encode()))
+        if self.cookie:
+            raw_headers.append((b'cookie', self.cookie.encode()))
+        path, _, query = path.partition('?')
+        return {'type': 'http', 'method': method, 'path': path,
+                'query_string': query.encode(), 'headers': raw_headers}
+
+    async def send_request(self, method, path, body=None, headers=None):
+        messages = [{'type': 'http.request',
+                     'body': json.dumps(body).encode() if body is not None else b''}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(self.scope(method, path, headers), receive, send)
+        headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+        if 'set-cookie' in headers:
+            self.cookie = headers['set-cookie'].split(';', 1)[0]
+        return Response(sent[0]['status'], headers, sent[1]['body'])
+
+    def login(self, user):
+        self.request('POST', '/api/v1/auth/signup', user)
+        response = self.request('POST', '/api/v1/auth/login',
+                                {"email": user['email'], "password": user['password']})
+        self.assert200(response)
+        self.request('POST', '/api/v1/auth/logout')
+        return {'Authorization': 'Bearer ' + response.json()['access_token']}
+
+    def ride(self, days=1):
+        depart_time = datetime.now() + timedelta(days=days)
+        return {
+            "starting_point": "Nairobi-Kencom",
+            "destination": "Taita-wunda",
+            "depart_time": depart_time.strftime("%d-%m-%Y %H:%M"),
+            "eta": (depart_time + timedelta(hours=2)).strftime("%d-%m-%Y %H:%M"),
+            "seats": 4,
+            "vehicle": "KCH 001"
+        }
+
+    def test_auth(self):
+        """Test users can sign up, log in once and log out"""
+        response = self.request('POST', '/api/v1/auth/signup', self.driver)
+        self.assert201(response)
+        self.assert409(self.request('POST', '/api/v1/auth/signup', self.driver))
+
+        login = {"email": self.driver['email'], "password": self.driver['password']}
+        response = self.request('POST', '/api/v1/auth/login', login)
+        self.assert200(response)
+        self.assertTrue(response.json()['access_token'])
+        self.assert409(self.request('POST', '/api/v1/auth/login', login))
+
+        self.assert200(self.request('POST', '/api/v1/auth/logout'))
+        self.assert403(self.request('POST', '/api/v1/auth/logout'))
+
+        response = self.request('POST', '/api/v1/auth/login',
+                                dict(login, password="wrong-password"))
+        self.assert401(response)
+
+    def test_rides_and_join_requests(self):
+        """Test rides can be offered, listed, viewed and joined"""
+        driver = self.login(self.driver)
+        passenger = self.login(self.passenger)
+
+        self.assert401(self.request('GET', '/api/v1/rides'))
+
+        response = self.request('POST', '/api/v1/users/rides', self.ride(), driver)
+        self.assert201(response)
+        view_ride = response.json()['view_ride']
+        self.assert409(self.request('POST', '/api/v1/users/rides', self.ride(), driver))
+        self.assert201(self.request('POST', '/api/v1/users/rides', self.ride(3), driver))
+
+        response = self.request('POST', '/api/v1/users/rides',
+                                dict(self.ride(5), seats="four", vehicle=" "), driver)
+        self.assert400(response)
+        self.assertEqual(set(response.json()['errors']), {"seats", "vehicle"})
+
+        response = self.request('GET', '/api/v1/rides?limit=1', headers=driver)
+        self.assert200(response)
+        page = response.json()
+        self.assertEqual(len(page['rides']), 1)
+        self.assertTrue(page['next'])
+        response = self.request('GET', '/api/v1/rides?limit=1&cursor=' + page['next'],
+                                headers=dict(driver, **{'If-None-Match': response.headers['etag']}))
+        self.assertEqual(response.status_code, 304)
+
+        response = self.request('GET', view_ride, headers=passenger)
+        self.assert200(response)
+        self.assertEqual(response.json()['driver'], self.login_id(self.driver))
+        response = self.request('GET', view_ride,
+                                headers=dict(passenger, **{'If-None-Match': response.headers['etag']}))
+        self.assertEqual(response.status_code, 304)
+
+        requests = view_ride + '/requests'
+        self.assert201(self.request('POST', requests, {"destination": "Voi"}, passenger))
+        self.assert409(self.request('POST', requests, {"destination": "Voi"}, passenger))
+        self.assert400(self.request('POST', requests, {"destination": "Voi"}, driver))
+        self.assert404(self.request('POST', '/api/v1/rides/999/requests',
+                                    {"destination": "Voi"}, passenger))
+
+        self.assert404(self.request('GET', '/api/v1/nowhere', headers=driver))
+        self.assertEqual(self.request('DELETE', '/api/v1/rides', headers=driver).status_code, 405)
+
+    def test_large_body_rejected(self):
+        """Test bodies over MAX_CONTENT_LENGTH get 413 before being read"""
+        self.flask_app.config['MAX_CONTENT_LENGTH'] = 100
+        driver = self.login(self.driver)
+
+        async def post(chunks, headers):
+            received = []
+            sent = []
+
+            async def receive():
+                received.append(chunks[len(received)])
+                return {'type': 'http.request', 'body': received[-1],
+                        'more_body': len(received) < len(chunks)}
+
+            async def send(message):
+                sent.append(message)
+
+            await self.app(self.scope('POST', '/api/v1/users/rides', headers),
+                           receive, send)
+            return received, sent
+
+        chunk = b' ' * 60
+        # over the limit by its Content-Length
+        received, sent = asyncio.run(post([chunk] * 3,
+                                          dict(driver, **{'Content-Length': '180'})))
+        self.assertEqual(received, [])
+        self.assertEqual(sent[0]['status'], 413)
+        # over the limit as it is read
+        received, sent = asyncio.run(post([chunk] * 3, driver))
+        self.assertEqual(len(received), 2)
+        self.assertEqual(sent[0]['status'], 413)
+        self.assertIn('message', json.loads(sent[1]['body']))
+
+    def test_stream_ride_requests(self):
+        """Test the driver is sent the requests of a ride as they are made"""
+        driver = self.login(self.driver)
+        passenger = self.login(self.passenger)
+        view_ride = self.request('POST', '/api/v1/users/rides',
+                                 self.ride(), driver).json()['view_ride']
+        ride_id = view_ride.rsplit('/', 1)[1]
+        stream = f'/api/v1/users/rides/{ride_id}/requests/stream'
+
+        self.assert401(self.request('GET', stream, headers=passenger))
+        self.assert404(self.request('GET', '/api/v1/users/rides/999/requests/stream',
+                                    headers=driver))
+
+        async def watch():
+            sent = []
+            received = asyncio.Queue()
+            left = asyncio.Event()
+            await received.put({'type': 'http.request', 'body': b''})
+
+            async def receive():
+                if received.empty():
+                    await left.wait()
+                    return {'type': 'http.disconnect'}
+                return await received.get()
+
+            async def send(message):
+                sent.append(message)
+                if b'request_created' in message.get('body', b''):
+                    left.set()
+
+            driving = asyncio.ensure_future(
+                self.app(self.scope('GET', stream, driver), receive, send))
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+            response = await self.send_request('POST', view_ride + '/requests',
+                                               {"destination": "Voi"}, passenger)
+            self.assert201(response)
+            await asyncio.wait_for(driving, 5)
+            return sent
+
+        sent = asyncio.run(watch())
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(headers[b'content-type'], b'text/event-stream')
+        self.assertEqual(sent[1]['body'], b'event: requests\ndata: {}\n\n')
+
+        event, data = sent[2]['body'].decode().strip().split('\n')
+        self.assertEqual(event, 'event: request_created')
+        data = json.loads(data[len('data: '):])
+        self.assertEqual(data['ride_id'], int(ride_id))
+        self.assertEqual(data['request']['destination'], "Voi")
+        self.assertEqual(data['request']['status'], "pending")
+        with self.flask_app.app_context():
+            from app.events import get_bus
+            self.assertEqual(get_bus().stats()['subscribers'], 0)
+
+    def test_stream_ends_when_client_falls_behind(self):
+        """Test a stream more than EVENTS_QUEUE_SIZE events behind is ended"""
+        self.flask_app.config['EVENTS_QUEUE_SIZE'] = 1
+        driver = self.login(self.driver)
+        view_ride = self.request('POST', '/api/v1/users/rides',
+                                 self.ride(), driver).json()['view_ride']
+        ride_id = int(view_ride.rsplit('/', 1)[1])
+        stream = f'/api/v1/users/rides/{ride_id}/requests/stream'
+
+        async def watch():
+            sent = []
+            stalled = asyncio.Event()
+            resumed = asyncio.Event()
+
+            async def receive():
+                if not sent:
+                    return {'type': 'http.request', 'body': b''}
+                await asyncio.Event().wait()
+
+            async def send(message):
+                sent.append(message)
+                if b'event: requests' in message.get('body', b''):
+                    stalled.set()
+                    await resumed.wait()
+
+            driving = asyncio.ensure_future(
+                self.app(self.scope('GET', stream, driver), receive, send))
+            await asyncio.wait_for(stalled.wait(), 5)
+            for request_id in range(3):
+                self.app.events.publish(ride_topic(ride_id), {
+                    'event': 'request_created', 'ride_id': ride_id,
+                    'request': {'id': request_id}})
+            await asyncio.sleep(0.05)
+            resumed.set()
+            await asyncio.wait_for(driving, 5)
+            return sent
+
+        sent = asyncio.run(watch())
+        bodies = [message.get('body', b'') for message in sent[2:]]
+        self.assertTrue(bodies[0].startswith(b'event: overflow\n'))
+        self.assertFalse(any(b'request_created' in body for body in bodies))
+        self.assertEqual(self.app.events.stats()['subscribers'], 0)
+
+    def login_id(self, user):
+        with self.flask_app.app_context():
+            return get_db().execute("SELECT id FROM users WHERE email=?",
+                                    (user['email'],)).fetchone()[0]
+
+
+if __name__ == '__main__':
+    main()
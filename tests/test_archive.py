@@ -0,0 +1,73 @@
+"""Defines tests for the archival of rides that have arrived"""
+from datetime import datetime, timedelta
+from unittest import main
+
+from werkzeug.exceptions import HTTPException
+
+from app.archive import archive_rides
+from app.db import get_db
+from app.data.ride_data import create_rides, get_ride, get_ride_version, \
+    get_rides, join_ride, update_ride, retract_request
+from benchmarks.common import ride_details, add_users
+from tests.basetest import DatabaseCase
+
+
+class TestArchive(DatabaseCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            add_users(get_db(), ["driver", "pass"])
+            created = create_rides("driver", [ride_details(hours)
+                                              for hours in (1, 30, 60)])
+            self.ride_ids = [ride_id for ride_id, _ in created]
+            join_ride(self.ride_ids[0], "pass", "Voi")
+
+    def count(self, table):
+        return get_db().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_arrived_rides_are_archived(self):
+        """Test rides past their eta move to the archive with their requests"""
+        later = datetime.now() + timedelta(hours=60)
+        with self.app.app_context():
+            rides = [get_ride(ride_id) for ride_id in self.ride_ids]
+
+            moved = archive_rides(after_hours=24, batch_size=1, pause=0, now=later)
+            self.assertEqual(moved, 2)
+            self.assertEqual(self.count("rides"), 1)
+            self.assertEqual(self.count("requests"), 0)
+            self.assertEqual(self.count("requests_archive"), 1)
+            self.assertEqual([ride['id'] for ride in get_rides()], self.ride_ids[2:])
+
+            # archived rides are still found by id
+            for ride in rides:
+                self.assertEqual(get_ride(ride['id']), ride)
+            self.assertEqual(get_ride_version(self.ride_ids[0]), rides[0]['version'])
+
+            self.assertEqual(archive_rides(after_hours=24, pause=0, now=later), 0)
+
+    def test_archived_rides_are_not_changed(self):
+        """Test writes to an archived ride abort with 409"""
+        later = datetime.now() + timedelta(hours=60)
+        with self.app.test_request_context():
+            archive_rides(after_hours=24, pause=0, now=later)
+
+            with self.assertRaises(HTTPException) as error:
+                update_ride(self.ride_ids[0], **ride_details(48))
+            self.assertEqual(error.exception.code, 409)
+            with self.assertRaises(HTTPException) as error:
+                retract_request(self.ride_ids[0], "pass")
+            self.assertEqual(error.exception.code, 409)
+
+            self.assertEqual(get_ride(self.ride_ids[0])['seats'], 4)
+            self.assertEqual(self.count("requests_archive"), 1)
+
+    def test_archive_command(self):
+        """Test flask db archive reports the rides it moved"""
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["db", "archive", "--after-hours", "0"])
+        self.assertEqual(result.output, "Archived 0 rides.\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,9 @@ from unittest import main
 import json
 
 
-from app import create_app
+from app.core import create_app
 from app.db import initialize, get_db, close_db
+from app.hashing import PasswordHasher
 from tests.basetest import TestBase
 
 
@@ -37,9 +38,9 @@ class AuthCase(TestBase):
             db = get_db()
             # Drop all the tables
             cursor = db.cursor()
-            cursor.execute("DROP TABLE users")
-            cursor.execute("DROP TABLE rides")
             cursor.execute("DROP TABLE requests")
+            cursor.execute("DROP TABLE rides")
+            cursor.execute("DROP TABLE users")
             db.commit()
             cursor.close()
             db.close()
@@ -52,7 +53,7 @@ class AuthCase(TestBase):
         """Create new users
         """
 
-        response = self.client.post('/api/v1/auth/register', 
+        response = self.client.post('/api/v1/auth/signup', 
                                     data=json.dumps(self.test_user), 
                                     content_type='application/json')
         return response
@@ -69,7 +70,7 @@ class AuthCase(TestBase):
     def test_user_registration(self):
         """Test user can registration
 
-        Assert that a valid POST request to /api/v1/auth/register
+        Assert that a valid POST request to /api/v1/auth/signup
         registers a new user
         """
 
@@ -99,10 +100,33 @@ class AuthCase(TestBase):
         self.assertIn(self.test_user['name'], data['message'])
         self.assertTrue(data["access_token"])
 
+    def test_login_upgrades_password_hash(self):
+        """Test a login rehashes passwords hashed at an old cost
+
+        Assert that after PASSWORD_HASH_ROUNDS changes a valid
+        POST request to /api/v1/auth/login stores a new hash
+        that still verifies the password.
+        """
+        self.register()
+        self.app.extensions['password_hasher'] = PasswordHasher(
+            "pbkdf2:sha256", rounds=160000)
+
+        response = self.login()
+        self.assert200(response)
+
+        with self.app.app_context():
+            password_hash = get_db().execute(
+                "SELECT password FROM users WHERE email=?",
+                (self.test_user['email'],)).fetchone()[0]
+        self.assertTrue(password_hash.startswith("pbkdf2:sha256:160000$"))
+
+        self.client.post('/api/v1/auth/logout', content_type='application/json')
+        self.assert200(self.login())
+
     def test_duplicate_user_registration(self):
         """Test user cannot register twice
 
-        Assert that a valid POST request to /api/v1/auth/register
+        Assert that a valid POST request to /api/v1/auth/signup
         twice with same data fails with 409 status code
         """
 
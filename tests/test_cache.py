@@ -0,0 +1,122 @@
+"""Defines tests for the ride caches"""
+
+from unittest import TestCase, main
+from app.cache import TTLCache, ChangeWatch
+from app.migrate import upgrade
+from app.storage.sqlite import SQLiteEngine
+
+
+class Clock:
+    """Timer the tests move forward by hand"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.clock)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the cache holds at most maxsize entries"""
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.get(1)
+        self.cache.set(3, "three")
+
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        """Test entries are not served after ttl seconds"""
+        self.cache.set(1, "one")
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get(1), "one")
+
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(1))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations']),
+                         (1, 1, 1))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_entry_expires_before_cache_ttl(self):
+        """Test an entry set with a shorter ttl expires first"""
+        self.cache.set(1, "one", ttl=2)
+        self.cache.set(2, "two", ttl=60)
+        self.clock.now = 2
+        self.assertIsNone(self.cache.get(1))
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get(2), "two")
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(2))
+
+    def test_disabled_cache(self):
+        """Test a cache of size 0 keeps nothing"""
+        cache = TTLCache(maxsize=0)
+        cache.set(1, "one")
+        self.assertIsNone(cache.get(1))
+
+
+class TestChangeWatch(TestCase):
+
+    def setUp(self):
+        self.db = SQLiteEngine(":memory:").connect()
+        upgrade(self.db)
+        self.clock = Clock()
+        self.cache = TTLCache()
+        self.watch = ChangeWatch('rides', [self.cache], interval=1, timer=self.clock)
+
+    def tearDown(self):
+        self.db.close()
+
+    def add_ride(self):
+        self.db.execute("""INSERT INTO rides (starting_point, destination,
+            depart_time, eta, seats, vehicle, driver)
+            VALUES ('a', 'b', '2030-01-01 10:00:00', '2030-01-01 12:00:00',
+                    4, 'KCH 001', 'driver')""")
+        self.db.commit()
+
+    def test_cache_cleared_when_rides_change(self):
+        """Test caches are cleared after another connection writes rides"""
+        self.watch.check(self.db)
+        self.cache.set(1, "ride")
+
+        self.add_ride()
+        self.watch.check(self.db)
+        self.assertEqual(self.cache.get(1), "ride")
+
+        self.clock.now = 1
+        self.watch.check(self.db)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.watch.stats()['clears'], 1)
+
+        self.cache.set(1, "ride")
+        self.clock.now = 2
+        self.watch.check(self.db)
+        self.assertEqual(self.cache.get(1), "ride")
+
+    def test_cache_cleared_when_rides_are_updated_or_removed(self):
+        """Test updates and deletes of rides change the version too"""
+        self.add_ride()
+        self.add_ride()
+        self.watch.check(self.db)
+
+        for write in ("UPDATE rides SET seats=3 WHERE id=1",
+                      "DELETE FROM rides WHERE id=1"):
+            self.cache.set(1, "ride")
+            self.db.execute(write)
+            self.db.commit()
+            self.clock.now += 1
+            self.watch.check(self.db)
+            self.assertIsNone(self.cache.get(1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Defines tests for the database connection pool"""
+
+import os
+import tempfile
+from unittest import TestCase, main
+from app.db import get_db, write_transaction, TransactionError
+from app.storage import ConnectionPool
+from app.storage.sqlite import SQLiteEngine, connect, get_pragmas
+from tests.basetest import DatabaseCase
+
+
+class TestConnectionPool(TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool(SQLiteEngine(":memory:"), size=2)
+
+    def test_pool_reuses_connections(self):
+        """Test released connections are handed out again"""
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+
+        self.assertIs(self.pool.acquire(), conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_pool_size_is_bounded(self):
+        """Test the pool keeps no more than size idle connections"""
+        conns = [self.pool.acquire() for _ in range(3)]
+        for conn in conns:
+            self.pool.release(conn)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['discarded'], 1)
+
+    def test_broken_connection_is_discarded(self):
+        """Test health check drops closed connections"""
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        conn.close()
+
+        self.assertIsNot(self.pool.acquire(), conn)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+
+    def test_release_rolls_back_open_transaction(self):
+        """Test a connection goes back to the pool without a transaction"""
+        conn = self.pool.acquire()
+        conn.execute("CREATE TABLE t(a)")
+        conn.execute("INSERT INTO t VALUES (1)")
+        self.assertTrue(conn.in_transaction)
+        self.pool.release(conn)
+
+        self.assertFalse(conn.in_transaction)
+
+
+class TestConnect(TestCase):
+
+    def test_connect_applies_pragmas(self):
+        """Test every new connection gets the tuning profile"""
+        database = os.path.join(tempfile.mkdtemp(), "tune.db")
+        pragmas = {"busy_timeout": 2500, "journal_mode": "WAL",
+                   "synchronous": "NORMAL"}
+
+        conn = connect(database, pragmas)
+        active = get_pragmas(conn, pragmas)
+        conn.close()
+
+        self.assertEqual(active, {"busy_timeout": 2500, "journal_mode": "wal",
+                                  "synchronous": 1})
+
+
+
+class TestWriteTransaction(DatabaseCase):
+
+    def users(self):
+        return [row[0] for row in get_db().execute("SELECT id FROM users ORDER BY id")]
+
+    def add_user(self, db, user):
+        db.execute("INSERT INTO users (id, name, email, password) VALUES (?, ?, ?, '-')",
+                   (user, user, f"{user}@dev.com"))
+
+    def test_nested_transaction_rolls_back_alone(self):
+        """Test a failing inner write_transaction keeps the outer one's writes"""
+        with self.app.app_context():
+            with write_transaction() as db:
+                self.add_user(db, "outer")
+                with self.assertRaises(ValueError):
+                    with write_transaction():
+                        self.add_user(db, "inner")
+                        raise ValueError
+                with write_transaction():
+                    self.add_user(db, "kept")
+            self.assertEqual(self.users(), ["kept", "outer"])
+
+    def test_uncommitted_writes_are_not_committed(self):
+        """Test a write_transaction does not commit writes made before it"""
+        with self.app.app_context():
+            db = get_db()
+            # reads leave no writes to commit
+            db.execute("SELECT * FROM users").fetchall()
+            with write_transaction():
+                pass
+
+            self.add_user(db, "pending")
+            with self.assertRaises(TransactionError):
+                with write_transaction():
+                    pass
+            db.rollback()
+            self.assertEqual(self.users(), [])
+
+
+if __name__ == "__main__":
+    main(verbosity=2)
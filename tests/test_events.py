@@ -0,0 +1,91 @@
+"""Defines tests for the event bus"""
+import asyncio
+import os
+import socket
+import tempfile
+from unittest import TestCase, main, skipUnless
+
+from app.events import EventBus, ride_topic
+
+
+class TestEventBus(TestCase):
+
+    def test_subscribers_get_their_topics_events(self):
+        """Test events are delivered to the subscribers of their topic only"""
+        bus = EventBus()
+        got, other = [], []
+        unsubscribe = bus.subscribe(ride_topic(1), got.append)
+        bus.subscribe(ride_topic(2), other.append)
+
+        bus.publish(ride_topic(1), {"event": "request_created"})
+        unsubscribe()
+        bus.publish(ride_topic(1), {"event": "request_retracted"})
+
+        self.assertEqual(got, [{"event": "request_created"}])
+        self.assertEqual(other, [])
+        self.assertEqual(bus.stats()['subscribers'], 1)
+
+    def test_failing_subscriber(self):
+        """Test a failing subscriber does not stop delivery to the others"""
+        bus = EventBus()
+        got = []
+        bus.subscribe("ride-1", lambda event: 1 / 0)
+        bus.subscribe("ride-1", got.append)
+
+        with self.assertLogs('app.events', 'ERROR'):
+            bus.publish("ride-1", {"event": "request_created"})
+        self.assertEqual(got, [{"event": "request_created"}])
+
+    @skipUnless(hasattr(socket, 'AF_UNIX'), "needs UNIX sockets")
+    def test_events_reach_other_buses(self):
+        """Test events are sent to the buses listening in the directory"""
+        with tempfile.TemporaryDirectory() as directory:
+            publisher, listener = EventBus(directory), EventBus(directory)
+
+            async def receive():
+                loop = asyncio.get_running_loop()
+                listener.listen(loop)
+                got = loop.create_future()
+                listener.subscribe("ride-1", got.set_result)
+                publisher.publish("ride-1", {"event": "request_updated"})
+                try:
+                    return await asyncio.wait_for(got, 5)
+                finally:
+                    listener.close(loop)
+
+            self.assertEqual(asyncio.run(receive()), {"event": "request_updated"})
+            self.assertEqual(listener.stats()['received'], 1)
+            self.assertEqual(os.listdir(directory), [])
+
+            # sockets of workers that are gone are removed
+            stale = os.path.join(directory, "1-dead.sock")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(stale)
+            sock.close()
+            publisher.publish("ride-1", {"event": "request_created"})
+            self.assertFalse(os.path.exists(stale))
+
+    @skipUnless(hasattr(socket, 'AF_UNIX'), "needs UNIX sockets")
+    def test_buses_listening_later_are_found(self):
+        """Test the peers a bus sends to are listed again when they change"""
+        with tempfile.TemporaryDirectory() as directory:
+            publisher, listener = EventBus(directory), EventBus(directory)
+            publisher.publish("ride-1", {"event": "request_created"})
+
+            async def receive():
+                loop = asyncio.get_running_loop()
+                listener.listen(loop)
+                got = loop.create_future()
+                listener.subscribe("ride-1", got.set_result)
+                publisher.publish("ride-1", {"event": "request_updated"})
+                try:
+                    return await asyncio.wait_for(got, 5)
+                finally:
+                    listener.close(loop)
+
+            self.assertEqual(asyncio.run(receive()), {"event": "request_updated"})
+            self.assertEqual(publisher._get_peers(), ())
+
+
+if __name__ == '__main__':
+    main()
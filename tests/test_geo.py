@@ -0,0 +1,42 @@
+"""Defines tests for the geohash helpers"""
+
+from unittest import TestCase, main
+from app.geo import encode, covering_cells, distances_km
+
+
+class TestGeo(TestCase):
+
+    def test_encode(self):
+        """Test points are encoded to their geohash"""
+        self.assertEqual(encode(42.605, -5.603, 5), "ezs42")
+        self.assertEqual(encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_covering_cells(self):
+        """Test the cells around a point cover the search circle"""
+        cells = covering_cells(-1.2833, 36.8219, 5)
+        self.assertLessEqual(len(cells), 16)
+        self.assertEqual({len(cell) for cell in cells}, {5})
+        self.assertIn(encode(-1.2833, 36.8219, len(cells[0])), cells)
+
+        # points within the radius fall in one of the cells
+        for lat, lon in ((-1.2676, 36.8108), (-1.3280, 36.8219), (-1.2833, 36.8668)):
+            self.assertIn(encode(lat, lon, len(cells[0])), cells)
+
+        self.assertEqual(len(covering_cells(-1.2833, 36.8219, 100)[0]), 3)
+
+        # circles across the 180th meridian wrap around
+        cells = covering_cells(0.5, 179.99, 5)
+        self.assertIn(encode(0.5, -179.99, len(cells[0])), cells)
+
+    def test_distances(self):
+        """Test great circle distances"""
+        nairobi, mombasa = (-1.2833, 36.8219), (-4.0435, 39.6682)
+        distances = distances_km(*nairobi, [nairobi[0], mombasa[0]],
+                                 [nairobi[1], mombasa[1]])
+        self.assertAlmostEqual(distances[0], 0)
+        self.assertAlmostEqual(distances[1], 440, delta=5)
+        self.assertEqual(distances_km(0, 0, [], []), [])
+
+
+if __name__ == '__main__':
+    main()
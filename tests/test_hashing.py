@@ -0,0 +1,75 @@
+"""Defines tests for password hashing"""
+
+import threading
+from unittest import TestCase, main
+from app.hashing import PasswordHasher, HashingBusy
+
+
+class TestPasswordHasher(TestCase):
+
+    def setUp(self):
+        self.hasher = PasswordHasher("pbkdf2:sha256", rounds=1000, workers=1,
+                                     queue_size=0, timeout=0.05)
+
+    def test_hash_and_verify(self):
+        """Test a hash verifies its password only"""
+        password_hash = self.hasher.hash("12345dfgh")
+
+        self.assertTrue(password_hash.startswith("pbkdf2:sha256:1000$"))
+        self.assertTrue(self.hasher.verify(password_hash, "12345dfgh"))
+        self.assertFalse(self.hasher.verify(password_hash, "12345dfgx"))
+
+    def test_needs_rehash(self):
+        """Test hashes of another cost or method need a rehash"""
+        password_hash = self.hasher.hash("12345dfgh")
+        self.assertFalse(self.hasher.needs_rehash(password_hash))
+
+        stronger = PasswordHasher("pbkdf2:sha256", rounds=2000)
+        self.assertTrue(stronger.needs_rehash(password_hash))
+        self.assertTrue(stronger.verify(password_hash, "12345dfgh"))
+
+    def test_busy_hasher_rejects(self):
+        """Test callers get HashingBusy when every slot is taken"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow(*args):
+            started.set()
+            release.wait()
+
+        worker = threading.Thread(target=self.hasher._run, args=(slow,))
+        worker.start()
+        started.wait()
+        try:
+            with self.assertRaises(HashingBusy) as busy:
+                self.hasher.hash("12345dfgh")
+            self.assertEqual(busy.exception.code, 503)
+            self.assertIn(("Retry-After", "1"), busy.exception.get_headers())
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual(self.hasher.stats()['rejected'], 1)
+        self.assertTrue(self.hasher.hash("12345dfgh"))
+
+    def test_counts_concurrent_hashes(self):
+        """Test every hash and check of concurrent callers is counted"""
+        hasher = PasswordHasher("pbkdf2:sha256", rounds=1, workers=4, queue_size=32)
+        password_hash = hasher.hash("12345dfgh")
+
+        def call():
+            for _ in range(50):
+                hasher.hash("12345dfgh")
+                hasher.verify(password_hash, "12345dfgh")
+
+        callers = [threading.Thread(target=call) for _ in range(8)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(hasher.stats()['hashes'], 401)
+        self.assertEqual(hasher.stats()['checks'], 400)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Defines tests for the request metrics"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from app import metrics as metrics_module
+from app.metrics import Metrics, RETIRED
+from tests.basetest import DatabaseCase
+
+
+def sample(text, name):
+    """Get the value of a sample of the Prometheus text"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+
+
+class TestMetrics(TestCase):
+
+    def test_render(self):
+        """Test requests are counted and their latency is bucketed"""
+        metrics = Metrics(buckets=(0.01, 0.1))
+        metrics.record("view_ride", "GET", 200, 0.005, statements=2, sql_seconds=0.001)
+        metrics.record("view_ride", "GET", 200, 0.05, statements=1, sql_seconds=0.002)
+        metrics.record("view_ride", "GET", 404, 0.5)
+        text = metrics.render()
+
+        self.assertEqual(sample(text, 'ridemyway_http_requests_total{endpoint="view_ride",'
+                                      'method="GET",status="200"}'), 2)
+        bucket = 'ridemyway_http_request_duration_seconds_bucket{endpoint="view_ride",le="%s"}'
+        self.assertEqual([sample(text, bucket % le) for le in ("0.01", "0.1", "+Inf")],
+                         [1, 2, 3])
+        self.assertEqual(sample(text, 'ridemyway_http_request_duration_seconds_count'
+                                      '{endpoint="view_ride"}'), 3)
+        self.assertEqual(sample(text, 'ridemyway_sql_statements_total{endpoint="view_ride"}'), 3)
+        self.assertAlmostEqual(sample(text, 'ridemyway_sql_seconds_total'
+                                            '{endpoint="view_ride"}'), 0.003)
+
+    def test_workers_are_added_up(self):
+        """Test the metrics of every worker writing to the directory are served"""
+        with tempfile.TemporaryDirectory() as directory:
+            workers = [Metrics((0.1,), directory, flush_interval=60) for _ in range(2)]
+            workers[0].record("login", "POST", 200, 0.05)
+            workers[1].record("login", "POST", 200, 0.02)
+            workers[1].flush()
+
+            text = workers[0].render()
+        self.assertEqual(sample(text, 'ridemyway_http_requests_total{endpoint="login",'
+                                      'method="POST",status="200"}'), 2)
+
+    def test_exited_workers_are_retired(self):
+        """Test the files of exited workers are folded into one"""
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            worker = Metrics((0.1,), directory, flush_interval=60)
+            worker.record("login", "POST", 200, 0.05)
+            for n in range(2):
+                old = Metrics((0.1,), directory, flush_interval=60)
+                old.record("login", "POST", 200, 0.02)
+                old._path = os.path.join(directory, f"{exited.pid}-{n}.json")
+                old.flush()
+
+                text = worker.render()
+                self.assertEqual(sample(text, 'ridemyway_http_requests_total{endpoint="login",'
+                                              'method="POST",status="200"}'), 2 + n)
+            self.assertEqual(sorted(name for name in os.listdir(directory)
+                                    if name.endswith(".json")),
+                             sorted([os.path.basename(worker._path), RETIRED]))
+
+    def test_exited_workers_are_kept_without_fcntl(self):
+        """Test the files of exited workers are added up where fcntl is missing"""
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(metrics_module, "fcntl", None):
+            worker = Metrics((0.1,), directory, flush_interval=60)
+            old = Metrics((0.1,), directory, flush_interval=60)
+            old.record("login", "POST", 200, 0.02)
+            old._path = os.path.join(directory, f"{exited.pid}-0.json")
+            old.flush()
+
+            text = worker.render()
+            self.assertEqual(sample(text, 'ridemyway_http_requests_total{endpoint="login",'
+                                          'method="POST",status="200"}'), 1)
+            self.assertTrue(os.path.exists(old._path))
+
+
+class TestMetricsEndpoint(DatabaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def test_requests_are_recorded(self):
+        """Test /metrics reports the requests served and their SQL statements"""
+        user = {"name": "Bob Rider", "email": "bobrider@dev.com", "password": "12345dfgh"}
+        response = self.client.post('/api/v1/auth/signup', data=json.dumps(user),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/metrics')
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.get_data(as_text=True)
+
+        match = re.search(r'ridemyway_http_requests_total\{endpoint="([^"]+)",'
+                          r'method="POST",status="201"\} 1', text)
+        self.assertTrue(match, text)
+        statements = sample(text, f'ridemyway_sql_statements_total{{endpoint="{match[1]}"}}')
+        self.assertGreaterEqual(statements, 2)
+
+
+if __name__ == '__main__':
+    main()
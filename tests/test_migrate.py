@@ -0,0 +1,63 @@
+"""Defines tests for the schema migrations"""
+
+from unittest import TestCase, main
+from app.storage.sqlite import connect
+from app.migrate import upgrade, downgrade, status, applied_versions, \
+                        load_migrations, parse_migration, MigrationError
+
+
+class TestMigrations(TestCase):
+
+    def setUp(self):
+        self.db = connect(":memory:")
+
+    def tearDown(self):
+        self.db.close()
+
+    def index_names(self):
+        query = "SELECT name FROM sqlite_master WHERE type='index'"
+        return [row[0] for row in self.db.execute(query).fetchall()]
+
+    def test_upgrade_applies_all_migrations(self):
+        """Test upgrade records every migration as applied"""
+        applied = upgrade(self.db)
+
+        versions = [migration.version for migration in load_migrations()]
+        self.assertEqual([migration.version for migration in applied], versions)
+        self.assertEqual(applied_versions(self.db), versions)
+        self.assertIn("ux_requests_ride_user", self.index_names())
+
+        self.assertEqual(upgrade(self.db), [])
+
+    def test_downgrade_keeps_data(self):
+        """Test reverting the index migration does not touch the rows"""
+        upgrade(self.db)
+        self.db.execute("INSERT INTO requests (ride_id, user_id, destination) "
+                        "VALUES (1, 'bob', 'Voi')")
+        self.db.commit()
+
+        downgrade(self.db, target=1)
+
+        self.assertNotIn("ux_requests_ride_user", self.index_names())
+        count = self.db.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+        self.assertEqual(count, 1)
+        self.assertEqual([applied for _, applied in status(self.db)][:2],
+                         [True, False])
+
+    def test_failed_migration_is_rolled_back(self):
+        """Test a failing migration leaves no trace"""
+        broken = parse_migration(99, "broken", """
+            -- upgrade
+            CREATE TABLE half_done(a);
+            INSERT INTO no_such_table VALUES (1);
+        """)
+
+        self.assertRaises(MigrationError, upgrade, self.db, None, [broken])
+        self.assertEqual(applied_versions(self.db), [])
+        tables = self.db.execute("SELECT name FROM sqlite_master "
+                                 "WHERE name='half_done'").fetchall()
+        self.assertEqual(tables, [])
+
+
+if __name__ == "__main__":
+    main(verbosity=2)
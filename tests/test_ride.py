@@ -1,9 +1,13 @@
 from unittest import main
 import json
+import gzip
+import tracemalloc
 from datetime import datetime, timedelta
 
-from app import create_app
-from app.db import initialize, close_db, get_db
+from app.core import create_app
+from app.db import initialize, close_db, get_db, add_query_observer
+from app.data.ride_data import iter_rides, rides_query
+from app.models import Ride
 from tests.basetest import TestBase
 
 class RideCase(TestBase):
@@ -52,7 +56,7 @@ class RideCase(TestBase):
             initialize() # create all tables
 
         # create User
-        self.client.post('/api/v1/auth/register', 
+        self.client.post('/api/v1/auth/signup', 
                             data=json.dumps(self.ride_user), 
                             content_type='application/json')
         
@@ -70,7 +74,7 @@ class RideCase(TestBase):
         # new User
         self.client.post('/api/v1/auth/logout', content_type='application/json')
 
-        self.client.post('/api/v1/auth/register', data=json.dumps(self.ride_pass), 
+        self.client.post('/api/v1/auth/signup', data=json.dumps(self.ride_pass), 
                             headers=self.my_headers)
         
         
@@ -90,9 +94,9 @@ class RideCase(TestBase):
             db = get_db()
             # Drop all the tables
             cursor = db.cursor()
-            cursor.execute("DROP TABLE users")
-            cursor.execute("DROP TABLE rides")
             cursor.execute("DROP TABLE requests")
+            cursor.execute("DROP TABLE rides")
+            cursor.execute("DROP TABLE users")
             db.commit()
             cursor.close()
             db.close()
@@ -160,6 +164,98 @@ class RideCase(TestBase):
 
         self.assert409(response)
 
+    def test_creating_later_ride(self):
+        """Test user can create rides that do not overlap
+
+        Assert that a valid POST request to /api/v1/users/rides
+        for a ride departing after the user's current ride arrives
+        creates the ride.
+        """
+        first = self.create_rides(1)[0]
+
+        depart_time = datetime.strptime(first['eta'], "%d-%m-%Y %H:%M") \
+            + timedelta(hours=1)
+        later_ride = dict(first,
+                          depart_time=depart_time.strftime("%d-%m-%Y %H:%M"),
+                          eta=(depart_time + timedelta(hours=2)).strftime("%d-%m-%Y %H:%M"))
+        response = self.client.post('/api/v1/users/rides', data=json.dumps(later_ride),
+                                    headers=self.my_headers)
+        self.assert201(response)
+
+    def test_rides_in_time_window(self):
+        """Test user can find rides departing in a time window
+
+        Assert that GET /api/v1/rides with departs_after and
+        departs_before returns the rides departing in between,
+        across months.
+        """
+        for depart_time, eta in (("31-01-2031 10:00", "31-01-2031 12:00"),
+                                 ("01-02-2031 10:00", "01-02-2031 12:00")):
+            ride = dict(self.test_ride, seats=4, depart_time=depart_time, eta=eta)
+            response = self.client.post('/api/v1/users/rides', data=json.dumps(ride),
+                                        headers=self.my_headers)
+            self.assert201(response)
+
+        response = self.client.get('/api/v1/rides?departs_after=15-01-2031 00:00'
+                                   '&departs_before=15-02-2031 00:00',
+                                   headers=self.my_headers)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual(len(rides), 2)
+
+        response = self.client.get('/api/v1/rides?departs_before=01-02-2031 00:00',
+                                   headers=self.my_headers)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual([ride['depart_time'] for ride in rides], ["31-01-2031 10:00"])
+
+    def test_create_rides_in_batch(self):
+        """Test user can create many rides at once
+
+        Assert that POST /api/v1/users/rides/batch creates the
+        valid rides and reports each ride's result.
+        """
+        def ride_at(days, **details):
+            depart_time = datetime.now() + timedelta(days=days)
+            eta = depart_time + timedelta(hours=2)
+            return dict(self.test_ride, seats=4,
+                        depart_time=depart_time.strftime("%d-%m-%Y %H:%M"),
+                        eta=eta.strftime("%d-%m-%Y %H:%M"), **details)
+
+        rides = [ride_at(1), ride_at(2), ride_at(1, destination="Voi"),
+                 ride_at(3, vehicle="")]
+        response = self.client.post('/api/v1/users/rides/batch',
+                                    data=json.dumps({"rides": rides}),
+                                    headers=self.my_headers)
+        self.assertEqual(response.status_code, 207)
+        results = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual([result['status'] for result in results],
+                         [201, 201, 409, 400])
+        self.assertIn('vehicle', results[3]['errors'])
+
+        for ride, result in zip(rides[:2], results):
+            response = self.client.get(result['view_ride'], headers=self.my_headers)
+            self.assert200(response)
+            self.assertEqual(json.loads(response.get_data(as_text=True))['depart_time'],
+                             ride['depart_time'])
+
+        # rides already in the schedule are checked too
+        response = self.client.post('/api/v1/users/rides/batch',
+                                    data=json.dumps({"rides": [ride_at(2), ride_at(4)]}),
+                                    headers=self.my_headers)
+        self.assertEqual(response.status_code, 207)
+
+        response = self.client.post('/api/v1/users/rides/batch',
+                                    data=json.dumps({"rides": [ride_at(5), ride_at(6)]}),
+                                    headers=self.my_headers)
+        self.assert201(response)
+
+        response = self.client.get('/api/v1/rides', headers=self.my_headers)
+        self.assertEqual(len(json.loads(response.get_data(as_text=True))['rides']), 5)
+
+        response = self.client.post('/api/v1/users/rides/batch',
+                                    data=json.dumps({"rides": []}),
+                                    headers=self.my_headers)
+        self.assert400(response)
+
     def test_get_available_rides(self):
         """Test user can view all available rides
 
@@ -170,6 +266,188 @@ class RideCase(TestBase):
         
         self.assert200(response)
     
+    def create_rides(self, count, headers=None, **details):
+        """create count rides departing a day apart
+        """
+        created = []
+        for days in range(count, 0, -1):
+            depart_time = datetime.now() + timedelta(days=days)
+            eta = depart_time + timedelta(hours=2)
+            ride = dict(self.test_ride, seats=4,
+                        depart_time=depart_time.strftime("%d-%m-%Y %H:%M"),
+                        eta=eta.strftime("%d-%m-%Y %H:%M"))
+            ride.update(details)
+            response = self.client.post('/api/v1/users/rides', data=json.dumps(ride),
+                                        headers=headers or self.my_headers)
+            self.assert201(response)
+            created.append(ride)
+        return created
+
+    def test_get_rides_in_pages(self):
+        """Test user can page through available rides
+
+        Assert that GET requests to /api/v1/rides following
+        the next cursor return every ride once.
+        """
+        self.create_rides(3)
+
+        response = self.client.get('/api/v1/rides?limit=2', headers=self.my_headers)
+        self.assert200(response)
+        page = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(page['rides']), 2)
+        self.assertTrue(page['next'])
+
+        response = self.client.get('/api/v1/rides?limit=2&cursor=' + page['next'],
+                                   headers=self.my_headers)
+        self.assert200(response)
+        last_page = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(last_page['rides']), 1)
+        self.assertIsNone(last_page['next'])
+
+        ids = [ride['id'] for ride in page['rides'] + last_page['rides']]
+        self.assertEqual(len(set(ids)), 3)
+
+        response = self.client.get('/api/v1/rides?cursor=not-a-cursor',
+                                   headers=self.my_headers)
+        self.assert400(response)
+
+    def test_stream_rides(self):
+        """Test user can stream all available rides
+
+        Assert that GET /api/v1/rides with Accept: application/x-ndjson
+        returns every ride as a line of JSON.
+        """
+        self.create_rides(3)
+
+        headers = dict(self.my_headers, Accept='application/x-ndjson')
+        response = self.client.get('/api/v1/rides', headers=headers)
+        self.assert200(response)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+        lines = response.get_data(as_text=True).splitlines()
+        rides = [json.loads(line) for line in lines]
+        self.assertEqual(len(rides), 3)
+        self.assertEqual([ride['id'] for ride in rides],
+                         sorted(ride['id'] for ride in rides))
+
+        response = self.client.get('/api/v1/rides?stream=1&limit=2',
+                                   headers=self.my_headers)
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+
+    def test_streaming_memory_is_bounded(self):
+        """Test streaming rides does not hold them all in memory
+
+        Assert that iterating over 20000 rides with iter_rides peaks
+        under 1MB, below what fetching them at once takes.
+        """
+        with self.app.app_context():
+            db = get_db()
+            driver = db.execute("SELECT id FROM users").fetchone()[0]
+            depart = datetime.now() + timedelta(days=1)
+            db.executemany(Ride.INSERT, [
+                ("Nairobi", "Voi", depart + timedelta(hours=3 * n),
+                 depart + timedelta(hours=3 * n + 2), 4, "KCH 001", driver,
+                 None, None, None) for n in range(20000)])
+            db.commit()
+
+            tracemalloc.start()
+            try:
+                streamed = sum(1 for _ in iter_rides())
+                stream_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+                query, params = rides_query()
+                fetched = len(db.execute(query, params).fetchall())
+                fetch_peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertEqual(streamed, fetched)
+        self.assertEqual(streamed, 20000)
+        self.assertLess(stream_peak, 1024 * 1024)
+        self.assertLess(stream_peak, fetch_peak)
+
+    def test_filter_rides(self):
+        """Test user can filter available rides
+
+        Assert that GET /api/v1/rides with filters returns
+        only the matching rides.
+        """
+        rides = self.create_rides(3, destination="Voi")
+
+        response = self.client.get('/api/v1/rides?destination=Voi&seats=4'
+                                   '&departs_after=' + rides[1]['depart_time'],
+                                   headers=self.my_headers)
+        self.assert200(response)
+        found = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual(sorted(ride['depart_time'] for ride in found),
+                         sorted(ride['depart_time'] for ride in rides[:2]))
+
+        response = self.client.get('/api/v1/rides?destination=Mombasa',
+                                   headers=self.my_headers)
+        self.assertEqual(json.loads(response.get_data(as_text=True))['rides'], [])
+
+    def test_search_rides(self):
+        """Test user can search rides by town
+
+        Assert that GET /api/v1/rides/search?q= returns the rides
+        whose starting point or destination match the words.
+        """
+        self.create_rides(1, starting_point="Nairobi-Kencom", destination="Voi")
+        self.create_rides(1, headers=self.pass_headers,
+                          starting_point="Mombasa", destination="Malindi")
+
+        response = self.client.get('/api/v1/rides/search?q=kenc',
+                                   headers=self.my_headers)
+        self.assert200(response)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual([ride['destination'] for ride in rides], ["Voi"])
+
+        response = self.client.get('/api/v1/rides/search?q=mom mal',
+                                   headers=self.my_headers)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual([ride['starting_point'] for ride in rides], ["Mombasa"])
+
+        response = self.client.get('/api/v1/rides/search?q=Kisumu',
+                                   headers=self.my_headers)
+        self.assertEqual(json.loads(response.get_data(as_text=True))['rides'], [])
+
+    def test_nearby_rides(self):
+        """Test user can find rides starting near them
+
+        Assert that GET /api/v1/rides/nearby returns the rides
+        within the radius, nearest first.
+        """
+        # Kencom, Westlands (about 3.5km away) and Mombasa
+        self.create_rides(1, start_lat=-1.2841, start_lon=36.8235)
+        self.create_rides(1, headers=self.pass_headers, starting_point="Westlands",
+                          start_lat=-1.2676, start_lon=36.8108)
+        self.create_rides(1, headers=self.pass_headers, starting_point="Mombasa",
+                          depart_time=(datetime.now() + timedelta(days=3)).strftime("%d-%m-%Y %H:%M"),
+                          eta=(datetime.now() + timedelta(days=3, hours=2)).strftime("%d-%m-%Y %H:%M"),
+                          start_lat=-4.0435, start_lon=39.6682)
+
+        response = self.client.get('/api/v1/rides/nearby?lat=-1.2833&lon=36.8219&radius=5',
+                                   headers=self.my_headers)
+        self.assert200(response)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual([ride['starting_point'] for ride in rides],
+                         ["Nairobi-Kencom", "Westlands"])
+        self.assertLess(rides[0]['distance_km'], rides[1]['distance_km'])
+
+        response = self.client.get('/api/v1/rides/nearby?lat=-1.2833&lon=36.8219&radius=1',
+                                   headers=self.my_headers)
+        rides = json.loads(response.get_data(as_text=True))['rides']
+        self.assertEqual(len(rides), 1)
+
+        response = self.client.get('/api/v1/rides/nearby?lat=91&lon=36.8',
+                                   headers=self.my_headers)
+        self.assert400(response)
+
+        response = self.client.post('/api/v1/users/rides', headers=self.my_headers,
+                                    data=json.dumps(dict(self.test_ride, seats=4,
+                                                         start_lat=-1.28)))
+        self.assert400(response)
+
     def test_get_a_specific_ride(self):
         """Test user can view a specific ride
 
@@ -221,6 +499,131 @@ class RideCase(TestBase):
 
         self.assertEqual(updated_data['seats'], ride_update['seats'])
         
+    def test_ride_changed_by_other_worker(self):
+        """Test a cached ride is refreshed after another worker changes it
+
+        Assert that GET /api/v1/rides/<rideId> serves the ride another
+        app writes to the database once the caches sync.
+        """
+        response = self.create_ride(10)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+        self.assertEqual(self.seats_left(ride_link), 10)
+
+        other_worker = create_app("test")
+        with other_worker.app_context():
+            db = get_db()
+            db.execute("UPDATE rides SET seats=6")
+            db.commit()
+
+        self.app.extensions['cache_watch'].interval = 0
+        self.assertEqual(self.seats_left(ride_link), 6)
+        self.assertEqual(self.seats_left(ride_link), 6)
+
+        response = self.client.get('/api/v1/stats', headers=self.my_headers)
+        caches = json.loads(response.get_data(as_text=True))['caches']
+        self.assertGreater(caches['ride']['hits'], 0)
+        self.assertEqual(caches['sync']['clears'], 1)
+        
+    def test_conditional_get_ride(self):
+        """Test clients can revalidate a ride with its ETag
+
+        Assert that GET /api/v1/rides/<rideId> with a current
+        If-None-Match returns 304, and 200 once the ride changed.
+        """
+        response = self.create_ride(4)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+
+        response = self.client.get(ride_link, headers=self.my_headers)
+        etag = response.headers['ETag']
+        self.assertTrue(etag)
+
+        headers = dict(self.my_headers, **{'If-None-Match': etag})
+        response = self.client.get(ride_link, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+
+        # a join request changes the ride's version
+        self.client.post('%s/requests' %ride_link, data=json.dumps({"destination": "Voi"}),
+                         headers=self.pass_headers)
+        response = self.client.get(ride_link, headers=headers)
+        self.assert200(response)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_conditional_get_rides(self):
+        """Test clients can revalidate ride listings with their ETag
+
+        Assert that GET /api/v1/rides with a current If-None-Match
+        returns 304 until a ride is created.
+        """
+        self.create_rides(1)
+
+        response = self.client.get('/api/v1/rides', headers=self.my_headers)
+        headers = dict(self.my_headers, **{'If-None-Match': response.headers['ETag']})
+
+        statements = []
+        add_query_observer(self.app, lambda query, params, seconds:
+                           statements.append(query))
+        response = self.client.get('/api/v1/rides', headers=headers)
+        self.assertEqual(response.status_code, 304)
+        # only the counter is read
+        self.assertEqual([query for query in statements if "rides" in query],
+                         ["SELECT version FROM change_counters WHERE name='rides'"])
+
+        self.create_rides(1, headers=self.pass_headers)
+        response = self.client.get('/api/v1/rides', headers=headers)
+        self.assert200(response)
+        self.assertEqual(len(json.loads(response.get_data(as_text=True))['rides']), 2)
+
+    def test_compressed_rides(self):
+        """Test large responses are compressed for clients that accept it
+
+        Assert that GET /api/v1/rides is gzip compressed when asked
+        to, and that small or unasked for responses are not.
+        """
+        self.create_rides(8)
+
+        response = self.client.get('/api/v1/rides', headers=self.my_headers)
+        self.assert200(response)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        body = response.get_data()
+
+        headers = dict(self.my_headers, **{'Accept-Encoding': 'gzip, deflate'})
+        response = self.client.get('/api/v1/rides', headers=headers)
+        self.assert200(response)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.get_data()), body)
+        self.assertLess(int(response.headers['Content-Length']), len(body))
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+
+        headers['If-None-Match'] = response.headers['ETag']
+        response = self.client.get('/api/v1/rides', headers=headers)
+        self.assertEqual(response.status_code, 304)
+
+        del headers['If-None-Match']
+        response = self.client.get('/api/v1/rides?limit=1', headers=headers)
+        self.assert200(response)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_verified_tokens_are_cached(self):
+        """Test an access token is verified once per worker
+
+        Assert that requests reusing a token are served from
+        the tokens cache and that a tampered token is rejected.
+        """
+        for _ in range(3):
+            self.assert200(self.client.get('/api/v1/rides', headers=self.my_headers))
+
+        response = self.client.get('/api/v1/stats', headers=self.my_headers)
+        tokens = json.loads(response.get_data(as_text=True))['caches']['tokens']
+        self.assertEqual(tokens['size'], 1)
+        self.assertGreaterEqual(tokens['hits'], 3)
+
+        signed = self.my_headers['Authorization'].rsplit('.', 1)[0]
+        tampered = dict(self.my_headers, Authorization=signed + '.' + 'A' * 43)
+        response = self.client.get('/api/v1/users/rides/1/requests', headers=tampered)
+        self.assertEqual(response.status_code, 422)
+
     def test_ride_not_found(self):
        """Test user cannot fetch a non existent ride
 
@@ -253,10 +656,21 @@ class RideCase(TestBase):
         
         self.assert201(response)
 
+        # a second request to the same ride
+        response = self.client.post('%s/requests' %data['view_ride'], 
+                                    data=json.dumps(ride_request), 
+                                    headers=self.pass_headers)
+        self.assert409(response)
+
+        response = self.client.post('/api/v1/rides/999/requests', 
+                                    data=json.dumps(ride_request), 
+                                    headers=self.pass_headers)
+        self.assert404(response)
+
     def test_retract_ride_in_request(self):
         """Test user can retract request to join a ride
 
-        Assert that a valid DELETE request to/api/v1/rides/<rideId>/requests
+        Assert that a valid DELETE request to /api/v1/users/rides/<rideId>/requests
         removes/retracts a request to join a ride.
         """
          # create ride
@@ -275,12 +689,17 @@ class RideCase(TestBase):
         self.assert201(response)
 
         # retract request
-        response = self.client.delete('%s/requests' %data['view_ride'], 
-                                        headers=self.my_headers)
+        # "/api/v1/rides/rideId"
+        link = data['view_ride'].replace("/api/v1/rides", "/api/v1/users/rides")
+        response = self.client.delete('%s/requests' %link, 
+                                        headers=self.pass_headers)
         self.assert200(response)
         message = json.loads(response.get_data(as_text=True))['message']
         self.assertEqual(message, "You have retracted request to join ride")
 
+        response = self.client.get('%s/requests' %link, headers=self.my_headers)
+        self.assertEqual(json.loads(response.get_data(as_text=True)), {})
+
     def test_viewing_requests(self):
         """Test user:driver can view Requests
 
@@ -316,70 +735,155 @@ class RideCase(TestBase):
         print(response.status_code)                    
         self.assert401(response)
 
-    # def test_accept_ride_in_request(self):
-    #     """Test user:driver can accept request to join ride
+    def make_ride_request(self, ride_link, headers=None):
+        """request to join a ride, returns the request link
+        """
+        response = self.client.post('%s/requests' %ride_link,
+                                    data=json.dumps({"destination": "Voi"}),
+                                    headers=headers or self.pass_headers)
+        self.assert201(response)
+        return json.loads(response.get_data(as_text=True))['view_request']
 
-    #     Assert that a valid PUT request to 
-    #     /api/v1/users/rides/<rideId>/requests/<requestId>
-    #     accepts a join request making requester a passenger.
-    #     """
+    def seats_left(self, ride_link):
+        response = self.client.get(ride_link, headers=self.my_headers)
+        return json.loads(response.get_data(as_text=True))['seats']
 
-    #     # create ride 
-    #     response = self.create_ride(4)
-    #     ride_link = json.loads(response.get_data(as_text=True))['view_ride']
-    #     # "/api/v1/rides/rideId"
-        
-    #     # make ride in request
-    #     ride_request={
-    #         "destination": "Voi"
-    #     }
-
-    #      # "/api/v1/rides/rideId/requests"
-    #     response = self.client.post('%s/requests' %ride_link, 
-    #                                 data=json.dumps(ride_request), 
-    #                                 headers=self.pass_headers)
-    
-    #     request_link = json.loads(response.get_data(as_text=True))['view_request']
-        
-    #     # /api/v1/users/rides/rideId/requests/requestId
-    #     # accept request
-    #     response = self.client.put(request_link, data=json.dumps({'action': 'accepted'}), 
-    #                                 headers=self.my_headers)
-    #     print(response.status_code)
-    #     # self.assert200(response)
-        # message = json.loads(response.get_data(as_text=True))['message']
-
-        # self.assertEqual(message, "Ride Request has been 'accepted'")
-
-    # def test_reject_ride_in_request(self):
-    #     """Test user:driver can reject a ride request
-
-    #     Assert that a valid PUT request to /api/v1/rides/<rideId>/requests/<number>
-    #     rejects a ride requests.
-    #     """
-    #     # create ride 
-    #     response = self.create_ride(2)
-        
-    #     # make ride in request
-    #     ride_request={
-    #         "destination": "Voi"
-    #     }
+    def test_accept_ride_in_request(self):
+        """Test user:driver can accept request to join ride
 
-    #     ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+        Assert that a valid PUT request to 
+        /api/v1/users/rides/<rideId>/requests/<requestId>
+        accepts a join request making requester a passenger.
+        """
 
-    #     response = self.client.post('%s/requests' %ride_link, 
-    #                                 data=json.dumps(ride_request), 
-    #                                 headers=self.pass_headers)
+        # create ride 
+        response = self.create_ride(4)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+        # "/api/v1/rides/rideId"
         
-    #     request_link = json.loads(response.get_data(as_text=True))['view_request']
+        # /api/v1/users/rides/rideId/requests/requestId
+        request_link = self.make_ride_request(ride_link)
+
+        # accept request
+        response = self.client.put(request_link, data=json.dumps({'action': 'accepted'}), 
+                                    headers=self.my_headers)
+        self.assert200(response)
+        message = json.loads(response.get_data(as_text=True))['message']
+
+        self.assertEqual(message, "Ride Request has been 'accepted'")
+        self.assertEqual(self.seats_left(ride_link), 3)
+
+        # accepting again changes nothing
+        response = self.client.put(request_link, data=json.dumps({'action': 'accepted'}), 
+                                    headers=self.my_headers)
+        self.assert409(response)
+        self.assertEqual(self.seats_left(ride_link), 3)
+
+        # only the driver can accept
+        response = self.client.put(request_link, data=json.dumps({'action': 'rejected'}), 
+                                    headers=self.pass_headers)
+        self.assert401(response)
+
+    def test_update_keeps_accepted_seats(self):
+        """Test updating a ride does not give away accepted seats
+
+        Assert that a PUT request to /api/v1/users/rides/<rideId> leaves
+        the ride its seats minus the accepted requests and that fewer
+        seats than accepted requests are refused.
+        """
+        response = self.create_ride(4)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+        request_link = self.make_ride_request(ride_link)
+        response = self.client.put(request_link, data=json.dumps({'action': 'accepted'}),
+                                    headers=self.my_headers)
+        self.assert200(response)
+
+        update_link = ride_link.replace("/api/v1/rides", "/api/v1/users/rides")
+        ride_update = dict(self.test_ride, seats=4)
+        response = self.client.put(update_link, data=json.dumps(ride_update),
+                                    headers=self.my_headers)
+        self.assert200(response)
+        self.assertEqual(self.seats_left(ride_link), 3)
+
+        ride_update["seats"] = 0
+        response = self.client.put(update_link, data=json.dumps(ride_update),
+                                    headers=self.my_headers)
+        self.assert409(response)
+        self.assertEqual(self.seats_left(ride_link), 3)
+
+    def test_reject_ride_in_request(self):
+        """Test user:driver can reject a ride request
+
+        Assert that a valid PUT request to /api/v1/rides/<rideId>/requests/<number>
+        rejects a ride requests.
+        """
+        # create ride 
+        response = self.create_ride(2)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+
+        request_link = self.make_ride_request(ride_link)
 
-    #     # Reject request
-    #     response = self.client.put(request_link, data=json.dumps({'action':"rejected"}),
-    #                     headers=self.my_headers)
+        # Reject request
+        response = self.client.put(request_link, data=json.dumps({'action':"rejected"}),
+                        headers=self.my_headers)
 
-    #     message = json.loads(response.get_data(as_text=True))['message']
+        message = json.loads(response.get_data(as_text=True))['message']
+
+        self.assertEqual(message, "Ride Request has been 'rejected'")
+        self.assertEqual(self.seats_left(ride_link), 2)
+
+        # rejecting an accepted request gives its seat back
+        self.client.put(request_link, data=json.dumps({'action':"accepted"}),
+                        headers=self.my_headers)
+        self.assertEqual(self.seats_left(ride_link), 1)
+        self.client.put(request_link, data=json.dumps({'action':"rejected"}),
+                        headers=self.my_headers)
+        self.assertEqual(self.seats_left(ride_link), 2)
+
+    def test_accept_request_on_full_ride(self):
+        """Test a ride can not be overbooked
+
+        Assert that accepting a request on a ride with no seats
+        left fails and retracting an accepted request frees its seat.
+        """
+        response = self.create_ride(1)
+        ride_link = json.loads(response.get_data(as_text=True))['view_ride']
+
+        other = {"name": "Bob Other", "email": "bobother@dev.com",
+                 "password": "12345dfghqwyx"}
+        self.client.post('/api/v1/auth/signup', data=json.dumps(other),
+                         headers=self.my_headers)
+        self.client.post('/api/v1/auth/logout', content_type='application/json')
+        response = self.client.post('/api/v1/auth/login', headers=self.my_headers,
+                                    data=json.dumps({"email": other["email"],
+                                                     "password": other["password"]}))
+        token = json.loads(response.get_data(as_text=True))['access_token']
+        other_headers = dict(self.pass_headers, Authorization='Bearer ' + token)
+
+        first = self.make_ride_request(ride_link)
+        second = self.make_ride_request(ride_link, other_headers)
+
+        response = self.client.put(first, data=json.dumps({'action': 'accepted'}),
+                                   headers=self.my_headers)
+        self.assert200(response)
+        response = self.client.put(second, data=json.dumps({'action': 'accepted'}),
+                                   headers=self.my_headers)
+        self.assert409(response)
+        self.assertEqual(self.seats_left(ride_link), 0)
+
+        # the first passenger retracts, freeing the seat
+        response = self.client.delete(first.rsplit('/', 1)[0], headers=self.pass_headers)
+        self.assert200(response)
+        self.assertEqual(self.seats_left(ride_link), 1)
+
+        response = self.client.put(second, data=json.dumps({'action': 'accepted'}),
+                                   headers=self.my_headers)
+        self.assert200(response)
 
-    #     self.assertEqual(message, "Ride Request has been 'rejected'")
+        response = self.client.put(ride_link.replace('/rides/', '/users/rides/') + '/requests/999',
+                                   data=json.dumps({'action': 'accepted'}),
+                                   headers=self.my_headers)
+        self.assert404(response)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+"""Defines tests for compiled payload schemas"""
+
+from datetime import datetime
+from unittest import TestCase, main
+from app.schema import Schema, String, Email, Password, Integer, Number, \
+    FutureDateTime, Choice, Field, both_or_neither, MISSING
+
+
+class TestSchema(TestCase):
+
+    now = datetime(2030, 1, 1, 12, 0)
+
+    schema = Schema("Test", {
+        "name": String(),
+        "email": Email(),
+        "password": Password(min_length=8),
+        "seats": Integer(),
+        "depart_time": FutureDateTime(),
+        "action": Choice(("rejected", "accepted")),
+        "lat": Number(-90, 90, required=False),
+        "lon": Number(-180, 180, required=False)
+    }, checks=[both_or_neither("lat", "lon")])
+
+    valid = {
+        "name": "Bob Rider",
+        "email": "bob@dev.com",
+        "password": "12345dfgh",
+        "seats": "4",
+        "depart_time": "02-01-2030 08:30",
+        "action": "Accepted"
+    }
+
+    def test_valid_payload(self):
+        """Test values are cleaned and dates parsed"""
+        values, errors = self.schema.validate(self.valid, self.now)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(values['seats'], 4)
+        self.assertEqual(values['depart_time'], datetime(2030, 1, 2, 8, 30))
+        self.assertEqual(values['action'], "accepted")
+        self.assertIsNone(values['lat'])
+
+    def test_every_error_is_reported(self):
+        """Test one pass reports each invalid field"""
+        payload = dict(self.valid, name="  ", email="1bob@dev.com",
+                       password="short", seats="four",
+                       depart_time="01-01-2030 11:59", action="maybe")
+        del payload['name']
+        values, errors = self.schema.validate(payload, self.now)
+
+        self.assertEqual(errors['name'], MISSING)
+        self.assertEqual(errors['email'], "Invalid email address: Cannot start with digit")
+        self.assertIn("not less that 8", errors['password'])
+        self.assertEqual(errors['seats'], "seats must be an integer")
+        self.assertIn("greater than the current time now: 01-01-2030 12:00",
+                      errors['depart_time'])
+        self.assertEqual(errors['action'], "action must be either 'rejected' or 'accepted'")
+
+    def test_bad_dates_and_strings(self):
+        """Test malformed dates and non strings are rejected"""
+        values, errors = self.schema.validate(
+            dict(self.valid, name=12, depart_time="2030-01-02"), self.now)
+
+        self.assertEqual(errors['name'], "name must be a string")
+        self.assertEqual(errors['depart_time'],
+                         "depart_time must be a date formatted as dd-mm-YYYY HH:MM")
+
+    def test_payload_checks(self):
+        """Test payload checks run once the fields are valid"""
+        values, errors = self.schema.validate(dict(self.valid, lat=1.5), self.now)
+        self.assertEqual(errors, {"lat": "Give both lat and lon or neither"})
+
+        values, errors = self.schema.validate(dict(self.valid, lat=1.5, lon=200), self.now)
+        self.assertEqual(errors, {"lon": "lon must be between -180 and 180"})
+
+        values, errors = self.schema.validate(["not", "an", "object"])
+        self.assertEqual(errors, {"payload": "Must be a JSON object"})
+
+
+    def test_field_must_compile(self):
+        """Test a field that does not say how it is checked cannot be made"""
+        class Unchecked(Field):
+            pass
+
+        with self.assertRaises(TypeError):
+            Unchecked()
+
+if __name__ == '__main__':
+    main()
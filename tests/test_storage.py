@@ -0,0 +1,34 @@
+"""Defines tests for the storage engines"""
+
+from unittest import TestCase, main
+from app.storage import create_engine
+from app.storage.sqlite import SQLiteEngine
+from app.storage.postgres import translate
+
+
+class TestStorageEngines(TestCase):
+
+    def test_engine_selection(self):
+        """Test DB_ENGINE picks the storage engine"""
+        engine = create_engine({"DB_ENGINE": "sqlite", "DATABASE": ":memory:"})
+        self.assertIsInstance(engine, SQLiteEngine)
+
+        self.assertRaises(ValueError, create_engine,
+                          {"DB_ENGINE": "oracle", "DATABASE": ":memory:"})
+
+    def test_sqlite_connection_dialect(self):
+        """Test sqlite connections report their dialect"""
+        conn = SQLiteEngine(":memory:").connect()
+        self.assertEqual(conn.dialect, "sqlite")
+        conn.close()
+
+    def test_placeholder_translation(self):
+        """Test sqlite placeholders are rewritten for psycopg2"""
+        self.assertEqual(translate("SELECT * FROM rides WHERE id=? AND driver=?"),
+                         "SELECT * FROM rides WHERE id=%s AND driver=%s")
+        self.assertEqual(translate("SELECT '?', x FROM t WHERE y LIKE '%a' AND z=?"),
+                         "SELECT '?', x FROM t WHERE y LIKE '%%a' AND z=%s")
+
+
+if __name__ == "__main__":
+    main(verbosity=2)
@@ -0,0 +1,76 @@
+"""Defines tests for the SQL statement tracing"""
+import json
+from unittest import TestCase, main
+
+from flask import Response
+
+from app import tracing
+from app.db import get_db
+from app.tracing import query_shape
+from tests.basetest import DatabaseCase
+
+
+class TestQueryShape(TestCase):
+
+    def test_literals_are_collapsed(self):
+        """Test statements that differ only in their values share a shape"""
+        self.assertEqual(query_shape("SELECT * FROM rides\n  WHERE id=12 AND driver='bob'"),
+                         "SELECT * FROM rides WHERE id=? AND driver=?")
+        self.assertEqual(query_shape("DELETE FROM rides WHERE id IN (?, ?,?)"),
+                         "DELETE FROM rides WHERE id IN (...)")
+
+
+class TestTracing(DatabaseCase):
+
+    def make_app(self):
+        app = super().make_app()
+        app.config.update(SQL_TRACE=True, SQL_SLOW_QUERY_MS=10 ** 6)
+        tracing.init_app(app)
+        return app
+
+    def setUp(self):
+        super().setUp()
+        self.tracer = self.app.extensions['sql_tracer']
+        self.client = self.app.test_client()
+
+    def test_repeated_statements_are_flagged(self):
+        """Test a statement shape run SQL_TRACE_REPEAT times in a request is logged"""
+        with self.app.test_request_context():
+            self.tracer.start_request()
+            with self.assertLogs(self.app.logger, 'DEBUG') as logs:
+                for ride_id in range(3):
+                    get_db().execute("SELECT * FROM rides WHERE id=?", (ride_id,))
+            self.tracer.finish_request(Response())
+
+        self.assertIn("test_tracing.test_repeated_statements_are_flagged", logs.output[0])
+        warnings = [line for line in logs.output if line.startswith("WARNING")]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("SELECT * FROM rides WHERE id=? ran 3 times", warnings[0])
+
+    def test_slow_statements_are_explained(self):
+        """Test slow statements are logged with their query plan"""
+        self.tracer.slow_ms = 0
+        with self.app.app_context():
+            with self.assertLogs('app.tracing.slow') as logs:
+                get_db().execute("SELECT * FROM rides WHERE id=?", (1,))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("SELECT * FROM rides WHERE id=?", logs.output[0])
+        # the plan's lookup by primary key
+        self.assertRegex(logs.output[0], r"(?i)primary key|rides_pkey")
+
+    def test_summary_header_in_debug_mode(self):
+        """Test responses carry the SQL summary in debug mode only"""
+        user = {"name": "Bob Rider", "email": "bobrider@dev.com", "password": "12345dfgh"}
+        response = self.client.post('/api/v1/auth/signup', data=json.dumps(user),
+                                    content_type='application/json')
+        self.assertNotIn("X-SQL-Trace", response.headers)
+
+        self.app.debug = True
+        response = self.client.post('/api/v1/auth/signup', data=json.dumps(user),
+                                    content_type='application/json')
+        self.assertRegex(response.headers["X-SQL-Trace"],
+                         r"^[1-9]\d* statements; \d+\.\d{3}ms; 0 repeated$")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,15 @@
 """Defines tests for validator methods"""
 
 from unittest import TestCase, main
-from datetime import datetime, timedelta
-from app.validators import string_validator, email_validator, \
-                            length_validator,action_validator, \
-                            date_validator
+from datetime import datetime
+from app.validators import string_validator, datetime_validator, \
+                            latitude_validator, longitude_validator
 
 class TestValidors(TestCase):
     
     def test_string_validator(self):
         """Test String validator"""
         value = ""
-        self.assertRaises(ValueError, email_validator, value)
         self.assertRaisesRegex(ValueError, 
                                 'field value cannot be empty', 
                                 string_validator, value, 'field')
@@ -19,68 +17,23 @@ class TestValidors(TestCase):
         value = "       "
         self.assertRaisesRegex(ValueError, 'field value cannot contain spaces or tabs only',
                                string_validator, value, 'field')
-    
-    def test_email_validator(self):
-        """Test Email validator"""
 
-        value = "alex@dev.com"
-        self.assertEqual(email_validator(value), value)
-        
-        value = "alexdev.com"
-        self.assertRaises(ValueError, email_validator, value)
+    def test_datetime_validator(self):
+        """Test Datetime validator"""
+        self.assertEqual(datetime_validator("31-01-2031 10:00", "eta"),
+                         datetime(2031, 1, 31, 10, 0))
         self.assertRaisesRegex(ValueError,
-                "Invalid email address: Must have '@' " ,
-                email_validator, value)
-
-        value = "1234alex@dev.com"
-        self.assertRaisesRegex(ValueError, 
-                "Invalid email address: Cannot start with digit",
-                email_validator, value)
-
-        self.assertRaises(ValueError, email_validator, value)
-
-
-    def test_length_validator(self):
-        """Test Length validor"""
-        value = "12345678"
-        self.assertEqual(length_validator(value, "password"), value)
-        
-        value = "123"
-        self.assertRaises(ValueError, length_validator, 
-                            value, 'password', 5)
-        self.assertRaisesRegex(ValueError, 
-                "password must contain not less that 5 characters",
-                length_validator, value, 'password', 5)
-    
-    def test_date_validator(self):
-        """Test Date validator"""
-
-        currentdate = datetime.now() + timedelta(days=1)
-        value = "{}".format(currentdate.strftime("%d-%m-%Y %H:%M"))
-        self.assertEqual(date_validator(value,"eta"), value)
-
-        currentdate = datetime.now() - timedelta(days=1)
-        value = "{}".format(currentdate.strftime("%d-%m-%Y %H:%M"))
-        self.assertRaises(ValueError, date_validator, value, 'eta')
-        self.assertRaisesRegex(ValueError, 
-                "eta must be greater than the current time now: {}".\
-            format(datetime.now().strftime("%d-%m-%Y %H:%M")),
-                date_validator, value, 'eta')
-
-
-    def test_action_validator(self):
-        """Test Action validator"""
-        value = "accepted"
-        self.assertEqual(action_validator(value, "action"), "accepted")
-
-        value="rejected"
-        self.assertEqual(action_validator(value, "action"), "rejected")
-
-        value = "come on"
-        self.assertRaises(ValueError, action_validator, value, 'action')
-        self.assertRaisesRegex(ValueError, 
-                "action must be either 'rejected' or 'accepted'",
-                action_validator, value, 'action')
+                "eta must be a date formatted as dd-mm-YYYY HH:MM",
+                datetime_validator, "31-02-2031 10:00", 'eta')
+
+    def test_coordinate_validators(self):
+        """Test Latitude and Longitude validators"""
+        self.assertEqual(latitude_validator("-1.28", "lat"), -1.28)
+        self.assertEqual(longitude_validator(36.82, "lon"), 36.82)
+        self.assertRaisesRegex(ValueError, "lat must be between -90 and 90",
+                               latitude_validator, "91", 'lat')
+        self.assertRaisesRegex(ValueError, "lon must be a number",
+                               longitude_validator, "east", 'lon')
 
 
 if __name__ == "__main__":